@@ -0,0 +1,144 @@
+import abc
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Set, Type
+
+import pymongo
+from beanie import Document, PydanticObjectId
+
+from app.models.status import BackgroundJobStatus
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRunner(abc.ABC):
+    """Run jobs saved in MongoDB as tasks of this process, at most `workers` at a time.
+
+    Subclasses implement `run()`. The `status`, `error` and `finished` fields of the job are updated when it starts
+    and ends; `started_fields()` can add fields to set when it starts.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = set()
+        self._slots = None
+
+    def submit(self, job: Document) -> asyncio.Task:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        task = asyncio.create_task(
+            self._run(job), name=f"{type(self).__name__}-{job.id}"
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def started_fields(self, job: Document) -> dict:
+        return {}
+
+    @abc.abstractmethod
+    async def run(self, job: Document):
+        """Do the work of `job`; an exception marks it as failed."""
+
+    async def _run(self, job: Document):
+        async with self._slots:
+            await job.set(
+                {"status": BackgroundJobStatus.RUNNING, **self.started_fields(job)}
+            )
+            try:
+                await self.run(job)
+                status, error = BackgroundJobStatus.SUCCEEDED, None
+            except Exception as e:
+                logger.exception(f"{type(self).__name__} job {job.id} failed")
+                status, error = BackgroundJobStatus.FAILED, str(e)
+            await job.set(
+                {"status": status, "error": error, "finished": datetime.utcnow()}
+            )
+
+
+class LeasedRunner(BackgroundRunner):
+    """A `BackgroundRunner` whose jobs are continued by another process when the one running them goes away.
+
+    Jobs need a `heartbeat` field and `run()` must be able to pick up a job where it was interrupted. After `start()`,
+    each process keeps the heartbeat of its own jobs current and continues unfinished jobs of `document_model` whose
+    heartbeat is older than `lease` seconds.
+    """
+
+    document_model: Type[Document]
+
+    def __init__(self, workers: int, lease: int):
+        super().__init__(workers)
+        self.lease = lease
+        self._jobs: Set[PydanticObjectId] = set()  # queued or running in this process
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(
+                self._watch(), name=f"{type(self).__name__}-watch"
+            )
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        await super().stop()
+        self._jobs = set()
+
+    def submit(self, job: Document) -> asyncio.Task:
+        task = super().submit(job)
+        self._jobs.add(job.id)
+        task.add_done_callback(lambda _: self._jobs.discard(job.id))
+        return task
+
+    def started_fields(self, job: Document) -> dict:
+        return {"heartbeat": datetime.utcnow()}
+
+    async def resume(self):
+        """Take over unfinished jobs nobody has made progress on for `lease` seconds."""
+        collection = self.document_model.get_motor_collection()
+        while True:
+            now = datetime.utcnow()
+            # Claimed by moving the heartbeat, so only one process continues each job
+            doc = await collection.find_one_and_update(
+                {
+                    "status": {
+                        "$in": [
+                            BackgroundJobStatus.PENDING,
+                            BackgroundJobStatus.RUNNING,
+                        ]
+                    },
+                    "heartbeat": {"$lt": now - timedelta(seconds=self.lease)},
+                },
+                {"$set": {"heartbeat": now}},
+                return_document=pymongo.ReturnDocument.AFTER,
+            )
+            if doc is None:
+                return
+            job = self.document_model.parse_obj(doc)
+            logger.info(f"Resuming {type(self).__name__} job {job.id}")
+            self.submit(job)
+
+    async def _watch(self):
+        while True:
+            try:
+                # Keep the jobs of this process, including those waiting for a worker, from being taken over
+                await self.document_model.get_motor_collection().update_many(
+                    {"_id": {"$in": list(self._jobs)}},
+                    {"$set": {"heartbeat": datetime.utcnow()}},
+                )
+                await self.resume()
+            except Exception:
+                logger.exception(
+                    f"Looking for interrupted {type(self).__name__} jobs failed"
+                )
+            await asyncio.sleep(self.lease / 2)
@@ -14,6 +14,9 @@ class Settings(BaseSettings):
     # Unique secret for hashing API keys. Generate with `openssl rand -hex 32`
     local_auth_secret = "clowder_secret_key"
     local_auth_expiration = 30  # default number of minutes before invalidating API key (can be individually overridden)
+    # seconds a validated API key is reused without checking the database, see keycloak_auth.api_keys
+    local_auth_cache_ttl = 60
+    local_auth_cache_size = 10000
 
     # exposing default ports for fronted
     CORS_ORIGINS: List[AnyHttpUrl] = [
@@ -35,6 +38,10 @@ class Settings(BaseSettings):
     MINIO_UPLOAD_CHUNK_SIZE: int = 10 * 1024 * 1024
     MINIO_EXPIRES: int = 3600  # seconds
     MINIO_SECURE: str = "False"  # http vs https
+    MINIO_MAX_WORKERS: int = 16  # max concurrent blocking Minio calls per process
+    MINIO_PREFETCH_WINDOW: int = 8  # objects fetched ahead while exporting a dataset
+    # objects larger than this are streamed when their turn comes instead of prefetched
+    MINIO_PREFETCH_MAX_BYTES: int = 1024 * 1024
 
     # keycloak server
     auth_base = "http://localhost:8080"
@@ -64,6 +71,13 @@ class Settings(BaseSettings):
     keycloak_client_id = auth_client_id
     # identity providers registered in keycloak, for example cilogon, globus, twitter
     keycloak_ipds = ["cilogon", "globus"]
+    # token verification
+    keycloak_jwks_ttl = 3600  # seconds before the realm signing keys are fetched again
+    # minimum seconds between fetches caused by a token signed with an unknown key
+    keycloak_jwks_min_refresh = 30
+    # seconds a verified token is trusted without checking its signature again
+    keycloak_token_cache_ttl = 60
+    keycloak_token_cache_size = 10000
 
     # Elasticsearch local config
     elasticsearch_url = "http://localhost:9200"
@@ -74,12 +88,55 @@ class Settings(BaseSettings):
         "number_of_replicas": elasticsearch_no_of_replicas,
     }
     elasticsearch_index = "clowder"
+    # Batching of index updates, see search/bulk.py
+    ES_BULK_MAX_ACTIONS: int = 500
+    ES_BULK_MAX_BYTES: int = 5 * 1024 * 1024
+    ES_BULK_FLUSH_INTERVAL: float = 0.5  # seconds
+    ES_BULK_QUEUE_SIZE: int = 10000  # callers wait beyond this many queued operations
+    ES_BULK_MAX_RETRIES: int = 3
 
     # RabbitMQ message bus
     RABBITMQ_USER: str = "guest"
     RABBITMQ_PASS: str = "guest"
     RABBITMQ_HOST: str = "127.0.0.1"
     HEARTBEAT_EXCHANGE: str = "extractors"
+    # seconds between saves of lastAlive by heartbeat_listener.py, well below listener_heartbeat_interval
+    HEARTBEAT_FLUSH_INTERVAL: int = 15
+    RABBITMQ_PUBLISH_CHANNELS: int = 4  # channels sending job messages concurrently
+    RABBITMQ_PUBLISH_QUEUE_SIZE: int = (
+        10000  # submissions wait beyond this many unsent messages
+    )
+    # Job status messages from the listeners, see message_listener.py
+    RABBITMQ_STATUS_PREFETCH: int = (
+        500  # unacknowledged messages given to each consumer
+    )
+    RABBITMQ_STATUS_BATCH_SIZE: int = 200  # messages applied with one bulk write
+    RABBITMQ_STATUS_BATCH_WAIT: float = 0.05  # seconds to wait for a batch to fill
+
+    # Background indexing and feed matching of newly uploaded files
+    POST_INGEST_WORKERS: int = 4
+    POST_INGEST_QUEUE_SIZE: int = 10000  # uploads wait for a free slot beyond this
+    POST_INGEST_BATCH_SIZE: int = 100  # files indexed together by one worker
+    FEED_CACHE_TTL: int = 30  # seconds before feeds changed by another process are seen
+
+    # Roles of users on datasets, see deps/authorization_deps.py
+    PERMISSION_CACHE_TTL: int = 30  # seconds before changes by another process apply
+    PERMISSION_CACHE_SIZE: int = 10000
+
+    # Background deletion of datasets and folder trees, see deletion.py
+    DELETION_WORKERS: int = 2  # jobs running at the same time
+    DELETION_BATCH_SIZE: int = 1000  # files removed together
+    # seconds without progress after which another process continues a job, e.g. after a restart
+    DELETION_LEASE: int = 120
+
+    # Submission of a listener to many files at once, see rabbitmq/batches.py
+    LISTENER_BATCH_WORKERS: int = 2  # batches submitted at the same time
+    LISTENER_BATCH_SIZE: int = 1000  # jobs inserted and published together
+    # seconds without progress after which another process continues a batch, e.g. after a restart
+    LISTENER_BATCH_LEASE: int = 120
+
+    # Listings count matching documents up to this many, see routers/utils.paginate
+    PAGINATION_COUNT_LIMIT: int = 10000
 
     # defautl listener heartbeat time interval in seconds 5 minutes
     listener_heartbeat_interval = 5 * 60
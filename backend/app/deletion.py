@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime
+from typing import List
+
+from beanie import PydanticObjectId
+from beanie.odm.operators.update.general import Inc, Set as SetFields
+from beanie.operators import In
+from pydantic import BaseModel, Field
+
+from app import dependencies
+from app.background import LeasedRunner
+from app.config import settings
+from app.deps.authorization_deps import invalidate_roles
+from app.models.authorization import AuthorizationDB
+from app.models.datasets import DatasetDB
+from app.models.deletions import DeletionJobDB
+from app.models.files import FileDB
+from app.models.folders import FolderDB
+from app.models.metadata import MetadataDB
+from app.models.users import UserOut
+from app.routers.files import remove_file_entries
+from app.search.connect import delete_document_by_id
+
+
+class _FileId(BaseModel):
+    id: PydanticObjectId = Field(alias="_id")
+
+
+async def folder_tree(folder: FolderDB) -> List[PydanticObjectId]:
+    """Ids of a folder and of all folders below it, found with a single $graphLookup."""
+    results = (
+        await FolderDB.find(FolderDB.id == folder.id)
+        .aggregate(
+            [
+                {
+                    "$graphLookup": {
+                        "from": FolderDB.Settings.name,
+                        "startWith": "$_id",
+                        "connectFromField": "_id",
+                        "connectToField": "parent_folder",
+                        "as": "descendants",
+                        "restrictSearchWithMatch": {"dataset_id": folder.dataset_id},
+                    }
+                },
+                {"$project": {"descendants._id": 1}},
+            ]
+        )
+        .to_list()
+    )
+    descendants = results[0]["descendants"] if results else []
+    return [folder.id] + [d["_id"] for d in descendants]
+
+
+class DeletionRunner(LeasedRunner):
+    """Delete datasets and folder trees in the background, `DELETION_BATCH_SIZE` files at a time.
+
+    Each batch of files is removed with `remove_file_entries()`, so a folder with 50k files costs about 50 rounds of
+    bulk requests instead of 250k individual ones. Progress is saved on the job after every batch and at most
+    `DELETION_WORKERS` jobs run at once.
+
+    Every step can be repeated, so a job interrupted by a restart is simply run again: after `start()`, each process
+    keeps the heartbeat of its own jobs current and continues unfinished jobs whose heartbeat is older than
+    `DELETION_LEASE` seconds.
+    """
+
+    document_model = DeletionJobDB
+
+    def __init__(self, workers: int, batch_size: int, lease: int):
+        super().__init__(workers, lease)
+        self.batch_size = batch_size
+
+    async def delete_folder(self, folder: FolderDB, user: UserOut) -> DeletionJobDB:
+        """Remove `folder` from its dataset right away and queue the deletion of its contents."""
+        folder_ids = await folder_tree(folder)
+        job = DeletionJobDB(
+            dataset_id=folder.dataset_id,
+            folder_id=folder.id,
+            creator=user,
+            folder_ids=folder_ids,
+            folders=len(folder_ids),
+            files=await FileDB.find(In(FileDB.folder_id, folder_ids)).count(),
+        )
+        await folder.delete()
+        await job.insert()
+        self.submit(job)
+        return job
+
+    async def delete_dataset(self, dataset: DatasetDB, user: UserOut) -> DeletionJobDB:
+        """Remove `dataset` with its metadata and authorizations right away and queue the deletion of its files and
+        folders."""
+        job = DeletionJobDB(
+            dataset_id=dataset.id,
+            creator=user,
+            folders=await FolderDB.find(FolderDB.dataset_id == dataset.id).count(),
+            files=await FileDB.find(FileDB.dataset_id == dataset.id).count(),
+        )
+        es = await dependencies.get_elasticsearchclient()
+        await asyncio.to_thread(
+            delete_document_by_id, es, settings.elasticsearch_index, str(dataset.id)
+        )
+        # delete dataset first to minimize files/folder being uploaded to a delete dataset
+        await dataset.delete()
+        await MetadataDB.find(MetadataDB.resource.resource_id == dataset.id).delete()
+        await AuthorizationDB.find(AuthorizationDB.dataset_id == dataset.id).delete()
+        invalidate_roles(dataset_id=dataset.id)
+        # Only queued once the dataset is gone, so a failure above never leaves a job that empties a live dataset
+        await job.insert()
+        self.submit(job)
+        return job
+
+    def started_fields(self, job: DeletionJobDB) -> dict:
+        return {
+            **super().started_fields(job),
+            DeletionJobDB.started: job.started or datetime.utcnow(),
+        }
+
+    async def run(self, job: DeletionJobDB):
+        if job.folder_id is None:
+            if await DatasetDB.get(job.dataset_id) is not None:
+                raise RuntimeError(f"Dataset {job.dataset_id} still exists")
+        elif await FolderDB.get(job.folder_id) is not None:
+            raise RuntimeError(f"Folder {job.folder_id} still exists")
+        await self.delete_contents(job)
+
+    async def delete_contents(self, job: DeletionJobDB):
+        if job.folder_id is None:
+            await self._delete_files(job, FileDB.dataset_id == job.dataset_id)
+            await FolderDB.find(FolderDB.dataset_id == job.dataset_id).delete()
+            return
+        for start in range(0, len(job.folder_ids), self.batch_size):
+            folder_ids = job.folder_ids[start : start + self.batch_size]
+            await self._delete_files(job, In(FileDB.folder_id, folder_ids))
+            await FolderDB.find(In(FolderDB.id, folder_ids)).delete()
+
+    async def _delete_files(self, job: DeletionJobDB, condition):
+        fs = await dependencies.get_fs()
+        es = await dependencies.get_elasticsearchclient()
+        # Deleted files no longer match, so the next batch is always the first one left
+        while (
+            files := await FileDB.find(condition)
+            .limit(self.batch_size)
+            .project(_FileId)
+            .to_list()
+        ):
+            file_ids = [file.id for file in files]
+            await remove_file_entries(file_ids, fs, es)
+            await job.update(
+                Inc({DeletionJobDB.files_deleted: len(file_ids)}),
+                SetFields({DeletionJobDB.heartbeat: datetime.utcnow()}),
+            )
+
+
+deletions = DeletionRunner(
+    settings.DELETION_WORKERS, settings.DELETION_BATCH_SIZE, settings.DELETION_LEASE
+)
@@ -1,55 +1,103 @@
-from typing import Generator
+import logging
+from typing import Optional
 
-import pika
+from elasticsearch import Elasticsearch
 from minio import Minio
 from minio.commonconfig import ENABLED
 from minio.versioningconfig import VersioningConfig
-from pika.adapters.blocking_connection import BlockingChannel
 
 from app.config import settings
+from app.rabbitmq.publisher import JobPublisher
+from app.search.bulk import BulkIndexer
 from app.search.connect import connect_elasticsearch
+from app.storage.client import AsyncStorage
 
+logger = logging.getLogger(__name__)
 
-async def get_fs() -> Generator:
-    file_system = Minio(
-        settings.MINIO_SERVER_URL,
-        access_key=settings.MINIO_ACCESS_KEY,
-        secret_key=settings.MINIO_SECRET_KEY,
-        secure=False,
+# Clients are created once and shared for the lifetime of the application. See `startup_clients()` in main.py.
+_fs: Optional[AsyncStorage] = None
+_external_fs: Optional[AsyncStorage] = None
+_es: Optional[Elasticsearch] = None
+_rabbitmq: Optional[JobPublisher] = None
+
+
+async def _connect_storage(server_url: str, secure: bool) -> AsyncStorage:
+    """Create a Minio client and make sure the Clowder bucket exists and is versioned. Only done once per client."""
+    storage = AsyncStorage(
+        Minio(
+            server_url,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=secure,
+        )
     )
     clowder_bucket = settings.MINIO_BUCKET_NAME
-    if not file_system.bucket_exists(clowder_bucket):
-        file_system.make_bucket(clowder_bucket)
-    file_system.set_bucket_versioning(clowder_bucket, VersioningConfig(ENABLED))
-    yield file_system
+    if not await storage.run(storage.client.bucket_exists, clowder_bucket):
+        await storage.run(storage.client.make_bucket, clowder_bucket)
+    await storage.run(
+        storage.client.set_bucket_versioning,
+        clowder_bucket,
+        VersioningConfig(ENABLED),
+    )
+    return storage
+
+
+async def get_fs() -> AsyncStorage:
+    global _fs
+    if _fs is None:
+        _fs = await _connect_storage(settings.MINIO_SERVER_URL, secure=False)
+    return _fs
 
 
 # This will be needed for generating presigned URL for sharing
-async def get_external_fs() -> Generator:
-    file_system = Minio(
-        settings.MINIO_EXTERNAL_SERVER_URL,
-        access_key=settings.MINIO_ACCESS_KEY,
-        secret_key=settings.MINIO_SECRET_KEY,
-        secure=settings.MINIO_SECURE.lower() == "true",
-    )
-    clowder_bucket = settings.MINIO_BUCKET_NAME
-    if not file_system.bucket_exists(clowder_bucket):
-        file_system.make_bucket(clowder_bucket)
-    file_system.set_bucket_versioning(clowder_bucket, VersioningConfig(ENABLED))
-    yield file_system
+async def get_external_fs() -> AsyncStorage:
+    global _external_fs
+    if _external_fs is None:
+        _external_fs = await _connect_storage(
+            settings.MINIO_EXTERNAL_SERVER_URL,
+            secure=settings.MINIO_SECURE.lower() == "true",
+        )
+    return _external_fs
 
 
-def get_rabbitmq() -> BlockingChannel:
-    """Client to connect to RabbitMQ for listeners/extractors interactions."""
-    credentials = pika.PlainCredentials(settings.RABBITMQ_USER, settings.RABBITMQ_PASS)
-    parameters = pika.ConnectionParameters(
-        settings.RABBITMQ_HOST, credentials=credentials
-    )
-    connection = pika.BlockingConnection(parameters)
-    channel = connection.channel()
-    return channel
+async def get_rabbitmq() -> JobPublisher:
+    """Client to publish jobs for listeners/extractors. The connection is shared, and aio-pika re-establishes it if
+    the broker dropped it."""
+    global _rabbitmq
+    if _rabbitmq is None:
+        publisher = JobPublisher(
+            f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASS}@{settings.RABBITMQ_HOST}/"
+        )
+        await publisher.start()
+        if _rabbitmq is None:
+            _rabbitmq = publisher
+        else:
+            # another request connected in the meantime
+            await publisher.stop()
+    return _rabbitmq
+
+
+async def close_rabbitmq():
+    global _rabbitmq
+    if _rabbitmq is not None:
+        await _rabbitmq.stop()
+    _rabbitmq = None
+
+
+async def get_elasticsearchclient() -> Elasticsearch:
+    """The Elasticsearch client keeps its own connection pool and retries dead nodes, so one instance is enough."""
+    global _es
+    if _es is None:
+        _es = await connect_elasticsearch()
+    return _es
 
 
-async def get_elasticsearchclient():
-    es = await connect_elasticsearch()
-    return es
+async def close_clients():
+    global _fs, _external_fs, _es
+    await close_rabbitmq()
+    if _es is not None:
+        await BulkIndexer.for_client(_es).stop()
+        _es.close()
+    _fs = None
+    _external_fs = None
+    _es = None
@@ -1,17 +1,93 @@
+import time
+from typing import List, Optional
+
 from beanie import PydanticObjectId
-from beanie.operators import Or
+from beanie.operators import Or, Set
 from bson import ObjectId
 from fastapi import Depends, HTTPException
 
-from app.keycloak_auth import get_current_username
+from app.config import settings
+from app.keycloak_auth import ExpiringCache, get_current_username
 from app.models.authorization import RoleType, AuthorizationDB
 from app.models.datasets import DatasetDB, DatasetStatus
 from app.models.files import FileOut, FileDB
+from app.models.folders import FolderDB
 from app.models.groups import GroupOut, GroupDB
 from app.models.metadata import MetadataDB
 from app.models.pyobjectid import PyObjectId
 from app.routers.authentication import get_admin
 
+# Role of a user on a dataset as (dataset id, username, role or None), see get_user_role
+_roles = ExpiringCache(settings.PERMISSION_CACHE_SIZE)
+
+
+async def get_user_role(dataset_id, username: str) -> Optional[RoleType]:
+    """The role a user was given on a dataset, directly or through a group, or None. Kept for
+    `PERMISSION_CACHE_TTL` seconds unless `invalidate_roles()` is called first."""
+    key = f"{dataset_id}/{username}"
+    if (cached := _roles.get(key)) is None:
+        authorization = await AuthorizationDB.find_one(
+            AuthorizationDB.dataset_id == PyObjectId(dataset_id),
+            Or(
+                AuthorizationDB.creator == username,
+                AuthorizationDB.user_ids == username,
+            ),
+        )
+        role = authorization.role if authorization is not None else None
+        cached = (str(dataset_id), username, role)
+        _roles.set(key, cached, time.time() + settings.PERMISSION_CACHE_TTL)
+    return cached[2]
+
+
+def invalidate_roles(dataset_id=None, username: Optional[str] = None):
+    """Forget the cached roles on a dataset, of a user, or both. Call after changing authorizations or groups."""
+    _roles.discard(
+        lambda cached: (dataset_id is None or cached[0] == str(dataset_id))
+        and (username is None or cached[1] == username)
+    )
+
+
+async def refresh_dataset_readers(dataset_id) -> List[str]:
+    """Recompute who can see a dataset from its authorizations and copy the list to the `readers` field of the
+    dataset and of its files and folders. Call after changing the authorizations of the dataset.
+    """
+    dataset_id = PydanticObjectId(dataset_id)
+    readers = set()
+    async for authorization in AuthorizationDB.find(
+        AuthorizationDB.dataset_id == dataset_id
+    ):
+        readers.add(authorization.creator)
+        readers.update(authorization.user_ids)
+    readers = sorted(readers)
+    await DatasetDB.find(DatasetDB.id == dataset_id).update(Set({"readers": readers}))
+    await FileDB.find(FileDB.dataset_id == dataset_id).update(Set({"readers": readers}))
+    await FolderDB.find(FolderDB.dataset_id == dataset_id).update(
+        Set({"readers": readers})
+    )
+    invalidate_roles(dataset_id=dataset_id)
+    return readers
+
+
+async def refresh_group_readers(group_id):
+    """`refresh_dataset_readers()` for every dataset a group has a role on, after its members changed."""
+    dataset_ids = await AuthorizationDB.distinct(
+        "dataset_id", {"group_ids": ObjectId(group_id)}
+    )
+    for dataset_id in dataset_ids:
+        await refresh_dataset_readers(dataset_id)
+
+
+async def load_dataset(dataset_id: str) -> Optional[DatasetDB]:
+    """The dataset of a `{dataset_id}` route. FastAPI runs a dependency once per request, so a route declaring
+    `dataset=Depends(load_dataset)` gets the document `Authorization` already loaded instead of reading it again.
+    """
+    return await DatasetDB.get(PydanticObjectId(dataset_id))
+
+
+async def load_file(file_id: str) -> Optional[FileDB]:
+    """The file of a `{file_id}` route, shared with `FileAuthorization` like `load_dataset`."""
+    return await FileDB.get(PydanticObjectId(file_id))
+
 
 async def get_role(
     dataset_id: str,
@@ -19,29 +95,17 @@ async def get_role(
 ) -> RoleType:
     """Returns the role a specific user has on a dataset. If the user is a creator (owner), they are not listed in
     the user_ids list."""
-    authorization = await AuthorizationDB.find_one(
-        AuthorizationDB.dataset_id == PyObjectId(dataset_id),
-        Or(
-            AuthorizationDB.creator == current_user,
-            AuthorizationDB.user_ids == current_user,
-        ),
-    )
-    return authorization.role
+    return await get_user_role(dataset_id, current_user)
 
 
 async def get_role_by_file(
     file_id: str,
     current_user=Depends(get_current_username),
+    file: Optional[FileDB] = Depends(load_file),
 ) -> RoleType:
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
-        authorization = await AuthorizationDB.find_one(
-            AuthorizationDB.dataset_id == file.dataset_id,
-            Or(
-                AuthorizationDB.creator == current_user,
-                AuthorizationDB.user_ids == current_user,
-            ),
-        )
-        if authorization is None:
+    if file is not None:
+        role = await get_user_role(file.dataset_id, current_user)
+        if role is None:
             if (
                 dataset := await DatasetDB.get(PydanticObjectId(file.dataset_id))
             ) is not None:
@@ -59,7 +123,7 @@ async def get_role_by_file(
                         status_code=403,
                         detail=f"User `{current_user} does not have role on file {file_id}",
                     )
-        return authorization.role
+        return role
     raise HTTPException(status_code=404, detail=f"File {file_id} not found")
 
 
@@ -72,26 +136,12 @@ async def get_role_by_metadata(
         resource_id = md_out.resource.resource_id
         if resource_type == "files":
             if (file := await FileDB.get(PydanticObjectId(resource_id))) is not None:
-                authorization = await AuthorizationDB.find_one(
-                    AuthorizationDB.dataset_id == file.dataset_id,
-                    Or(
-                        AuthorizationDB.creator == current_user,
-                        AuthorizationDB.user_ids == current_user,
-                    ),
-                )
-                return authorization.role
+                return await get_user_role(file.dataset_id, current_user)
         elif resource_type == "datasets":
             if (
                 dataset := await DatasetDB.get(PydanticObjectId(resource_id))
             ) is not None:
-                authorization = await AuthorizationDB.find_one(
-                    AuthorizationDB.dataset_id == dataset.id,
-                    Or(
-                        AuthorizationDB.creator == current_user,
-                        AuthorizationDB.user_ids == current_user,
-                    ),
-                )
-                return authorization.role
+                return await get_user_role(dataset.id, current_user)
 
 
 async def get_role_by_group(
@@ -149,6 +199,7 @@ class Authorization:
         dataset_id: str,
         current_user: str = Depends(get_current_username),
         admin: bool = Depends(get_admin),
+        current_dataset: Optional[DatasetDB] = Depends(load_dataset),
     ):
         # TODO: Make sure we enforce only one role per user per dataset, or find_one could yield wrong answer here.
 
@@ -157,15 +208,8 @@ class Authorization:
             return True
 
         # Else check role assigned to the user
-        authorization = await AuthorizationDB.find_one(
-            AuthorizationDB.dataset_id == PyObjectId(dataset_id),
-            Or(
-                AuthorizationDB.creator == current_user,
-                AuthorizationDB.user_ids == current_user,
-            ),
-        )
-        if authorization is not None:
-            if access(authorization.role, self.role):
+        if (role := await get_user_role(dataset_id, current_user)) is not None:
+            if access(role, self.role):
                 return True
             else:
                 raise HTTPException(
@@ -173,9 +217,7 @@ class Authorization:
                     detail=f"User `{current_user} does not have `{self.role}` permission on dataset {dataset_id}",
                 )
         else:
-            if (
-                current_dataset := await DatasetDB.get(PydanticObjectId(dataset_id))
-            ) is not None:
+            if current_dataset is not None:
                 if (
                     current_dataset.status == DatasetStatus.AUTHENTICATED.name
                     and self.role == "viewer"
@@ -205,22 +247,16 @@ class FileAuthorization:
         file_id: str,
         current_user: str = Depends(get_current_username),
         admin: bool = Depends(get_admin),
+        file: Optional[FileDB] = Depends(load_file),
     ):
         # If the current user is admin, user has access irrespective of any role assigned
         if admin:
             return True
 
         # Else check role assigned to the user
-        if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
-            authorization = await AuthorizationDB.find_one(
-                AuthorizationDB.dataset_id == file.dataset_id,
-                Or(
-                    AuthorizationDB.creator == current_user,
-                    AuthorizationDB.user_ids == current_user,
-                ),
-            )
-            if authorization is not None:
-                if access(authorization.role, self.role):
+        if file is not None:
+            if (role := await get_user_role(file.dataset_id, current_user)) is not None:
+                if access(role, self.role):
                     return True
                 raise HTTPException(
                     status_code=403,
@@ -255,15 +291,9 @@ class MetadataAuthorization:
                 if (
                     file := await FileDB.get(PydanticObjectId(resource_id))
                 ) is not None:
-                    authorization = await AuthorizationDB.find_one(
-                        AuthorizationDB.dataset_id == file.dataset_id,
-                        Or(
-                            AuthorizationDB.creator == current_user,
-                            AuthorizationDB.user_ids == current_user,
-                        ),
-                    )
-                    if authorization is not None:
-                        if access(authorization.role, self.role):
+                    role = await get_user_role(file.dataset_id, current_user)
+                    if role is not None:
+                        if access(role, self.role):
                             return True
                         raise HTTPException(
                             status_code=403,
@@ -277,15 +307,9 @@ class MetadataAuthorization:
                 if (
                     dataset := await DatasetDB.get(PydanticObjectId(resource_id))
                 ) is not None:
-                    authorization = await AuthorizationDB.find_one(
-                        AuthorizationDB.dataset_id == dataset.id,
-                        Or(
-                            AuthorizationDB.creator == current_user,
-                            AuthorizationDB.user_ids == current_user,
-                        ),
-                    )
-                    if authorization is not None:
-                        if access(authorization.role, self.role):
+                    role = await get_user_role(dataset.id, current_user)
+                    if role is not None:
+                        if access(role, self.role):
                             return True
                         raise HTTPException(
                             status_code=403,
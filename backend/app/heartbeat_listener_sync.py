@@ -13,6 +13,9 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Shared by all messages; MongoClient keeps its own connection pool
+mongo_client = MongoClient(settings.MONGODB_URL)
+
 
 def callback(ch, method, properties, body):
     """This method receives messages from RabbitMQ and processes them.
@@ -27,7 +30,6 @@ def callback(ch, method, properties, body):
         **extractor_info, properties=ExtractorInfo(**extractor_info)
     )
 
-    mongo_client = MongoClient(settings.MONGODB_URL)
     db = mongo_client[settings.MONGO_DATABASE]
 
     # check to see if extractor alredy exists
@@ -1,14 +1,18 @@
 # Based on https://github.com/tiangolo/fastapi/issues/1428
-import json
+import asyncio
+import hashlib
 import logging
-from datetime import datetime
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, Union
 
 from fastapi import Security, HTTPException, Depends
 from fastapi.security import OAuth2AuthorizationCodeBearer, APIKeyHeader, APIKeyCookie
 from itsdangerous.exc import BadSignature
 from itsdangerous.url_safe import URLSafeSerializer
-from jose import ExpiredSignatureError
-from keycloak.exceptions import KeycloakAuthenticationError, KeycloakGetError
+from jose import ExpiredSignatureError, JWTError, jwt
+from keycloak.exceptions import KeycloakGetError
 from keycloak.keycloak_admin import KeycloakAdmin
 from keycloak.keycloak_openid import KeycloakOpenID
 from pydantic import Json
@@ -30,13 +34,133 @@ keycloak_openid = KeycloakOpenID(
 )
 
 
-# Used to decode JWT token
-async def get_idp_public_key():
-    return (
-        "-----BEGIN PUBLIC KEY-----\n"
-        f"{keycloak_openid.public_key()}"
-        "\n-----END PUBLIC KEY-----"
-    )
+class ExpiringCache:
+    """Least recently used cache of at most `maxsize` entries, each valid until a given `time.time()`."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str):
+        if (entry := self._entries.get(key)) is None:
+            return None
+        valid_until, value = entry
+        if time.time() >= valid_until:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, valid_until: float):
+        self._entries[key] = (valid_until, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def discard(self, predicate: Callable[[Any], bool]):
+        """Remove every entry whose value matches."""
+        for key in [k for k, (_, v) in self._entries.items() if predicate(v)]:
+            del self._entries[key]
+
+
+def _digest(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+class TokenVerifier:
+    """Verify Keycloak access tokens locally with the realm's public keys instead of asking Keycloak every request.
+
+    The signing keys (JWKS) are fetched once and kept for `keycloak_jwks_ttl` seconds. A token signed with a key id
+    we don't know yet, e.g. after the realm keys were rotated, fetches them again right away, at most once every
+    `keycloak_jwks_min_refresh` seconds. Claims of verified tokens are kept, keyed by a hash of the token, for
+    `keycloak_token_cache_ttl` seconds or until the token expires, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        openid: KeycloakOpenID,
+        jwks_ttl: float = settings.keycloak_jwks_ttl,
+        jwks_min_refresh: float = settings.keycloak_jwks_min_refresh,
+        token_ttl: float = settings.keycloak_token_cache_ttl,
+        token_cache_size: int = settings.keycloak_token_cache_size,
+    ):
+        self.openid = openid
+        self.jwks_ttl = jwks_ttl
+        self.jwks_min_refresh = jwks_min_refresh
+        self.token_ttl = token_ttl
+        self._keys: Dict[str, dict] = {}
+        self._keys_fetched = None
+        self._tokens = ExpiringCache(token_cache_size)
+
+    async def _refresh_keys(self):
+        certs = await asyncio.to_thread(self.openid.certs)
+        self._keys = {
+            key["kid"]: key
+            for key in certs.get("keys", [])
+            if key.get("use", "sig") == "sig"
+        }
+        self._keys_fetched = time.monotonic()
+
+    async def signing_key(self, kid: Optional[str]) -> dict:
+        now = time.monotonic()
+        if self._keys_fetched is None or now - self._keys_fetched > self.jwks_ttl:
+            await self._refresh_keys()
+        elif kid not in self._keys and now - self._keys_fetched > self.jwks_min_refresh:
+            # Probably signed with a key added since we last looked
+            await self._refresh_keys()
+        if kid is None and len(self._keys) == 1:
+            return next(iter(self._keys.values()))
+        if kid not in self._keys:
+            raise JWTError("Token is signed with an unknown key.")
+        return self._keys[kid]
+
+    async def verify(self, token: str) -> dict:
+        """Claims of a valid token. Raises `ExpiredSignatureError` or `JWTError` otherwise."""
+        digest = _digest(token)
+        if (claims := self._tokens.get(digest)) is not None:
+            return claims
+
+        key = await self.signing_key(jwt.get_unverified_header(token).get("kid"))
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[key.get("alg", "RS256")],
+            # See https://github.com/marcospereirampj/python-keycloak/issues/89
+            options={"verify_aud": False},
+        )
+        valid_until = time.time() + self.token_ttl
+        if "exp" in claims:
+            valid_until = min(valid_until, claims["exp"])
+        self._tokens.set(digest, claims, valid_until)
+        return claims
+
+
+token_verifier = TokenVerifier(keycloak_openid)
+
+
+async def _token_claims(token: str) -> dict:
+    """Verify a JWT token, raising a 401 if it is invalid or expired."""
+    try:
+        return await token_verifier.verify(token)
+    except ExpiredSignatureError as e:
+        raise HTTPException(
+            status_code=401,
+            detail=str(e),  # "token expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except JWTError as e:
+        raise HTTPException(
+            status_code=401,
+            detail=str(e),  # "Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    except KeycloakGetError as e:
+        # Could not fetch the realm keys
+        raise HTTPException(
+            status_code=e.response_code,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
 
 # oauth2 config used by fastapi security scheme below
@@ -53,259 +177,158 @@ api_key_header = APIKeyHeader(name="X-API-KEY", auto_error=False)
 jwt_header = APIKeyCookie(name="Authorization", auto_error=False)
 
 
-async def get_token(
-    token: str = Security(oauth2_scheme),
-    api_key: str = Security(api_key_header),
-) -> Json:
-    """Decode token. Use to secure endpoints."""
-    if token:
-        try:
-            # See https://github.com/marcospereirampj/python-keycloak/issues/89
-            return keycloak_openid.decode_token(
-                token,
-                key=await get_idp_public_key(),
-                options={"verify_aud": False},
-            )
-        except ExpiredSignatureError as e:
-            raise HTTPException(
-                status_code=401,
-                detail=str(e),  # "token expired",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        except KeycloakGetError as e:
-            raise HTTPException(
-                status_code=e.response_code,
-                detail=str(e),  # "Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        except KeycloakAuthenticationError as e:
-            raise HTTPException(
-                status_code=401,
-                detail=str(e),
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+class Principal:
+    """Who is making a request, resolved once per request by `get_principal` and shared by every dependency.
 
-    if api_key:
-        serializer = URLSafeSerializer(settings.local_auth_secret, salt="api_key")
-        try:
-            payload = serializer.loads(api_key)
-            # Key is valid, check expiration date in database
-            if (
-                await ListenerAPIKeyDB.find_one(
-                    ListenerAPIKeyDB.user == payload["user"],
-                    ListenerAPIKeyDB.key == payload["key"],
-                )
-            ) is not None:
-                return {"preferred_username": payload["user"]}
-            elif (
-                key := await UserAPIKeyDB.find_one(
-                    UserAPIKeyDB.user == payload["user"],
-                    UserAPIKeyDB.key == payload["key"],
-                )
-            ) is not None:
-                current_time = datetime.utcnow()
-                if key.expires is not None and current_time >= key.expires:
-                    # Expired key, delete it first
-                    await key.delete()
-                    raise HTTPException(
-                        status_code=401,
-                        detail={"error": "Key is expired."},
-                        headers={"WWW-Authenticate": "Bearer"},
-                    )
-                else:
-                    return {"preferred_username": payload["user"]}
-            else:
-                raise HTTPException(
-                    status_code=401,
-                    detail={"error": "Key is invalid."},
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-        except BadSignature as e:
+    `username` and `email` come from the JWT token or API key without querying MongoDB. The user document is only
+    loaded the first time `user_db()` or `user()` is awaited.
+    """
+
+    def __init__(
+        self, username: str, email: str, claims: dict, user: Optional[UserDB] = None
+    ):
+        self.username = username
+        self.email = email
+        self.claims = claims
+        self._user = user
+        self._user_loaded = user is not None
+
+    async def user_db(self) -> Optional[UserDB]:
+        if not self._user_loaded:
+            self._user = await UserDB.find_one(UserDB.email == self.email)
+            self._user_loaded = True
+        return self._user
+
+    async def user(self) -> UserOut:
+        if (user := await self.user_db()) is not None:
+            return UserOut(**user.dict())
+        raise HTTPException(
+            status_code=401,
+            detail=f"User {self.email} not found.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+async def _find_api_key(api_key: str) -> Union[ListenerAPIKeyDB, UserAPIKeyDB]:
+    """Check an API key against the database."""
+    serializer = URLSafeSerializer(settings.local_auth_secret, salt="api_key")
+    try:
+        payload = serializer.loads(api_key)
+    except BadSignature:
+        raise HTTPException(
+            status_code=401,
+            detail={"error": "Key is invalid."},
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    # Key is valid, check expiration date in database
+    if (
+        key := await ListenerAPIKeyDB.find_one(
+            ListenerAPIKeyDB.user == payload["user"],
+            ListenerAPIKeyDB.key == payload["key"],
+        )
+    ) is not None:
+        # Key is coming from a listener job
+        return key
+    elif (
+        key := await UserAPIKeyDB.find_one(
+            UserAPIKeyDB.user == payload["user"],
+            UserAPIKeyDB.key == payload["key"],
+        )
+    ) is not None:
+        # Key is coming from a user request
+        current_time = datetime.utcnow()
+        if key.expires is not None and current_time >= key.expires:
+            # Expired key, delete it first
+            await key.delete()
             raise HTTPException(
                 status_code=401,
-                detail={"error": "Key is invalid."},
+                detail={"error": "Key is expired."},
                 headers={"WWW-Authenticate": "Bearer"},
             )
-
+        return key
     raise HTTPException(
         status_code=401,
-        detail="Not authenticated.",
+        detail={"error": "Key is invalid."},
         headers={"WWW-Authenticate": "Bearer"},
     )
 
 
-async def get_user(identity: Json = Depends(get_token)):
-    """Retrieve the user email from keycloak token."""
-    return identity["preferred_username"]
+class CachedAPIKey(NamedTuple):
+    key: str
+    user: str
 
 
-async def get_current_user(
-    token: str = Security(oauth2_scheme),
-    api_key: str = Security(api_key_header),
-    token_cookie: str = Security(jwt_header),
-) -> UserOut:
-    """Retrieve the user object from Mongo by first getting user id from JWT and then querying Mongo.
-    Potentially expensive. Use `get_current_username` if all you need is user name.
-    """
+# Validated API keys, so that repeated calls from extractors don't check them against MongoDB. Entries are kept for
+# `local_auth_cache_ttl` seconds at most (deleting a key in another process takes up to that long to apply) and never
+# past the expiration of the key. The user itself is not cached and is loaded by the requests that need it.
+api_keys = ExpiringCache(settings.local_auth_cache_size)
 
-    if token:
-        try:
-            userinfo = keycloak_openid.userinfo(token)
-            user = await UserDB.find_one(UserDB.email == userinfo["email"])
-            return UserOut(**user.dict())
-        except KeycloakAuthenticationError as e:
-            raise HTTPException(
-                status_code=e.response_code,
-                detail=json.loads(e.error_message),
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    if token_cookie:
-        try:
-            userinfo = keycloak_openid.userinfo(token_cookie.removeprefix("Bearer%20"))
-            user = await UserDB.find_one(UserDB.email == userinfo["email"])
-            return UserOut(**user.dict())
-        # expired token
-        except KeycloakAuthenticationError as e:
-            raise HTTPException(
-                status_code=e.response_code,
-                detail=json.loads(e.error_message),
-                headers={"WWW-Authenticate": "Bearer"},
-            )
 
-    if api_key:
-        serializer = URLSafeSerializer(settings.local_auth_secret, salt="api_key")
-        try:
-            payload = serializer.loads(api_key)
-            # Key is valid, check expiration date in database
-            if (
-                key := await ListenerAPIKeyDB.find_one(
-                    ListenerAPIKeyDB.user == payload["user"],
-                    ListenerAPIKeyDB.key == payload["key"],
-                )
-            ) is not None:
-                user = await UserDB.find_one(UserDB.email == key.user)
-                return UserOut(**user.dict())
-            elif (
-                key := await UserAPIKeyDB.find_one(
-                    UserAPIKeyDB.user == payload["user"],
-                    UserAPIKeyDB.key == payload["key"],
-                )
-            ) is not None:
-                current_time = datetime.utcnow()
-
-                if key.expires is not None and current_time >= key.expires:
-                    # Expired key, delete it first
-                    await key.delete()
-                    raise HTTPException(
-                        status_code=401,
-                        detail={"error": "Key is expired."},
-                        headers={"WWW-Authenticate": "Bearer"},
-                    )
-                else:
-                    user = await UserDB.find_one(UserDB.email == key.user)
-                    return UserOut(**user.dict())
-            else:
-                raise HTTPException(
-                    status_code=401,
-                    detail={"error": "Key is invalid."},
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-        except BadSignature as e:
-            raise HTTPException(
-                status_code=401,
-                detail={"error": "Key is invalid."},
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+def invalidate_api_keys(key: str):
+    """Forget a cached API key, e.g. after it was deleted."""
+    api_keys.discard(lambda cached: cached.key == key)
 
-    raise HTTPException(
-        status_code=401,
-        detail="Not authenticated.",  # "token expired",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
 
+async def _api_key_principal(api_key: str) -> Principal:
+    digest = _digest(api_key)
+    if (cached := api_keys.get(digest)) is None:
+        key = await _find_api_key(api_key)
+        valid_until = time.time() + settings.local_auth_cache_ttl
+        if key.expires is not None:
+            valid_until = min(
+                valid_until, key.expires.replace(tzinfo=timezone.utc).timestamp()
+            )
+        cached = CachedAPIKey(key.key, key.user)
+        api_keys.set(digest, cached, valid_until)
+    return Principal(cached.user, cached.user, {"preferred_username": cached.user})
 
-async def get_current_username(
+
+async def get_principal(
     token: str = Security(oauth2_scheme),
     api_key: str = Security(api_key_header),
     token_cookie: str = Security(jwt_header),
-) -> str:
-    """Retrieve the user id from the JWT token. Does not query MongoDB."""
-    if token:
-        try:
-            userinfo = keycloak_openid.userinfo(token)
-            return userinfo["preferred_username"]
-        # expired token
-        except KeycloakAuthenticationError as e:
-            raise HTTPException(
-                status_code=e.response_code,
-                detail=json.loads(e.error_message),
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+) -> Principal:
+    """Authenticate the request from the bearer token, the token cookie or the API key, in that order.
 
-    if token_cookie:
-        try:
-            userinfo = keycloak_openid.userinfo(token_cookie.removeprefix("Bearer%20"))
-            return userinfo["preferred_username"]
-        # expired token
-        except KeycloakAuthenticationError as e:
-            raise HTTPException(
-                status_code=e.response_code,
-                detail=json.loads(e.error_message),
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+    FastAPI caches dependencies for the duration of a request, so however many of the dependencies below a route uses
+    the credentials are only checked once.
+    """
+    if token or token_cookie:
+        claims = await _token_claims(token or token_cookie.removeprefix("Bearer%20"))
+        return Principal(claims["preferred_username"], claims.get("email"), claims)
 
     if api_key:
-        serializer = URLSafeSerializer(settings.local_auth_secret, salt="api_key")
-        try:
-            payload = serializer.loads(api_key)
-            # Key is valid, check expiration date in database
-            if (
-                key := await ListenerAPIKeyDB.find_one(
-                    ListenerAPIKeyDB.user == payload["user"],
-                    ListenerAPIKeyDB.key == payload["key"],
-                )
-            ) is not None:
-                # Key is coming from a listener job
-                return key.user
-            elif (
-                key := await UserAPIKeyDB.find_one(
-                    UserAPIKeyDB.user == payload["user"],
-                    UserAPIKeyDB.key == payload["key"],
-                )
-            ) is not None:
-                # Key is coming from a user request
-                current_time = datetime.utcnow()
-
-                if key.expires is not None and current_time >= key.expires:
-                    # Expired key, delete it first
-                    await key.delete()
-                    raise HTTPException(
-                        status_code=401,
-                        detail={"error": "Key is expired."},
-                        headers={"WWW-Authenticate": "Bearer"},
-                    )
-                else:
-                    return key.user
-            else:
-                raise HTTPException(
-                    status_code=401,
-                    detail={"error": "Key is invalid."},
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-        except BadSignature as e:
-            raise HTTPException(
-                status_code=401,
-                detail={"error": "Key is invalid."},
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        return await _api_key_principal(api_key)
 
     raise HTTPException(
         status_code=401,
-        detail="Not authenticated.",  # "token expired",
+        detail="Not authenticated.",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
 
+async def get_token(principal: Principal = Depends(get_principal)) -> Json:
+    """Decode token. Use to secure endpoints."""
+    return principal.claims
+
+
+async def get_user(principal: Principal = Depends(get_principal)):
+    """Retrieve the user email from keycloak token."""
+    return principal.username
+
+
+async def get_current_user(principal: Principal = Depends(get_principal)) -> UserOut:
+    """Retrieve the user object from Mongo by first getting user id from JWT and then querying Mongo.
+    Potentially expensive. Use `get_current_username` if all you need is user name.
+    """
+    return await principal.user()
+
+
+async def get_current_username(principal: Principal = Depends(get_principal)) -> str:
+    """Retrieve the user id from the JWT token. Does not query MongoDB."""
+    return principal.username
+
+
 async def get_current_user_id(identity: Json = Depends(get_token)) -> str:
     """Retrieve internal Keycloak id. Does not query MongoDB."""
     keycloak_id = identity["sub"]
@@ -7,17 +7,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseConfig
 
+from app import deletion, dependencies
 from app.config import settings
 from app.keycloak_auth import get_current_username
 from app.models.authorization import AuthorizationDB
 from app.models.config import ConfigEntryDB
-from app.models.datasets import DatasetDB, DatasetDBViewList
+from app.models.datasets import DatasetDB
+from app.models.deletions import DeletionJobDB
 from app.models.errors import ErrorDB
 from app.models.feeds import FeedDB
-from app.models.files import FileDB, FileVersionDB, FileDBViewList
-from app.models.folders import FolderDB, FolderDBViewList
+from app.models.files import FileDB, FileVersionDB
+from app.models.folders import FolderDB
 from app.models.groups import GroupDB
 from app.models.listeners import (
+    EventListenerBatchDB,
     EventListenerDB,
     EventListenerJobDB,
     EventListenerJobUpdateDB,
@@ -30,6 +33,8 @@ from app.models.tokens import TokenDB
 from app.models.users import UserDB, UserAPIKeyDB, ListenerAPIKeyDB
 from app.models.visualization_config import VisualizationConfigDB
 from app.models.visualization_data import VisualizationDataDB
+from app.post_ingest import post_ingest
+from app.rabbitmq.batches import batches
 from app.routers import folders, groups, status
 from app.routers import (
     users,
@@ -47,6 +52,7 @@ from app.routers import (
     jobs,
     visualization,
     thumbnails,
+    deletions,
 )
 
 # setup loggers
@@ -54,7 +60,7 @@ from os import path
 log_file_path = path.join(path.dirname(path.abspath(__file__)),'logging.conf')
 logging.config.fileConfig(log_file_path, disable_existing_loggers=False)
 from app.search.config import indexSettings
-from app.search.connect import connect_elasticsearch, create_index
+from app.search.connect import create_index
 
 logger = logging.getLogger(__name__)
 
@@ -90,6 +96,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # pagination, see routers/utils.paginate
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Estimated"],
 )
 
 api_router = APIRouter()
@@ -187,58 +195,77 @@ api_router.include_router(
     tags=["thumbnails"],
     dependencies=[Depends(get_current_username)],
 )
+api_router.include_router(
+    deletions.router,
+    prefix="/deletions",
+    tags=["deletions"],
+    dependencies=[Depends(get_current_username)],
+)
 api_router.include_router(status.router, prefix="/status", tags=["status"])
 api_router.include_router(keycloak.router, prefix="/auth", tags=["auth"])
 app.include_router(api_router, prefix=settings.API_V2_STR)
 
 
 def gather_documents():
-    pass
+    """All document models. Make sure to include all models. If one depends on another that is not in the list it is
+    not clear which one is missing."""
+    return [
+        ConfigEntryDB,
+        DatasetDB,
+        AuthorizationDB,
+        MetadataDB,
+        MetadataDefinitionDB,
+        FolderDB,
+        FileDB,
+        FileVersionDB,
+        FeedDB,
+        EventListenerDB,
+        EventListenerJobDB,
+        EventListenerJobUpdateDB,
+        EventListenerBatchDB,
+        EventListenerJobViewList,
+        EventListenerJobUpdateViewList,
+        UserDB,
+        UserAPIKeyDB,
+        ListenerAPIKeyDB,
+        GroupDB,
+        TokenDB,
+        ErrorDB,
+        VisualizationConfigDB,
+        VisualizationDataDB,
+        ThumbnailDB,
+        DeletionJobDB,
+    ]
 
 
 @app.on_event("startup")
 async def startup_beanie():
-    """Setup Beanie Object Document Mapper (ODM) to interact with MongoDB."""
+    """Setup Beanie Object Document Mapper (ODM) to interact with MongoDB. The indexes declared in the `Settings` of
+    each model are created if missing, see app/models/indexes.py to check them."""
     client = AsyncIOMotorClient(str(settings.MONGODB_URL))
     await init_beanie(
         database=getattr(client, settings.MONGO_DATABASE),
-        # Make sure to include all models. If one depends on another that is not in the list it is not clear which one is missing.
-        document_models=[
-            ConfigEntryDB,
-            DatasetDB,
-            DatasetDBViewList,
-            AuthorizationDB,
-            MetadataDB,
-            MetadataDefinitionDB,
-            FolderDB,
-            FolderDBViewList,
-            FileDB,
-            FileVersionDB,
-            FileDBViewList,
-            FeedDB,
-            EventListenerDB,
-            EventListenerJobDB,
-            EventListenerJobUpdateDB,
-            EventListenerJobViewList,
-            EventListenerJobUpdateViewList,
-            UserDB,
-            UserAPIKeyDB,
-            ListenerAPIKeyDB,
-            GroupDB,
-            TokenDB,
-            ErrorDB,
-            VisualizationConfigDB,
-            VisualizationDataDB,
-            ThumbnailDB,
-        ],
+        document_models=gather_documents(),
         recreate_views=True,
     )
 
 
+@app.on_event("startup")
+async def startup_clients():
+    """Create the shared Minio and RabbitMQ clients once, so buckets are checked at startup instead of per request."""
+    await dependencies.get_fs()
+    await dependencies.get_external_fs()
+    try:
+        await dependencies.get_rabbitmq()
+    except Exception as e:
+        # Listeners are optional; the connection is retried when a job is submitted
+        logger.warning(f"RabbitMQ not available at startup: {e}")
+
+
 @app.on_event("startup")
 async def startup_elasticsearch():
     # create elasticsearch indices
-    es = await connect_elasticsearch()
+    es = await dependencies.get_elasticsearchclient()
     create_index(
         es,
         settings.elasticsearch_index,
@@ -247,9 +274,29 @@ async def startup_elasticsearch():
     )
 
 
+@app.on_event("startup")
+async def startup_post_ingest():
+    await post_ingest.start()
+
+
+@app.on_event("startup")
+async def startup_deletions():
+    # continue deletions interrupted by a restart
+    await deletion.deletions.start()
+
+
+@app.on_event("startup")
+async def startup_batches():
+    # continue listener batches interrupted by a restart
+    await batches.start()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    pass
+    await post_ingest.stop()
+    await deletion.deletions.stop()
+    await batches.stop()
+    await dependencies.close_clients()
 
 
 @app.get("/")
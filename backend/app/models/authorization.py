@@ -1,6 +1,7 @@
 from datetime import datetime
 from enum import Enum
 
+import pymongo
 from beanie import Document
 from charset_normalizer.md import List
 from pydantic import BaseModel, EmailStr, Field
@@ -49,6 +50,10 @@ class AuthorizationDB(Document, AuthorizationBase, Provenance):
 
     class Settings:
         name = "authorization"
+        indexes = [
+            [("dataset_id", pymongo.ASCENDING), ("user_ids", pymongo.ASCENDING)],
+            [("group_ids", pymongo.ASCENDING)],
+        ]
 
 
 class AuthorizationOut(AuthorizationDB):
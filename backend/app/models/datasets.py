@@ -3,10 +3,10 @@ from enum import Enum, auto
 from typing import Optional, List
 
 import pymongo
-from beanie import Document, View, PydanticObjectId
+from beanie import Document, PydanticObjectId
 from pydantic import BaseModel, Field
 
-from app.models.authorization import RoleType, AuthorizationDB
+from app.models.authorization import RoleType
 from app.models.groups import GroupOut
 from app.models.users import UserOut
 
@@ -47,6 +47,9 @@ class DatasetDB(Document, DatasetBase):
     user_views: int = 0
     downloads: int = 0
     thumbnail_id: Optional[PydanticObjectId] = None
+    # Users who can list this dataset: everyone given a role on the dataset, kept in sync with the authorization
+    # collection by `refresh_dataset_readers()` so listings don't need to join it
+    readers: List[str] = []
 
     class Settings:
         name = "datasets"
@@ -55,40 +58,29 @@ class DatasetDB(Document, DatasetBase):
                 ("name", pymongo.TEXT),
                 ("description", pymongo.TEXT),
             ],
+            # Listing, newest first: everything (admins), shared with, created by or open to the user
+            [("created", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+            [
+                ("readers", pymongo.ASCENDING),
+                ("created", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+            ],
+            [
+                ("creator.email", pymongo.ASCENDING),
+                ("created", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+            ],
+            [
+                ("status", pymongo.ASCENDING),
+                ("created", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+            ],
         ]
 
 
-class DatasetDBViewList(View, DatasetBase):
-    id: PydanticObjectId = Field(None, alias="_id")  # necessary for Views
-    creator: UserOut
-    created: datetime = Field(default_factory=datetime.utcnow)
-    modified: datetime = Field(default_factory=datetime.utcnow)
-    auth: List[AuthorizationDB]
-    thumbnail_id: Optional[PydanticObjectId] = None
-    status: Optional[str]
-
-    class Settings:
-        source = DatasetDB
-        name = "datasets_view"
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "authorization",
-                    "localField": "_id",
-                    "foreignField": "dataset_id",
-                    "as": "auth",
-                }
-            },
-        ]
-        # Needs fix to work https://github.com/roman-right/beanie/pull/521
-        # use_cache = True
-        # cache_expiration_time = timedelta(seconds=10)
-        # cache_capacity = 5
-
-
 class DatasetOut(DatasetDB):
     class Config:
-        fields = {"id": "id"}
+        fields = {"id": "id", "readers": {"exclude": True}}
 
 
 class UserAndRole(BaseModel):
@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import List, Optional
+
+import pymongo
+from beanie import Document
+from pydantic import BaseModel, Field
+
+from app.models.pyobjectid import PyObjectId
+from app.models.status import BackgroundJobStatus
+from app.models.users import UserOut
+
+
+class DeletionJobBase(BaseModel):
+    """Removal of a dataset or of a folder tree, with their files, running in the background. See app/deletion.py."""
+
+    dataset_id: PyObjectId
+    folder_id: Optional[PyObjectId] = None  # None when the whole dataset is deleted
+    creator: UserOut
+    created: datetime = Field(default_factory=datetime.utcnow)
+    started: Optional[datetime] = None
+    finished: Optional[datetime] = None
+    status: str = BackgroundJobStatus.PENDING
+    folders: int = 0  # folders in the tree, including folder_id
+    files: int = 0  # files to delete when the job was created
+    files_deleted: int = 0
+    error: Optional[str] = None
+
+    class Config:
+        # required for Enum to properly work
+        use_enum_values = True
+
+
+class DeletionJobDB(Document, DeletionJobBase):
+    # Every folder of the tree, resolved when the job is created so it can continue after folders are gone
+    folder_ids: List[PyObjectId] = []
+    # Updated by the process running the job after every batch; jobs not updated for a while are taken over
+    heartbeat: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "deletion_jobs"
+        indexes = [
+            [("status", pymongo.ASCENDING), ("heartbeat", pymongo.ASCENDING)],
+        ]
+
+
+class DeletionJobOut(DeletionJobDB):
+    class Config:
+        fields = {
+            "id": "id",
+            "folder_ids": {"exclude": True},
+            "heartbeat": {"exclude": True},
+        }
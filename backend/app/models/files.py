@@ -1,10 +1,10 @@
 from datetime import datetime
 from typing import Optional, List
 
-from beanie import Document, View, PydanticObjectId
+import pymongo
+from beanie import Document, PydanticObjectId
 from pydantic import Field, BaseModel
 
-from app.models.authorization import AuthorizationDB
 from app.models.pyobjectid import PyObjectId
 from app.models.users import UserOut
 
@@ -27,11 +27,20 @@ class FileVersion(BaseModel):
     version_id: str
     version_num: int = 1
     bytes: int = 0
+    md5: Optional[str] = None
 
 
 class FileVersionDB(Document, FileVersion):
     class Settings:
         name = "file_versions"
+        indexes = [
+            [("file_id", pymongo.ASCENDING), ("version_num", pymongo.DESCENDING)],
+            [
+                ("file_id", pymongo.ASCENDING),
+                ("created", pymongo.DESCENDING),
+                ("_id", pymongo.DESCENDING),
+            ],
+        ]
 
 
 class FileBase(BaseModel):
@@ -52,46 +61,32 @@ class FileDB(Document, FileBase):
     views: int = 0
     downloads: int = 0
     bytes: int = 0
+    md5: Optional[str] = None
     content_type: ContentType = ContentType()
     thumbnail_id: Optional[PydanticObjectId] = None
+    # Users who can list this file: everyone given a role on the dataset, kept in sync with the authorization
+    # collection by `refresh_dataset_readers()` so listings don't need to join it
+    readers: List[str] = []
 
     class Settings:
         name = "files"
-
-
-class FileDBViewList(View, FileBase):
-    id: PydanticObjectId = Field(None, alias="_id")  # necessary for Views
-    version_id: str = "N/A"
-    version_num: int = 0
-    dataset_id: PyObjectId
-    folder_id: Optional[PyObjectId]
-    creator: UserOut
-    created: datetime = Field(default_factory=datetime.utcnow)
-    modified: datetime = Field(default_factory=datetime.utcnow)
-    auth: List[AuthorizationDB]
-    bytes: int = 0
-    content_type: ContentType = ContentType()
-    thumbnail_id: Optional[PydanticObjectId] = None
-
-    class Settings:
-        source = FileDB
-        name = "files_view"
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "authorization",
-                    "localField": "dataset_id",
-                    "foreignField": "dataset_id",
-                    "as": "auth",
-                }
-            },
+        indexes = [
+            [("dataset_id", pymongo.ASCENDING), ("readers", pymongo.ASCENDING)],
+            [
+                ("dataset_id", pymongo.ASCENDING),
+                ("folder_id", pymongo.ASCENDING),
+                ("created", pymongo.ASCENDING),
+                ("_id", pymongo.ASCENDING),
+            ],
+            [
+                ("dataset_id", pymongo.ASCENDING),
+                ("created", pymongo.ASCENDING),
+                ("_id", pymongo.ASCENDING),
+            ],
+            [("folder_id", pymongo.ASCENDING)],
         ]
-        # Needs fix to work https://github.com/roman-right/beanie/pull/521
-        # use_cache = True
-        # cache_expiration_time = timedelta(seconds=10)
-        # cache_capacity = 5
 
 
 class FileOut(FileDB):
     class Config:
-        fields = {"id": "id"}
+        fields = {"id": "id", "readers": {"exclude": True}}
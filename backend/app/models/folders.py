@@ -1,10 +1,10 @@
 from datetime import datetime
 from typing import Optional, List
 
-from beanie import Document, View, PydanticObjectId
+import pymongo
+from beanie import Document
 from pydantic import Field, BaseModel
 
-from app.models.authorization import AuthorizationDB
 from app.models.pyobjectid import PyObjectId
 from app.models.users import UserOut
 
@@ -23,39 +23,24 @@ class FolderDB(Document, FolderBase):
     creator: UserOut
     created: datetime = Field(default_factory=datetime.utcnow)
     modified: datetime = Field(default_factory=datetime.utcnow)
+    # Users who can list this folder: everyone given a role on the dataset, kept in sync with the authorization
+    # collection by `refresh_dataset_readers()` so listings don't need to join it
+    readers: List[str] = []
 
     class Settings:
         name = "folders"
-
-
-class FolderDBViewList(View, FolderBase):
-    id: PydanticObjectId = Field(None, alias="_id")  # necessary for Views
-    dataset_id: PyObjectId
-    parent_folder: Optional[PyObjectId]
-    creator: UserOut
-    created: datetime = Field(default_factory=datetime.utcnow)
-    modified: datetime = Field(default_factory=datetime.utcnow)
-    auth: List[AuthorizationDB]
-
-    class Settings:
-        source = FolderDB
-        name = "folders_view"
-        pipeline = [
-            {
-                "$lookup": {
-                    "from": "authorization",
-                    "localField": "dataset_id",
-                    "foreignField": "dataset_id",
-                    "as": "auth",
-                }
-            },
+        indexes = [
+            [("dataset_id", pymongo.ASCENDING), ("readers", pymongo.ASCENDING)],
+            [
+                ("dataset_id", pymongo.ASCENDING),
+                ("parent_folder", pymongo.ASCENDING),
+                ("created", pymongo.ASCENDING),
+                ("_id", pymongo.ASCENDING),
+            ],
+            [("parent_folder", pymongo.ASCENDING)],
         ]
-        # Needs fix to work https://github.com/roman-right/beanie/pull/521
-        # use_cache = True
-        # cache_expiration_time = timedelta(seconds=10)
-        # cache_capacity = 5
 
 
 class FolderOut(FolderDB):
     class Config:
-        fields = {"id": "id"}
+        fields = {"id": "id", "readers": {"exclude": True}}
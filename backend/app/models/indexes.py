@@ -0,0 +1,102 @@
+"""Compare the indexes declared in the `Settings` of the document models with the ones in MongoDB.
+
+Declared indexes are created when the API starts (see startup_beanie in app/main.py). This command only reports:
+declared indexes that do not exist yet, indexes that exist but are not declared, and indexes `$indexStats` reports as
+never used. Usage counts start over when the MongoDB server restarts, so check an instance that has been running for a
+while before dropping anything.
+
+    cd backend
+    python -m app.models.indexes
+"""
+import asyncio
+import logging
+
+import pymongo
+from beanie import View
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+
+from app.config import settings
+from app.main import gather_documents
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _key(fields) -> tuple:
+    """Comparable form of an index key; text indexes are identified by their fields only."""
+    text = sorted(field for field, kind in fields if kind == pymongo.TEXT)
+    if text:
+        return (pymongo.TEXT, *text)
+    return tuple((field, int(kind)) for field, kind in fields)
+
+
+def declared_indexes(model) -> set:
+    keys = set()
+    for index in getattr(model.Settings, "indexes", []):
+        if isinstance(index, str):
+            keys.add(_key([(index, pymongo.ASCENDING)]))
+        elif isinstance(index, pymongo.IndexModel):
+            keys.add(_key(index.document["key"].items()))
+        else:
+            keys.add(_key(index))
+    return keys
+
+
+def existing_indexes(info: dict) -> dict:
+    """Name of each index of a collection by key, from `index_information()`."""
+    indexes = {}
+    for name, index in info.items():
+        if "weights" in index:
+            indexes[(pymongo.TEXT, *sorted(index["weights"]))] = name
+        else:
+            indexes[_key(index["key"])] = name
+    return indexes
+
+
+async def index_usage(collection) -> dict:
+    """Operations served by each index of a collection since the server started, by index name."""
+    try:
+        return {
+            stats["name"]: stats["accesses"]["ops"]
+            async for stats in collection.aggregate([{"$indexStats": {}}])
+        }
+    except OperationFailure as e:
+        logger.warning(f"$indexStats not available on {collection.name}: {e}")
+        return {}
+
+
+async def report(database) -> int:
+    """Log the differences between declared and existing indexes and return how many were found."""
+    problems = 0
+    for model in gather_documents():
+        if issubclass(model, View):
+            continue
+        collection = database[model.Settings.name]
+        declared = declared_indexes(model)
+        existing = existing_indexes(await collection.index_information())
+        usage = await index_usage(collection)
+
+        for key in sorted(declared - existing.keys(), key=str):
+            problems += 1
+            logger.warning(f"{collection.name}: missing index {key}")
+        for key, name in sorted(existing.items(), key=lambda item: item[1]):
+            if name == "_id_":
+                continue
+            if key not in declared:
+                problems += 1
+                logger.warning(f"{collection.name}: index {name} is not declared")
+            if usage.get(name) == 0:
+                problems += 1
+                logger.warning(f"{collection.name}: index {name} has not been used")
+    logger.info(f"{problems} index problems found")
+    return problems
+
+
+async def main():
+    client = AsyncIOMotorClient(str(settings.MONGODB_URL))
+    await report(getattr(client, settings.MONGO_DATABASE))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List, Union
+from typing import Dict, Optional, List, Union
 
 import pymongo
 from beanie import Document, View, PydanticObjectId
@@ -10,6 +10,7 @@ from app.config import settings
 from app.models.authorization import AuthorizationDB
 from app.models.mongomodel import MongoDBRef
 from app.models.pyobjectid import PyObjectId
+from app.models.status import BackgroundJobStatus
 from app.models.users import UserOut
 
 
@@ -80,6 +81,12 @@ class EventListenerDB(Document, EventListenerBase):
                 ("name", pymongo.TEXT),
                 ("description", pymongo.TEXT),
             ],
+            [("name", pymongo.ASCENDING), ("version", pymongo.ASCENDING)],
+            [("lastAlive", pymongo.DESCENDING)],
+            [
+                ("properties.categories", pymongo.ASCENDING),
+                ("lastAlive", pymongo.DESCENDING),
+            ],
         ]
 
 
@@ -88,6 +95,14 @@ class EventListenerOut(EventListenerDB):
         fields = {"id": "id"}
 
 
+class EventListenerCategoryStatus(BaseModel):
+    """How many listeners of a category are alive, see GET /listeners/categories/status."""
+
+    category: Optional[str] = None
+    alive: int = 0
+    dead: int = 0
+
+
 class EventListenerSubmit(BaseModel):
     name: str = ""
 
@@ -124,6 +139,9 @@ class EventListenerJobBase(BaseModel):
     duration: Optional[float] = None
     latest_message: Optional[str] = None
     status: str = EventListenerJobStatus.CREATED
+    batch_id: Optional[
+        PyObjectId
+    ] = None  # set when submitted as part of an EventListenerBatchDB
 
     class Config:
         # required for Enum to properly work
@@ -140,7 +158,12 @@ class EventListenerJobDB(Document, EventListenerJobBase):
                 ("resource_ref.resource_id", pymongo.TEXT),
                 ("listener_id", pymongo.TEXT),
                 ("status", pymongo.TEXT),
-            ]
+            ],
+            [
+                ("resource_ref.resource_id", pymongo.ASCENDING),
+                ("created", pymongo.DESCENDING),
+            ],
+            [("batch_id", pymongo.ASCENDING), ("status", pymongo.ASCENDING)],
         ]
 
 
@@ -149,6 +172,61 @@ class EventListenerJobOut(EventListenerJobDB):
         fields = {"id": "id"}
 
 
+class EventListenerBatchIn(BaseModel):
+    """Run a listener on every file of a dataset, of a folder and its subfolders, or on a list of files. Exactly one
+    of `dataset_id`, `folder_id` and `file_ids` must be given."""
+
+    listener_id: str  # name of the listener queue, as extractorName for a single file
+    dataset_id: Optional[PyObjectId] = None
+    folder_id: Optional[PyObjectId] = None
+    file_ids: List[PyObjectId] = []
+    parameters: Optional[dict] = None
+
+
+class EventListenerBatchBase(EventListenerBatchIn):
+    """Submission of one job per file, running in the background. See app/rabbitmq/batches.py."""
+
+    creator: UserOut
+    created: datetime = Field(default_factory=datetime.utcnow)
+    finished: Optional[datetime] = None
+    status: str = BackgroundJobStatus.PENDING
+    files: int = 0  # matching files when the batch was created
+    submitted: int = 0  # jobs created and sent to the listener queue
+    failed: int = 0  # jobs created but not accepted by RabbitMQ
+    error: Optional[str] = None
+
+    class Config:
+        # required for Enum to properly work
+        use_enum_values = True
+
+
+class EventListenerBatchDB(Document, EventListenerBatchBase):
+    # Every folder of the tree, resolved when the batch is created
+    folder_ids: List[PyObjectId] = []
+    # Last file submitted, a batch continues after it when it is taken over
+    last_id: Optional[PyObjectId] = None
+    # Updated by the process submitting the batch after every page; batches not updated for a while are taken over
+    heartbeat: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "listener_batches"
+        indexes = [
+            [("status", pymongo.ASCENDING), ("heartbeat", pymongo.ASCENDING)],
+        ]
+
+
+class EventListenerBatchOut(EventListenerBatchDB):
+    jobs: Dict[str, int] = {}  # jobs of the batch by current status
+
+    class Config:
+        fields = {
+            "id": "id",
+            "folder_ids": {"exclude": True},
+            "last_id": {"exclude": True},
+            "heartbeat": {"exclude": True},
+        }
+
+
 class EventListenerJobMessage(BaseModel):
     """This describes contents of JSON object that is submitted to RabbitMQ for the Event Listeners/Extractors to consume."""
 
@@ -195,6 +273,7 @@ class EventListenerJobUpdateDB(Document, EventListenerJobUpdateBase):
                 ("job_id", pymongo.TEXT),
                 ("status", pymongo.TEXT),
             ],
+            [("job_id", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)],
         ]
 
 
@@ -2,6 +2,7 @@ import collections.abc
 from datetime import datetime
 from typing import Optional, List, Union
 
+import pymongo
 from beanie import Document
 from elasticsearch import Elasticsearch, NotFoundError
 from fastapi import HTTPException
@@ -248,6 +249,9 @@ class MetadataDB(Document, MetadataBase):
 
     class Settings:
         name = "metadata"
+        indexes = [
+            [("resource.resource_id", pymongo.ASCENDING)],
+        ]
 
     class Config:
         arbitrary_types_allowed = True
@@ -0,0 +1,46 @@
+from beanie import free_fall_migration
+from beanie.odm.operators.update.general import Set, Unset
+
+from app.models.authorization import AuthorizationDB
+from app.models.datasets import DatasetDB
+from app.models.files import FileDB
+from app.models.folders import FolderDB
+
+
+class Forward:
+    @free_fall_migration(document_models=[AuthorizationDB, DatasetDB, FileDB, FolderDB])
+    async def add_readers(self, session):
+        pipeline = [
+            {
+                "$group": {
+                    "_id": "$dataset_id",
+                    "creators": {"$addToSet": "$creator"},
+                    "user_ids": {"$push": "$user_ids"},
+                }
+            }
+        ]
+        async for group in AuthorizationDB.get_motor_collection().aggregate(
+            pipeline, session=session
+        ):
+            readers = set(group["creators"])
+            for user_ids in group["user_ids"]:
+                readers.update(user_ids)
+            update = Set({"readers": sorted(readers)})
+            await DatasetDB.find(DatasetDB.id == group["_id"], session=session).update(
+                update
+            )
+            await FileDB.find(
+                FileDB.dataset_id == group["_id"], session=session
+            ).update(update)
+            await FolderDB.find(
+                FolderDB.dataset_id == group["_id"], session=session
+            ).update(update)
+
+
+class Backward:
+    @free_fall_migration(document_models=[DatasetDB, FileDB, FolderDB])
+    async def remove_readers(self, session):
+        for model in (DatasetDB, FileDB, FolderDB):
+            await model.find_all(session=session).update(
+                Unset({"readers": ""}), session=session
+            )
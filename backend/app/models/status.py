@@ -1,3 +1,5 @@
+from enum import Enum
+
 from pydantic import BaseModel
 
 from app.config import settings
@@ -5,3 +7,12 @@ from app.config import settings
 
 class Status(BaseModel):
     version: str = settings.version
+
+
+class BackgroundJobStatus(str, Enum):
+    """Status of work running in the background, such as deletions and listener batches. See app/background.py."""
+
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
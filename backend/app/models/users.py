@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
+import pymongo
 from beanie import Document
 from passlib.context import CryptContext
 from pydantic import Field, EmailStr, BaseModel
@@ -26,6 +27,9 @@ class UserLogin(BaseModel):
 class UserDoc(Document, UserBase):
     class Settings:
         name = "users"
+        indexes = [
+            [("email", pymongo.ASCENDING)],
+        ]
 
 
 class UserDB(UserDoc):
@@ -55,6 +59,10 @@ class UserAPIKeyBase(BaseModel):
 class UserAPIKeyDB(Document, UserAPIKeyBase):
     class Settings:
         name = "user_keys"
+        indexes = [
+            [("key", pymongo.ASCENDING)],
+            [("user", pymongo.ASCENDING)],
+        ]
 
 
 class UserAPIKeyOut(UserAPIKeyDB):
@@ -71,3 +79,7 @@ class ListenerAPIKeyBase(UserAPIKeyBase):
 class ListenerAPIKeyDB(Document, ListenerAPIKeyBase):
     class Settings:
         name = "listener_keys"
+        indexes = [
+            [("key", pymongo.ASCENDING)],
+            [("user", pymongo.ASCENDING)],
+        ]
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from app import dependencies
+from app.config import settings
+from app.models.files import FileDB, FileOut
+from app.models.users import UserOut
+from app.routers.feeds import check_feed_listeners
+from app.search.index import index_files
+from app.search.matcher import feed_matcher
+
+logger = logging.getLogger(__name__)
+
+
+class PostIngestPipeline:
+    """Work that follows a file upload but that the uploader should not wait for.
+
+    Uploads only `submit()` the new file; a pool of workers then queues it for bulk indexing in Elasticsearch and
+    submits it to the listeners of matching feeds, waiting for the file to be searchable only if a feed needs it.
+    Failures are logged and do not affect the upload. The queue is bounded so a burst of uploads slows down instead
+    of growing memory without limit.
+    """
+
+    def __init__(self, workers: int, maxsize: int, batch_size: int):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"post-ingest-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self, timeout: float = 30):
+        """Give queued files a chance to be processed, then stop the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Stopping post-ingest pipeline with {self._queue.qsize()} files not processed"
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def submit(self, file: FileOut, user: UserOut):
+        if not self._tasks:
+            await self.start()
+        await self._queue.put((file, user))
+
+    async def _work(self):
+        while True:
+            # Take whatever else is already waiting, so files uploaded together are indexed together
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self.process(batch)
+            except Exception:
+                logger.exception(
+                    f"Post-ingest processing of files {[str(f.id) for f, _ in batch]} failed"
+                )
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def process(self, batch: List[Tuple[FileOut, UserOut]]):
+        # Files deleted while waiting here already had their document removed from the index; don't add it back
+        existing = set(
+            await FileDB.get_motor_collection().distinct(
+                "_id", {"_id": {"$in": [file.id for file, _ in batch]}}
+            )
+        )
+        batch = [(file, user) for file, user in batch if file.id in existing]
+        if not batch:
+            return
+        es = await dependencies.get_elasticsearchclient()
+        files = [file for file, _ in batch]
+        if await feed_matcher.uses_elasticsearch():
+            # Some feeds are evaluated with Elasticsearch queries, so the files have to be searchable first
+            await asyncio.gather(*await index_files(es, files, refresh="wait_for"))
+        else:
+            await index_files(es, files)
+        for file, user in batch:
+            try:
+                await check_feed_listeners(
+                    es, file, user, await dependencies.get_rabbitmq()
+                )
+            except Exception:
+                logger.exception(f"Submitting file {file.id} to feeds failed")
+
+
+post_ingest = PostIngestPipeline(
+    settings.POST_INGEST_WORKERS,
+    settings.POST_INGEST_QUEUE_SIZE,
+    settings.POST_INGEST_BATCH_SIZE,
+)
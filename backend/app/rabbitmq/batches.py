@@ -0,0 +1,116 @@
+from datetime import datetime
+from typing import Dict
+
+from beanie import PydanticObjectId
+from beanie.odm.operators.update.general import Inc, Set as SetFields
+from beanie.operators import In
+
+from app import dependencies
+from app.background import LeasedRunner
+from app.config import settings
+from app.deletion import folder_tree
+from app.models.files import FileDB
+from app.models.folders import FolderDB
+from app.models.listeners import (
+    EventListenerBatchDB,
+    EventListenerBatchIn,
+    EventListenerJobDB,
+)
+from app.models.users import UserOut
+from app.rabbitmq.listeners import submit_file_jobs
+from app.routers.users import get_user_job_key
+
+
+class BatchSubmitter(LeasedRunner):
+    """Run a listener on many files in the background, `LISTENER_BATCH_SIZE` files at a time.
+
+    Files are read in `_id` order, one page after the other, and the jobs of each page are created with
+    `submit_file_jobs()`: one `insert_many` and one round of publishing instead of a request per file. The counts on
+    the batch are updated after every page and at most `LISTENER_BATCH_WORKERS` batches run at once.
+
+    The last file submitted is saved with the counts, so a batch interrupted by a restart is continued from there by
+    the first process to notice its heartbeat is older than `LISTENER_BATCH_LEASE` seconds. Only the page being
+    submitted when it stopped can get its jobs twice.
+    """
+
+    document_model = EventListenerBatchDB
+
+    def __init__(self, workers: int, batch_size: int, lease: int):
+        super().__init__(workers, lease)
+        self.batch_size = batch_size
+
+    async def create(
+        self, batch_in: EventListenerBatchIn, user: UserOut
+    ) -> EventListenerBatchDB:
+        """Save the batch with the number of matching files and start submitting it."""
+        batch = EventListenerBatchDB(**batch_in.dict(), creator=user)
+        if batch.folder_id is not None:
+            if (folder := await FolderDB.get(batch.folder_id)) is not None:
+                batch.dataset_id = folder.dataset_id
+                batch.folder_ids = await folder_tree(folder)
+        batch.files = await FileDB.find(self.condition(batch)).count()
+        await batch.insert()
+        self.submit(batch)
+        return batch
+
+    @staticmethod
+    def condition(batch: EventListenerBatchDB):
+        if batch.folder_id is not None:
+            return In(FileDB.folder_id, batch.folder_ids)
+        if batch.dataset_id is not None:
+            return FileDB.dataset_id == batch.dataset_id
+        return In(FileDB.id, batch.file_ids)
+
+    async def run(self, batch: EventListenerBatchDB):
+        await self.submit_files(batch)
+
+    async def submit_files(self, batch: EventListenerBatchDB):
+        rabbitmq_client = await dependencies.get_rabbitmq()
+        secret_key = await get_user_job_key(batch.creator.email)
+        while True:
+            query = FileDB.find(self.condition(batch))
+            if batch.last_id is not None:
+                query = query.find(FileDB.id > batch.last_id)
+            files = await query.sort("_id").limit(self.batch_size).to_list()
+            if not files:
+                return
+            failed = await submit_file_jobs(
+                files,
+                batch.listener_id,
+                batch.parameters,
+                batch.creator,
+                rabbitmq_client,
+                batch_id=batch.id,
+                secret_key=secret_key,
+            )
+            await batch.update(
+                Inc(
+                    {
+                        EventListenerBatchDB.submitted: len(files) - len(failed),
+                        EventListenerBatchDB.failed: len(failed),
+                    }
+                ),
+                SetFields(
+                    {
+                        EventListenerBatchDB.last_id: files[-1].id,
+                        EventListenerBatchDB.heartbeat: datetime.utcnow(),
+                    }
+                ),
+            )
+
+
+async def job_counts(batch_id: PydanticObjectId) -> Dict[str, int]:
+    """Number of jobs of a batch by status."""
+    results = (
+        await EventListenerJobDB.find(EventListenerJobDB.batch_id == batch_id)
+        .aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+        .to_list()
+    )
+    return {result["_id"]: result["count"] for result in results}
+
+
+batches = BatchSubmitter(
+    settings.LISTENER_BATCH_WORKERS,
+    settings.LISTENER_BATCH_SIZE,
+    settings.LISTENER_BATCH_LEASE,
+)
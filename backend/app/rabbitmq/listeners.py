@@ -1,51 +1,52 @@
-import json
-import random
-import string
+import asyncio
+from typing import List, Optional, Set
 
-import pika
+from beanie import PydanticObjectId
+from beanie.odm.operators.update.general import Set as SetFields
+from beanie.operators import In
 from fastapi import Depends
-from pika.adapters.blocking_connection import BlockingChannel
 
 from app import dependencies
-from app.models.config import ConfigEntryDB
 from app.models.datasets import DatasetOut
-from app.models.files import FileOut
+from app.models.files import FileDB, FileOut
 from app.models.listeners import (
     EventListenerJobDB,
+    EventListenerJobStatus,
     EventListenerJobMessage,
     EventListenerDatasetJobMessage,
 )
 from app.models.mongomodel import MongoDBRef
 from app.models.users import UserOut
+from app.rabbitmq.publisher import JobPublisher
 from app.routers.users import get_user_job_key
 
+# Updates of jobs whose message could not be sent, kept so they are not garbage collected while running
+_pending_updates: Set[asyncio.Task] = set()
 
-async def create_reply_queue():
-    channel: BlockingChannel = dependencies.get_rabbitmq()
-
-    if (
-        config_entry := await ConfigEntryDB.find_one({"key": "instance_id"})
-    ) is not None:
-        instance_id = config_entry.value
-    else:
-        # If no ID has been generated for this instance, generate a 10-digit alphanumeric identifier
-        instance_id = "".join(
-            random.choice(
-                string.ascii_uppercase + string.ascii_lowercase + string.digits
-            )
-            for _ in range(10)
-        )
-        config_entry = ConfigEntryDB(key="instance_id", value=instance_id)
-        await config_entry.insert()
 
-    queue_name = "clowder.%s" % instance_id
-    channel.exchange_declare(exchange="clowder", durable=True)
-    result = channel.queue_declare(
-        queue=queue_name, durable=True, exclusive=False, auto_delete=False
+async def mark_not_sent(job_ids: List[PydanticObjectId]):
+    """Mark jobs whose message RabbitMQ did not accept as failed, so they don't stay CREATED."""
+    await EventListenerJobDB.find(In(EventListenerJobDB.id, job_ids)).update(
+        SetFields(
+            {
+                EventListenerJobDB.status: EventListenerJobStatus.ERROR,
+                EventListenerJobDB.latest_message: "Could not be sent to the listener",
+            }
+        )
     )
-    queue_name = result.method.queue
-    channel.queue_bind(exchange="clowder", queue=queue_name)
-    return queue_name
+
+
+def _check_sent(job_id: PydanticObjectId, sent: asyncio.Future):
+    """Call `mark_not_sent()` once the publisher gives up on the message of `job_id`, without making the request
+    wait for the broker."""
+
+    def done(future: asyncio.Future):
+        if not future.result():
+            task = asyncio.create_task(mark_not_sent([job_id]))
+            _pending_updates.add(task)
+            task.add_done_callback(_pending_updates.discard)
+
+    sent.add_done_callback(done)
 
 
 async def submit_file_job(
@@ -53,7 +54,7 @@ async def submit_file_job(
     routing_key: str,
     parameters: dict,
     user: UserOut,
-    rabbitmq_client: BlockingChannel,
+    rabbitmq_client: JobPublisher,
 ):
     # Create an entry in job history with unique ID
     job = EventListenerJobDB(
@@ -76,25 +77,71 @@ async def submit_file_job(
         job_id=str(job.id),
         parameters=parameters,
     )
-    reply_to = await create_reply_queue()
-    print("RABBITMQ_CLIENT: " + str(rabbitmq_client))
-    rabbitmq_client.basic_publish(
-        exchange="",
-        routing_key=routing_key,
-        body=json.dumps(msg_body.dict(), ensure_ascii=False),
-        properties=pika.BasicProperties(
-            content_type="application/json", delivery_mode=1, reply_to=reply_to
-        ),
-    )
+    _check_sent(job.id, await rabbitmq_client.publish(routing_key, msg_body.dict()))
     return str(job.id)
 
 
+async def submit_file_jobs(
+    files: List[FileDB],
+    routing_key: str,
+    parameters: dict,
+    user: UserOut,
+    rabbitmq_client: JobPublisher,
+    batch_id: Optional[PydanticObjectId] = None,
+    secret_key: Optional[str] = None,
+) -> List[PydanticObjectId]:
+    """Like `submit_file_job()` for many files: the jobs are inserted with one `insert_many` and all messages are
+    queued before waiting for RabbitMQ to confirm them. Returns the ids of the jobs that could not be sent, which are
+    marked as failed."""
+    jobs = [
+        EventListenerJobDB(
+            id=PydanticObjectId(),
+            listener_id=routing_key,
+            creator=user,
+            resource_ref=MongoDBRef(
+                collection="files",
+                resource_id=file.id,
+                version=file.version_num,
+            ),
+            parameters=parameters,
+            batch_id=batch_id,
+        )
+        for file in files
+    ]
+    if not jobs:
+        return []
+    await EventListenerJobDB.insert_many(jobs)
+
+    if secret_key is None:
+        secret_key = await get_user_job_key(user.email)
+    confirmations = []
+    for file, job in zip(files, jobs):
+        msg_body = EventListenerJobMessage(
+            filename=file.name,
+            fileSize=file.bytes,
+            id=str(file.id),
+            datasetId=str(file.dataset_id),
+            secretKey=secret_key,
+            job_id=str(job.id),
+            parameters=parameters,
+        )
+        confirmations.append(
+            await rabbitmq_client.publish(routing_key, msg_body.dict())
+        )
+    sent = await asyncio.gather(*confirmations)
+
+    failed = [job.id for job, ok in zip(jobs, sent) if not ok]
+    if failed:
+        await mark_not_sent(failed)
+    return failed
+
+
 async def submit_dataset_job(
     dataset_out: DatasetOut,
     routing_key: str,
     parameters: dict,
     user: UserOut,
-    rabbitmq_client: BlockingChannel = Depends(dependencies.get_rabbitmq),
+    rabbitmq_client: JobPublisher = Depends(dependencies.get_rabbitmq),
 ):
     # Create an entry in job history with unique ID
     job = EventListenerJobDB(
@@ -113,13 +160,5 @@ async def submit_dataset_job(
         secretKey=current_secretKey,
         job_id=str(job.id),
     )
-    reply_to = await create_reply_queue()
-    rabbitmq_client.basic_publish(
-        exchange="",
-        routing_key=routing_key,
-        body=json.dumps(msg_body.dict(), ensure_ascii=False),
-        properties=pika.BasicProperties(
-            content_type="application/json", delivery_mode=1, reply_to=reply_to
-        ),
-    )
+    _check_sent(job.id, await rabbitmq_client.publish(routing_key, msg_body.dict()))
     return str(job.id)
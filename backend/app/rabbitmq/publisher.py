@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import random
+import string
+from typing import List, Optional
+
+from aio_pika import DeliveryMode, Message, connect_robust
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
+from aio_pika.exceptions import AMQPError, ChannelInvalidStateError
+from aio_pika.pool import Pool
+
+from app.config import settings
+from app.models.config import ConfigEntryDB
+
+logger = logging.getLogger(__name__)
+
+
+async def get_instance_id() -> str:
+    """Identifier of this Clowder instance, generated and stored in the config collection the first time."""
+    if (
+        config_entry := await ConfigEntryDB.find_one({"key": "instance_id"})
+    ) is not None:
+        return config_entry.value
+    # If no ID has been generated for this instance, generate a 10-digit alphanumeric identifier
+    instance_id = "".join(
+        random.choice(string.ascii_uppercase + string.ascii_lowercase + string.digits)
+        for _ in range(10)
+    )
+    await ConfigEntryDB(key="instance_id", value=instance_id).insert()
+    return instance_id
+
+
+class JobPublisher:
+    """Send job messages to the listener queues over one persistent aio-pika connection.
+
+    `start()` connects, looks up the instance id and declares the `clowder` exchange and the reply queue extractors
+    send their status updates to, once. `publish()` then only puts the message on an in-memory queue; workers take
+    channels (opened with publisher confirms) from a pool of `RABBITMQ_PUBLISH_CHANNELS`, send the messages and wait
+    for the broker to confirm them. Failed sends are retried after the connection recovers, then logged.
+
+    Like BulkIndexer, `publish()` returns a future resolving to whether the message was confirmed, for callers that
+    need to wait for it.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        channels: int = settings.RABBITMQ_PUBLISH_CHANNELS,
+        queue_size: int = settings.RABBITMQ_PUBLISH_QUEUE_SIZE,
+        max_retries: int = 3,
+    ):
+        self.url = url
+        self.channels = channels
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.reply_to: Optional[str] = None
+        self._connection: Optional[AbstractRobustConnection] = None
+        self._pool: Optional[Pool] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._connection = await connect_robust(self.url)
+        self._pool = Pool(self._open_channel, max_size=self.channels)
+        self.reply_to = await self._declare_reply_queue()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"rabbitmq-publish-{i}")
+            for i in range(self.channels)
+        ]
+
+    async def stop(self, timeout: float = 10):
+        """Give queued messages a chance to be sent, then close the connection."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Closing RabbitMQ publisher with {self._queue.qsize()} messages not sent"
+                )
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def publish(self, routing_key: str, body: dict) -> asyncio.Future:
+        """Queue a JSON message for the listener queue `routing_key`."""
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put((routing_key, body, done))
+        return done
+
+    async def _open_channel(self) -> AbstractChannel:
+        return await self._connection.channel(publisher_confirms=True)
+
+    async def _declare_reply_queue(self) -> str:
+        instance_id = await get_instance_id()
+        async with self._pool.acquire() as channel:
+            exchange = await channel.declare_exchange("clowder", durable=True)
+            queue = await channel.declare_queue(
+                "clowder.%s" % instance_id,
+                durable=True,
+                exclusive=False,
+                auto_delete=False,
+            )
+            await queue.bind(exchange)
+        return queue.name
+
+    async def _work(self):
+        while True:
+            routing_key, body, done = await self._queue.get()
+            try:
+                await self._send(routing_key, body)
+                done.set_result(True)
+            except Exception:
+                logger.exception(
+                    f"Publishing job {body.get('job_id')} to {routing_key} failed"
+                )
+                done.set_result(False)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, routing_key: str, body: dict):
+        message = Message(
+            json.dumps(body, ensure_ascii=False).encode(),
+            content_type="application/json",
+            delivery_mode=DeliveryMode.NOT_PERSISTENT,
+            reply_to=self.reply_to,
+        )
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._pool.acquire() as channel:
+                    # Not mandatory: a message for a listener without a queue is dropped, as before
+                    await channel.default_exchange.publish(
+                        message, routing_key=routing_key, mandatory=False, timeout=30
+                    )
+                return
+            except (
+                AMQPError,
+                ChannelInvalidStateError,
+                ConnectionError,
+                asyncio.TimeoutError,
+            ) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Publishing to {routing_key} failed, retrying: {e}")
+                await asyncio.sleep(min(2**attempt * 0.5, 10))
@@ -10,7 +10,12 @@ from passlib.hash import bcrypt
 
 from beanie import PydanticObjectId
 
-from app.keycloak_auth import create_user, get_current_user
+from app.keycloak_auth import (
+    create_user,
+    get_current_user,
+    get_principal,
+    Principal,
+)
 from app.keycloak_auth import keycloak_openid
 from app.models.datasets import DatasetDB
 from app.models.users import UserDB, UserIn, UserOut, UserLogin
@@ -93,10 +98,11 @@ async def authenticate_user(email: str, password: str):
     return user
 
 
-async def get_admin(dataset_id: str = None, current_username=Depends(get_current_user)):
-    if (
-        current_user := await UserDB.find_one(UserDB.email == current_username.email)
-    ) is not None:
+async def get_admin(
+    dataset_id: str = None, principal: Principal = Depends(get_principal)
+):
+    # Shares the user document loaded for this request by get_current_user
+    if (current_user := await principal.user_db()) is not None:
         if current_user.admin:
             return current_user.admin
     elif (
@@ -104,7 +110,7 @@ async def get_admin(dataset_id: str = None, current_username=Depends(get_current
         and (dataset_db := await DatasetDB.get(PydanticObjectId(dataset_id)))
         is not None
     ):
-        return dataset_db.creator.email == current_username.email
+        return dataset_db.creator.email == principal.email
     else:
         return False
 
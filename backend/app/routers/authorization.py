@@ -6,6 +6,7 @@ from fastapi.exceptions import HTTPException
 from app.dependencies import get_elasticsearchclient
 from app.deps.authorization_deps import (
     Authorization,
+    refresh_dataset_readers,
     get_role_by_file,
     get_role_by_metadata,
     get_role_by_group,
@@ -30,7 +31,7 @@ from app.models.groups import GroupDB
 from app.models.pyobjectid import PyObjectId
 from app.models.users import UserDB
 from app.routers.authentication import get_admin
-from app.search.index import index_dataset
+from app.search.index import index_dataset_permissions
 
 router = APIRouter()
 
@@ -62,6 +63,7 @@ async def save_authorization(
         **authorization_in.dict(), creator=user, user_ids=user_ids
     )
     await authorization.insert()
+    await refresh_dataset_readers(dataset_id)
     return authorization.dict()
 
 
@@ -195,7 +197,8 @@ async def set_dataset_group_role(
                     for u in group.users:
                         auth_db.user_ids.append(u.user.email)
                     await auth_db.replace()
-                await index_dataset(es, DatasetOut(**dataset.dict()), auth_db.user_ids)
+                await refresh_dataset_readers(dataset.id)
+                await index_dataset_permissions(es, DatasetOut(**dataset.dict()))
                 return auth_db.dict()
             else:
                 # Create new role entry for this dataset
@@ -210,7 +213,8 @@ async def set_dataset_group_role(
                     user_ids=user_ids,
                 )
                 await auth_db.insert()
-                await index_dataset(es, DatasetOut(**dataset.dict()), auth_db.user_ids)
+                await refresh_dataset_readers(dataset.id)
+                await index_dataset_permissions(es, DatasetOut(**dataset.dict()))
                 return auth_db.dict()
         else:
             raise HTTPException(status_code=404, detail=f"Group {group_id} not found")
@@ -256,7 +260,8 @@ async def set_dataset_user_role(
                 else:
                     auth_db.user_ids.append(username)
                     await auth_db.save()
-                await index_dataset(es, DatasetOut(**dataset.dict()), auth_db.user_ids)
+                await refresh_dataset_readers(dataset.id)
+                await index_dataset_permissions(es, DatasetOut(**dataset.dict()))
                 return auth_db.dict()
             else:
                 # Create a new entry
@@ -267,7 +272,8 @@ async def set_dataset_user_role(
                     user_ids=[username],
                 )
                 await auth_db.insert()
-                await index_dataset(es, DatasetOut(**dataset.dict()), [username])
+                await refresh_dataset_readers(dataset.id)
+                await index_dataset_permissions(es, DatasetOut(**dataset.dict()))
                 return auth_db.dict()
         else:
             raise HTTPException(status_code=404, detail=f"User {username} not found")
@@ -302,7 +308,8 @@ async def remove_dataset_group_role(
                         auth_db.user_ids.remove(u.user.email)
                 await auth_db.save()
                 # Update elasticsearch index with new users
-                await index_dataset(es, DatasetOut(**dataset.dict()), auth_db.user_ids)
+                await refresh_dataset_readers(dataset.id)
+                await index_dataset_permissions(es, DatasetOut(**dataset.dict()))
                 return auth_db.dict()
         else:
             raise HTTPException(status_code=404, detail=f"Group {group_id} not found")
@@ -334,7 +341,8 @@ async def remove_dataset_user_role(
                 auth_db.user_ids.remove(username)
                 await auth_db.save()
                 # Update elasticsearch index with updated users
-                await index_dataset(es, DatasetOut(**dataset.dict()), auth_db.user_ids)
+                await refresh_dataset_readers(dataset.id)
+                await index_dataset_permissions(es, DatasetOut(**dataset.dict()))
                 return auth_db.dict()
         else:
             raise HTTPException(status_code=404, detail=f"User {username} not found")
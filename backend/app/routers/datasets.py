@@ -1,12 +1,11 @@
 import datetime
 import hashlib
-import io
+import json
 import os
-import shutil
 import tempfile
 import zipfile
 from collections.abc import Mapping, Iterable
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
 from beanie import PydanticObjectId
 from beanie.odm.operators.update.general import Inc
@@ -21,17 +20,21 @@ from fastapi import (
     File,
     UploadFile,
     Request,
+    Response,
 )
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer
-from minio import Minio
-from pika.adapters.blocking_connection import BlockingChannel
 from rocrate.model.person import Person
 from rocrate.rocrate import ROCrate
 
 from app import dependencies
 from app.config import settings
-from app.deps.authorization_deps import Authorization, CheckStatus
+from app.deletion import deletions
+from app.deps.authorization_deps import (
+    Authorization,
+    CheckStatus,
+    load_dataset,
+)
 from app.keycloak_auth import (
     get_token,
     get_user,
@@ -44,22 +47,24 @@ from app.models.datasets import (
     DatasetDB,
     DatasetOut,
     DatasetPatch,
-    DatasetDBViewList,
     DatasetStatus,
 )
-from app.models.files import FileOut, FileDB, FileDBViewList
-from app.models.folders import FolderOut, FolderIn, FolderDB, FolderDBViewList
+from app.models.files import FileOut, FileDB
+from app.models.folders import FolderOut, FolderIn, FolderDB
 from app.models.metadata import MetadataDB
 from app.models.pyobjectid import PyObjectId
 from app.models.thumbnails import ThumbnailDB
 from app.models.users import UserOut
 from app.rabbitmq.listeners import submit_dataset_job
+from app.rabbitmq.publisher import JobPublisher
 from app.routers.authentication import get_admin
-from app.routers.files import add_file_entry, remove_file_entry
-from app.search.connect import (
-    delete_document_by_id,
-)
+from app.routers.files import add_file_entry
+from app.routers.folders import FolderPathResolver
+from app.routers.utils import NEWEST_FIRST, OLDEST_FIRST, paginate
 from app.search.index import index_dataset
+from app.storage.archive import StreamingZip
+from app.storage.client import AsyncStorage
+from app.storage.prefetch import prefetch
 
 router = APIRouter()
 security = HTTPBearer()
@@ -158,7 +163,7 @@ async def _create_folder_structure(
             "name": k,
             "parent_folder": parent_folder_id,
         }
-        folder_db = FolderDB(**folder_dict, creator=user)
+        folder_db = FolderDB(**folder_dict, creator=user, readers=[user.email])
         await folder_db.insert()
 
         # Store ID and call recursively on child folders
@@ -172,25 +177,13 @@ async def _create_folder_structure(
     return folder_lookup
 
 
-async def _get_folder_hierarchy(
-    folder_id: str,
-    hierarchy: str,
-):
-    """Generate a string of nested path to folder for use in zip file creation."""
-    folder = await FolderDB.get(PydanticObjectId(folder_id))
-    hierarchy = folder.name + "/" + hierarchy
-    if folder.parent_folder is not None:
-        hierarchy = await _get_folder_hierarchy(folder.parent_folder, hierarchy)
-    return hierarchy
-
-
 @router.post("", response_model=DatasetOut)
 async def save_dataset(
     dataset_in: DatasetIn,
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
 ):
-    dataset = DatasetDB(**dataset_in.dict(), creator=user)
+    dataset = DatasetDB(**dataset_in.dict(), creator=user, readers=[user.email])
     await dataset.insert()
 
     # Create authorization entry
@@ -207,37 +200,28 @@ async def save_dataset(
 
 @router.get("", response_model=List[DatasetOut])
 async def get_datasets(
+    response: Response,
     user_id=Depends(get_user),
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
     mine: bool = False,
     admin=Depends(get_admin),
 ):
+    """Datasets the user can see, newest first. See `paginate()` for `cursor`."""
     if admin:
-        datasets = await DatasetDBViewList.find(
-            sort=(-DatasetDBViewList.created),
-            skip=skip,
-            limit=limit,
-        ).to_list()
+        query = DatasetDB.find()
     elif mine:
-        datasets = await DatasetDBViewList.find(
-            DatasetDBViewList.creator.email == user_id,
-            sort=(-DatasetDBViewList.created),
-            skip=skip,
-            limit=limit,
-        ).to_list()
+        query = DatasetDB.find(DatasetDB.creator.email == user_id)
     else:
-        datasets = await DatasetDBViewList.find(
+        query = DatasetDB.find(
             Or(
-                DatasetDBViewList.creator.email == user_id,
-                DatasetDBViewList.auth.user_ids == user_id,
-                DatasetDBViewList.status == DatasetStatus.AUTHENTICATED.name,
-            ),
-            sort=(-DatasetDBViewList.created),
-            skip=skip,
-            limit=limit,
-        ).to_list()
-
+                DatasetDB.creator.email == user_id,
+                DatasetDB.readers == user_id,
+                DatasetDB.status == DatasetStatus.AUTHENTICATED.name,
+            )
+        )
+    datasets = await paginate(query, NEWEST_FIRST, response, cursor, skip, limit)
     return [dataset.dict() for dataset in datasets]
 
 
@@ -246,8 +230,9 @@ async def get_dataset(
     dataset_id: str,
     authenticated: bool = Depends(CheckStatus("AUTHENTICATED")),
     allow: bool = Depends(Authorization("viewer")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         return dataset.dict()
     raise HTTPException(status_code=404, detail=f"Dataset {dataset_id} not found")
 
@@ -255,28 +240,32 @@ async def get_dataset(
 @router.get("/{dataset_id}/files", response_model=List[FileOut])
 async def get_dataset_files(
     dataset_id: str,
+    response: Response,
     folder_id: Optional[str] = None,
     authenticated: bool = Depends(CheckStatus("AUTHENTICATED")),
     allow: bool = Depends(Authorization("viewer")),
     user_id=Depends(get_user),
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
 ):
     if authenticated:
         query = [
-            FileDBViewList.dataset_id == ObjectId(dataset_id),
+            FileDB.dataset_id == ObjectId(dataset_id),
         ]
     else:
         query = [
-            FileDBViewList.dataset_id == ObjectId(dataset_id),
+            FileDB.dataset_id == ObjectId(dataset_id),
             Or(
-                FileDBViewList.creator.email == user_id,
-                FileDBViewList.auth.user_ids == user_id,
+                FileDB.creator.email == user_id,
+                FileDB.readers == user_id,
             ),
         ]
     if folder_id is not None:
-        query.append(FileDBViewList.folder_id == ObjectId(folder_id))
-    files = await FileDBViewList.find(*query).skip(skip).limit(limit).to_list()
+        query.append(FileDB.folder_id == ObjectId(folder_id))
+    files = await paginate(
+        FileDB.find(*query), OLDEST_FIRST, response, cursor, skip, limit
+    )
     return [file.dict() for file in files]
 
 
@@ -287,8 +276,9 @@ async def edit_dataset(
     user=Depends(get_current_user),
     es=Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(Authorization("editor")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         # TODO: Refactor this with permissions checks etc.
         dataset.update(dataset_info)
         dataset.modified = datetime.datetime.utcnow()
@@ -307,8 +297,9 @@ async def patch_dataset(
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(Authorization("editor")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         # TODO: Update method not working properly
         if dataset_info.name is not None:
             dataset.name = dataset_info.name
@@ -327,29 +318,15 @@ async def patch_dataset(
 @router.delete("/{dataset_id}")
 async def delete_dataset(
     dataset_id: str,
-    fs: Minio = Depends(dependencies.get_fs),
-    es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
+    user=Depends(get_current_user),
     allow: bool = Depends(Authorization("editor")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
-        # delete from elasticsearch
-        delete_document_by_id(es, settings.elasticsearch_index, dataset_id)
-        # delete dataset first to minimize files/folder being uploaded to a delete dataset
-        await dataset.delete()
-        await MetadataDB.find(
-            MetadataDB.resource.resource_id == PydanticObjectId(dataset_id)
-        ).delete()
-        async for file in FileDB.find(
-            FileDB.dataset_id == PydanticObjectId(dataset_id)
-        ):
-            await remove_file_entry(file.id, fs, es)
-        await FolderDB.find(
-            FolderDB.dataset_id == PydanticObjectId(dataset_id)
-        ).delete()
-        await AuthorizationDB.find(
-            AuthorizationDB.dataset_id == ObjectId(dataset_id)
-        ).delete()
-        return {"deleted": dataset_id}
+    """Delete a dataset. The dataset is gone once this returns, its files and folders are removed in the background;
+    follow the progress at /deletions/{job_id}."""
+    if dataset is not None:
+        job = await deletions.delete_dataset(dataset, user)
+        return {"deleted": dataset_id, "job_id": str(job.id)}
     raise HTTPException(status_code=404, detail=f"Dataset {dataset_id} not found")
 
 
@@ -359,8 +336,9 @@ async def add_folder(
     folder_in: FolderIn,
     user=Depends(get_current_user),
     allow: bool = Depends(Authorization("uploader")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         parent_folder = folder_in.parent_folder
         if parent_folder is not None:
             if (await FolderDB.get(PydanticObjectId(parent_folder))) is None:
@@ -368,7 +346,10 @@ async def add_folder(
                     status_code=400, detail=f"Parent folder {parent_folder} not found"
                 )
         new_folder = FolderDB(
-            **folder_in.dict(), creator=user, dataset_id=PyObjectId(dataset_id)
+            **folder_in.dict(),
+            creator=user,
+            dataset_id=PyObjectId(dataset_id),
+            readers=dataset.readers,
         )
         await new_folder.insert()
         return new_folder.dict()
@@ -378,31 +359,36 @@ async def add_folder(
 @router.get("/{dataset_id}/folders", response_model=List[FolderOut])
 async def get_dataset_folders(
     dataset_id: str,
+    response: Response,
     parent_folder: Optional[str] = None,
     user_id=Depends(get_user),
     allow: bool = Depends(Authorization("viewer")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
     authenticated: bool = Depends(CheckStatus("authenticated")),
     skip: int = 0,
     limit: int = 10,
+    cursor: Optional[str] = None,
 ):
-    if (await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         if authenticated:
             query = [
-                FolderDBViewList.dataset_id == ObjectId(dataset_id),
+                FolderDB.dataset_id == ObjectId(dataset_id),
             ]
         else:
             query = [
-                FolderDBViewList.dataset_id == ObjectId(dataset_id),
+                FolderDB.dataset_id == ObjectId(dataset_id),
                 Or(
-                    FolderDBViewList.creator.email == user_id,
-                    FolderDBViewList.auth.user_ids == user_id,
+                    FolderDB.creator.email == user_id,
+                    FolderDB.readers == user_id,
                 ),
             ]
         if parent_folder is not None:
-            query.append(FolderDBViewList.parent_folder == ObjectId(parent_folder))
+            query.append(FolderDB.parent_folder == ObjectId(parent_folder))
         else:
-            query.append(FolderDBViewList.parent_folder == None)
-        folders = await FolderDBViewList.find(*query).skip(skip).limit(limit).to_list()
+            query.append(FolderDB.parent_folder == None)
+        folders = await paginate(
+            FolderDB.find(*query), OLDEST_FIRST, response, cursor, skip, limit
+        )
         return [folder.dict() for folder in folders]
     raise HTTPException(status_code=404, detail=f"Dataset {dataset_id} not found")
 
@@ -411,36 +397,18 @@ async def get_dataset_folders(
 async def delete_folder(
     dataset_id: str,
     folder_id: str,
-    fs: Minio = Depends(dependencies.get_fs),
-    es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
+    user=Depends(get_current_user),
     allow: bool = Depends(Authorization("editor")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
-        if (folder := await FolderDB.get(PydanticObjectId(folder_id))) is not None:
-            # delete current folder and files
-            async for file in FileDB.find(FileDB.folder_id == ObjectId(folder_id)):
-                await remove_file_entry(file.id, fs, es)
-
-            # recursively delete child folder and files
-            async def _delete_nested_folders(parent_folder_id):
-                while (
-                    await FolderDB.find_one(
-                        FolderDB.dataset_id == ObjectId(dataset_id),
-                        FolderDB.parent_folder == ObjectId(parent_folder_id),
-                    )
-                ) is not None:
-                    async for subfolder in FolderDB.find(
-                        FolderDB.dataset_id == PydanticObjectId(dataset_id),
-                        FolderDB.parent_folder == PydanticObjectId(parent_folder_id),
-                    ):
-                        async for file in FileDB.find(FileDB.folder_id == subfolder.id):
-                            await remove_file_entry(file.id, fs, es)
-                        await _delete_nested_folders(subfolder.id)
-                        await subfolder.delete()
-
-            await _delete_nested_folders(folder_id)
-            await folder.delete()
-            return {"deleted": folder_id}
+    """Delete a folder with its subfolders and files. The folder is gone once this returns, its contents are removed
+    in the background; follow the progress at /deletions/{job_id}."""
+    if dataset is not None:
+        if (
+            folder := await FolderDB.get(PydanticObjectId(folder_id))
+        ) is not None and folder.dataset_id == dataset.id:
+            job = await deletions.delete_folder(folder, user)
+            return {"deleted": folder_id, "job_id": str(job.id)}
         else:
             raise HTTPException(status_code=404, detail=f"Folder {folder_id} not found")
     raise HTTPException(status_code=404, detail=f"Dataset {dataset_id} not found")
@@ -451,19 +419,23 @@ async def save_file(
     dataset_id: str,
     folder_id: Optional[str] = None,
     user=Depends(get_current_user),
-    fs: Minio = Depends(dependencies.get_fs),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     file: UploadFile = File(...),
-    es=Depends(dependencies.get_elasticsearchclient),
-    rabbitmq_client: BlockingChannel = Depends(dependencies.get_rabbitmq),
     allow: bool = Depends(Authorization("uploader")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         if user is None:
             raise HTTPException(
                 status_code=401, detail=f"User not found. Session might have expired."
             )
 
-        new_file = FileDB(name=file.filename, creator=user, dataset_id=dataset.id)
+        new_file = FileDB(
+            name=file.filename,
+            creator=user,
+            dataset_id=dataset.id,
+            readers=dataset.readers,
+        )
 
         if folder_id is not None:
             if (folder := await FolderDB.get(PydanticObjectId(folder_id))) is not None:
@@ -477,8 +449,6 @@ async def save_file(
             new_file,
             user,
             fs,
-            es,
-            rabbitmq_client,
             file.file,
             content_type=file.content_type,
         )
@@ -492,12 +462,11 @@ async def save_files(
     files: List[UploadFile],
     folder_id: Optional[str] = None,
     user=Depends(get_current_user),
-    fs: Minio = Depends(dependencies.get_fs),
-    es=Depends(dependencies.get_elasticsearchclient),
-    rabbitmq_client: BlockingChannel = Depends(dependencies.get_rabbitmq),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     allow: bool = Depends(Authorization("uploader")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         files_added = []
         for file in files:
             if user is None:
@@ -506,7 +475,12 @@ async def save_files(
                     detail=f"User not found. Session might have expired.",
                 )
 
-            new_file = FileDB(name=file.filename, creator=user, dataset_id=dataset.id)
+            new_file = FileDB(
+                name=file.filename,
+                creator=user,
+                dataset_id=dataset.id,
+                readers=dataset.readers,
+            )
 
             if folder_id is not None:
                 if (
@@ -522,8 +496,6 @@ async def save_files(
                 new_file,
                 user,
                 fs,
-                es,
-                rabbitmq_client,
                 file.file,
                 content_type=file.content_type,
             )
@@ -537,10 +509,8 @@ async def save_files(
 @router.post("/createFromZip", response_model=DatasetOut)
 async def create_dataset_from_zip(
     user=Depends(get_current_user),
-    fs: Minio = Depends(dependencies.get_fs),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     file: UploadFile = File(...),
-    es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
-    rabbitmq_client: BlockingChannel = Depends(dependencies.get_rabbitmq),
     token: str = Depends(get_token),
 ):
     if file.filename.endswith(".zip") == False:
@@ -559,7 +529,7 @@ async def create_dataset_from_zip(
             "name": file.filename.rstrip(".zip"),
             "description": "Uploaded as %s" % file.filename,
         }
-        dataset = DatasetDB(**dataset_in, creator=user)
+        dataset = DatasetDB(**dataset_in, creator=user, readers=[user.email])
         dataset.save()
 
         # Create folders
@@ -586,19 +556,20 @@ async def create_dataset_from_zip(
                             creator=user,
                             dataset_id=dataset.id,
                             folder_id=folder_id,
+                            readers=dataset.readers,
                         )
                     else:
                         new_file = FileDB(
-                            name=filename, creator=user, dataset_id=dataset.id
+                            name=filename,
+                            creator=user,
+                            dataset_id=dataset.id,
+                            readers=dataset.readers,
                         )
                     with open(extracted, "rb") as file_reader:
                         await add_file_entry(
                             new_file,
                             user,
                             fs,
-                            es,
-                            rabbitmq_client,
-                            token,
                             file_reader,
                         )
                     if os.path.isfile(extracted):
@@ -607,153 +578,136 @@ async def create_dataset_from_zip(
     return dataset.dict()
 
 
+async def _stream_dataset_archive(
+    dataset: DatasetDB,
+    user: UserOut,
+    fs: AsyncStorage,
+    prefetch_window: int = settings.MINIO_PREFETCH_WINDOW,
+) -> AsyncIterator[bytes]:
+    """Generate a BagIt/RO-Crate zip of the dataset while it is being sent. Objects are copied from Minio into the
+    archive chunk by chunk and their MD5 is computed on the way, so memory use does not depend on file sizes.
+    Up to `prefetch_window` files are fetched ahead of the one being written.
+    Tag files and the RO-Crate metadata are written last since they describe the payload.
+    """
+    dataset_id = str(dataset.id)
+    archive = StreamingZip()
+    crate = ROCrate()
+    user_full_name = user.first_name + " " + user.last_name
+    user_crate_id = str(user.id)
+    crate.add(Person(crate, user_crate_id, properties={"name": user_full_name}))
+
+    def add_entry(dest_path: str, content: str, name: str):
+        archive.writestr(dest_path, content)
+        crate.add_file(dest_path=dest_path, properties={"name": name})
+
+    # Write dataset metadata if found
+    metadata = await MetadataDB.find(
+        MetadataDB.resource.resource_id == ObjectId(dataset_id)
+    ).to_list()
+    if len(metadata) > 0:
+        add_entry(
+            "metadata/_dataset_metadata.json",
+            json_util.dumps(metadata),
+            "_dataset_metadata.json",
+        )
+        yield archive.drain()
+
+    manifest = ""
+    bag_size = 0  # bytes
+    file_count = 0
+
+    async def fetch(file: FileDB):
+        """Everything needed to write one file into the archive. Small objects are read whole so their download
+        overlaps with writing the previous files; large ones are only streamed once their turn comes.
+        """
+        file_name = folder_paths.path(file.folder_id) + file.name
+        file_metadata = await MetadataDB.find(
+            MetadataDB.resource.resource_id == ObjectId(file.id)
+        ).to_list()
+        data = None
+        if file.bytes <= settings.MINIO_PREFETCH_MAX_BYTES:
+            data = await fs.read_object(settings.MINIO_BUCKET_NAME, str(file.id))
+        return file_name, file_metadata, data
+
+    folder_paths = await FolderPathResolver.for_dataset(dataset_id)
+    files = FileDB.find(FileDB.dataset_id == ObjectId(dataset_id))
+    async for file, (file_name, file_metadata, data) in prefetch(
+        files, fetch, prefetch_window
+    ):
+        file_count += 1
+        file_md5 = hashlib.md5()
+        with archive.open("data/" + file_name) as entry:
+            if data is not None:
+                entry.write(data)
+                file_md5.update(data)
+                bag_size += len(data)
+            else:
+                content = await fs.stream_object(
+                    settings.MINIO_BUCKET_NAME, str(file.id)
+                )
+                async for chunk in content:
+                    entry.write(chunk)
+                    file_md5.update(chunk)
+                    bag_size += len(chunk)
+                    yield archive.drain()
+        yield archive.drain()
+        crate.add_file(dest_path="data/" + file_name, properties={"name": file_name})
+        manifest += file_md5.hexdigest() + " " + file_name + "\n"
+
+        if len(file_metadata) > 0:
+            metadata_filename = file_name + "_metadata.json"
+            add_entry(
+                "metadata/" + metadata_filename,
+                json_util.dumps(file_metadata),
+                metadata_filename,
+            )
+            yield archive.drain()
+
+    bagit = (
+        "Bag-Software-Agent: clowder.ncsa.illinois.edu\n"
+        f"Bagging-Date: {datetime.datetime.now()}\n"
+        f"Bag-Size: {bag_size / 1024} kB\n"
+        f"Payload-Oxum: {bag_size}.{file_count}\n"
+        f"Internal-Sender-Identifier: {dataset_id}\n"
+        f"Internal-Sender-Description: {dataset.description or ''}\n"
+        f"Contact-Name: {user_full_name}\n"
+        f"Contact-Email: {user.email}\n"
+    )
+    bag_info = "BagIt-Version: 0.97\nTag-File-Character-Encoding: UTF-8\n"
+    add_entry("bagit.txt", bagit, "bagit.txt")
+    add_entry("manifest-md5.txt", manifest, "manifest-md5.txt")
+    add_entry("bag-info.txt", bag_info, "bag-info.txt")
+
+    # Generate tag manifest file
+    tagmanifest = ""
+    for tag_name, tag_content in [
+        ("bagit.txt", bagit),
+        ("manifest-md5.txt", manifest),
+        ("bag-info.txt", bag_info),
+    ]:
+        tagmanifest += (
+            hashlib.md5(tag_content.encode()).hexdigest() + " " + tag_name + "\n"
+        )
+    add_entry("tagmanifest-md5.txt", tagmanifest, "tagmanifest-md5.txt")
+
+    archive.writestr(crate.metadata.id, json.dumps(crate.metadata.generate(), indent=4))
+    yield archive.close()
+
+
 @router.get("/{dataset_id}/download", response_model=DatasetOut)
 async def download_dataset(
     dataset_id: str,
     user=Depends(get_current_user),
-    fs: Minio = Depends(dependencies.get_fs),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     allow: bool = Depends(Authorization("viewer")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
-        current_temp_dir = tempfile.mkdtemp(prefix="rocratedownload")
-        crate = ROCrate()
-        user_full_name = user.first_name + " " + user.last_name
-        user_crate_id = str(user.id)
-        crate.add(Person(crate, user_crate_id, properties={"name": user_full_name}))
-
-        manifest_path = os.path.join(current_temp_dir, "manifest-md5.txt")
-        bagit_path = os.path.join(current_temp_dir, "bagit.txt")
-        bag_info_path = os.path.join(current_temp_dir, "bag-info.txt")
-        tagmanifest_path = os.path.join(current_temp_dir, "tagmanifest-md5.txt")
-
-        with open(manifest_path, "w") as f:
-            pass  # Create empty file so no errors later if the dataset is empty
-
-        with open(bagit_path, "w") as f:
-            f.write("Bag-Software-Agent: clowder.ncsa.illinois.edu" + "\n")
-            f.write("Bagging-Date: " + str(datetime.datetime.now()) + "\n")
-
-        with open(bag_info_path, "w") as f:
-            f.write("BagIt-Version: 0.97" + "\n")
-            f.write("Tag-File-Character-Encoding: UTF-8" + "\n")
-
-        # Write dataset metadata if found
-        metadata = await MetadataDB.find(
-            MetadataDB.resource.resource_id == ObjectId(dataset_id)
-        ).to_list()
-        if len(metadata) > 0:
-            datasetmetadata_path = os.path.join(
-                current_temp_dir, "_dataset_metadata.json"
-            )
-            metadata_content = json_util.dumps(metadata)
-            with open(datasetmetadata_path, "w") as f:
-                f.write(metadata_content)
-            crate.add_file(
-                datasetmetadata_path,
-                dest_path="metadata/_dataset_metadata.json",
-                properties={"name": "_dataset_metadata.json"},
-            )
-
-        bag_size = 0  # bytes
-        file_count = 0
-
-        async for file in FileDB.find(FileDB.dataset_id == ObjectId(dataset_id)):
-            file_count += 1
-            file_name = file.name
-            if file.folder_id is not None:
-                hierarchy = await _get_folder_hierarchy(file.folder_id, "")
-                dest_folder = os.path.join(current_temp_dir, hierarchy.lstrip("/"))
-                if not os.path.isdir(dest_folder):
-                    os.mkdir(dest_folder)
-                file_name = hierarchy + file_name
-            current_file_path = os.path.join(current_temp_dir, file_name.lstrip("/"))
-
-            content = fs.get_object(settings.MINIO_BUCKET_NAME, str(file.id))
-            file_md5_hash = hashlib.md5(content.data).hexdigest()
-            with open(current_file_path, "wb") as f1:
-                f1.write(content.data)
-            with open(manifest_path, "a") as mpf:
-                mpf.write(file_md5_hash + " " + file_name + "\n")
-            crate.add_file(
-                current_file_path,
-                dest_path="data/" + file_name,
-                properties={"name": file_name},
-            )
-            content.close()
-            content.release_conn()
-
-            current_file_size = os.path.getsize(current_file_path)
-            bag_size += current_file_size
-
-            metadata = await MetadataDB.find(
-                MetadataDB.resource.resource_id == ObjectId(dataset_id)
-            ).to_list()
-            if len(metadata) > 0:
-                metadata_filename = file_name + "_metadata.json"
-                metadata_filename_temp_path = os.path.join(
-                    current_temp_dir, metadata_filename
-                )
-                metadata_content = json_util.dumps(metadata)
-                with open(metadata_filename_temp_path, "w") as f:
-                    f.write(metadata_content)
-                crate.add_file(
-                    metadata_filename_temp_path,
-                    dest_path="metadata/" + metadata_filename,
-                    properties={"name": metadata_filename},
-                )
-
-        bag_size_kb = bag_size / 1024
-
-        with open(bagit_path, "a") as f:
-            f.write("Bag-Size: " + str(bag_size_kb) + " kB" + "\n")
-            f.write("Payload-Oxum: " + str(bag_size) + "." + str(file_count) + "\n")
-            f.write("Internal-Sender-Identifier: " + dataset_id + "\n")
-            f.write("Internal-Sender-Description: " + dataset.description + "\n")
-            f.write("Contact-Name: " + user_full_name + "\n")
-            f.write("Contact-Email: " + user.email + "\n")
-        crate.add_file(
-            bagit_path, dest_path="bagit.txt", properties={"name": "bagit.txt"}
-        )
-        crate.add_file(
-            manifest_path,
-            dest_path="manifest-md5.txt",
-            properties={"name": "manifest-md5.txt"},
-        )
-        crate.add_file(
-            bag_info_path, dest_path="bag-info.txt", properties={"name": "bag-info.txt"}
-        )
-
-        # Generate tag manifest file
-        manifest_md5_hash = hashlib.md5(open(manifest_path, "rb").read()).hexdigest()
-        bagit_md5_hash = hashlib.md5(open(bagit_path, "rb").read()).hexdigest()
-        bag_info_md5_hash = hashlib.md5(open(bag_info_path, "rb").read()).hexdigest()
-
-        with open(tagmanifest_path, "w") as f:
-            f.write(bagit_md5_hash + " " + "bagit.txt" + "\n")
-            f.write(manifest_md5_hash + " " + "manifest-md5.txt" + "\n")
-            f.write(bag_info_md5_hash + " " + "bag-info.txt" + "\n")
-        crate.add_file(
-            tagmanifest_path,
-            dest_path="tagmanifest-md5.txt",
-            properties={"name": "tagmanifest-md5.txt"},
-        )
-
+    if dataset is not None:
         zip_name = dataset.name + ".zip"
-        path_to_zip = os.path.join(current_temp_dir, zip_name)
-        crate.write_zip(path_to_zip)
-        f = open(path_to_zip, "rb", buffering=0)
-        zip_bytes = f.read()
-        stream = io.BytesIO(zip_bytes)
-        f.close()
-        try:
-            shutil.rmtree(current_temp_dir)
-        except Exception as e:
-            print("could not delete file")
-            print(e)
 
         # Get content type & open file stream
         response = StreamingResponse(
-            stream,
+            _stream_dataset_archive(dataset, user, fs),
             media_type="application/x-zip-compressed",
         )
         response.headers["Content-Disposition"] = "attachment; filename=%s" % zip_name
@@ -773,12 +727,13 @@ async def get_dataset_extract(
     # parameters don't have a fixed model shape
     parameters: dict = None,
     user=Depends(get_current_user),
-    rabbitmq_client: BlockingChannel = Depends(dependencies.get_rabbitmq),
+    rabbitmq_client: JobPublisher = Depends(dependencies.get_rabbitmq),
     allow: bool = Depends(Authorization("uploader")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
     if extractorName is None:
         raise HTTPException(status_code=400, detail=f"No extractorName specified")
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         queue = extractorName
         routing_key = queue
         return await submit_dataset_job(
@@ -795,13 +750,14 @@ async def get_dataset_extract(
 @router.get("/{dataset_id}/thumbnail")
 async def download_dataset_thumbnail(
     dataset_id: str,
-    fs: Minio = Depends(dependencies.get_fs),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     allow: bool = Depends(Authorization("viewer")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
     # If dataset exists in MongoDB, download from Minio
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         if dataset.thumbnail_id is not None:
-            content = fs.get_object(
+            content = await fs.stream_object(
                 settings.MINIO_BUCKET_NAME, str(dataset.thumbnail_id)
             )
         else:
@@ -811,7 +767,7 @@ async def download_dataset_thumbnail(
             )
 
         # Get content type & open file stream
-        response = StreamingResponse(content.stream(settings.MINIO_UPLOAD_CHUNK_SIZE))
+        response = StreamingResponse(content)
         # TODO: How should filenames be handled for thumbnails?
         response.headers["Content-Disposition"] = "attachment; filename=%s" % "thumb"
         return response
@@ -824,8 +780,9 @@ async def add_dataset_thumbnail(
     dataset_id: str,
     thumbnail_id: str,
     allow: bool = Depends(Authorization("editor")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         if (
             thumbnail := await ThumbnailDB.get(PydanticObjectId(thumbnail_id))
         ) is not None:
@@ -0,0 +1,21 @@
+from beanie import PydanticObjectId
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.keycloak_auth import get_current_user
+from app.models.deletions import DeletionJobDB, DeletionJobOut
+from app.routers.authentication import get_admin
+
+router = APIRouter()
+
+
+@router.get("/{job_id}", response_model=DeletionJobOut)
+async def get_deletion(
+    job_id: str,
+    user=Depends(get_current_user),
+    admin=Depends(get_admin),
+):
+    """Progress of a deletion started by deleting a dataset or a folder."""
+    if (job := await DeletionJobDB.get(PydanticObjectId(job_id))) is not None:
+        if job.creator.email == user.email or admin:
+            return job.dict()
+    raise HTTPException(status_code=404, detail=f"Deletion {job_id} not found")
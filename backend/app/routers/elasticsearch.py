@@ -4,9 +4,10 @@ from fastapi import Depends
 from fastapi.routing import APIRouter, Request
 
 from app.config import settings
+from app.dependencies import get_elasticsearchclient
 from app.keycloak_auth import get_current_username
 from app.routers.authentication import get_admin
-from app.search.connect import connect_elasticsearch, search_index
+from app.search.connect import search_index
 
 router = APIRouter()
 
@@ -42,8 +43,12 @@ def _add_permissions_clause(query, username: str, admin: bool = Depends(get_admi
 
 
 @router.put("/search", response_model=str)
-async def search(index_name: str, query: str, username=Depends(get_current_username)):
-    es = await connect_elasticsearch()
+async def search(
+    index_name: str,
+    query: str,
+    username=Depends(get_current_username),
+    es=Depends(get_elasticsearchclient),
+):
     query = _add_permissions_clause(query, username)
     return search_index(es, index_name, query)
 
@@ -52,8 +57,8 @@ async def search(index_name: str, query: str, username=Depends(get_current_usern
 async def msearch(
     request: Request,
     username=Depends(get_current_username),
+    es=Depends(get_elasticsearchclient),
 ):
-    es = await connect_elasticsearch()
     query = await request.body()
     query = _add_permissions_clause(query, username)
     r = search_index(es, [settings.elasticsearch_index], query)
@@ -3,7 +3,6 @@ from typing import List, Optional
 from beanie import PydanticObjectId
 from beanie.operators import NE
 from fastapi import APIRouter, HTTPException, Depends
-from pika.adapters.blocking_connection import BlockingChannel
 
 from app.keycloak_auth import get_current_user, get_current_username
 from app.models.feeds import (
@@ -18,7 +17,8 @@ from app.models.listeners import (
 )
 from app.models.users import UserOut
 from app.rabbitmq.listeners import submit_file_job
-from app.search.connect import check_search_result
+from app.rabbitmq.publisher import JobPublisher
+from app.search.matcher import feed_matcher
 
 router = APIRouter()
 
@@ -36,23 +36,17 @@ async def disassociate_listener_db(feed_id: str, listener_id: str):
                 new_listeners.append(feed_listener)
         feed.listeners = new_listeners
         await feed.save()
+        feed_matcher.invalidate()
 
 
 async def check_feed_listeners(
     es_client,
     file_out: FileOut,
     user: UserOut,
-    rabbitmq_client: BlockingChannel,
+    rabbitmq_client: JobPublisher,
 ):
     """Automatically submit new file to listeners on feeds that fit the search criteria."""
-    listener_ids_found = []
-    async for feed in FeedDB.find(FeedDB.listeners.automatic == True):
-        # Verify whether resource_id is found when searching the specified criteria
-        feed_match = check_search_result(es_client, file_out, feed.search)
-        if feed_match:
-            for listener in feed.listeners:
-                if listener.automatic:
-                    listener_ids_found.append(listener.listener_id)
+    listener_ids_found = await feed_matcher.matching_listeners(es_client, file_out)
     for targ_listener in listener_ids_found:
         if (
             listener_info := await EventListenerDB.get(PydanticObjectId(targ_listener))
@@ -75,6 +69,7 @@ async def save_feed(
     """Create a new Feed (i.e. saved search) in the database."""
     feed = FeedDB(**feed_in.dict(), creator=user)
     await feed.insert()
+    feed_matcher.invalidate()
     return feed.dict()
 
 
@@ -122,6 +117,7 @@ async def delete_feed(
     """Delete an existing saved search Feed."""
     if (feed := await FeedDB.get(PydanticObjectId(feed_id))) is not None:
         await feed.delete()
+        feed_matcher.invalidate()
         return {"deleted": feed_id}
     raise HTTPException(status_code=404, detail=f"Feed {feed_id} not found")
 
@@ -144,6 +140,7 @@ async def associate_listener(
         ) is not None:
             feed.listeners.append(listener)
             await feed.save()
+            feed_matcher.invalidate()
             return feed.dict()
         raise HTTPException(
             status_code=404, detail=f"listener {listener.listener_id} not found"
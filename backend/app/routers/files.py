@@ -1,11 +1,12 @@
+import asyncio
 import io
-import time
 from datetime import datetime, timedelta
 from typing import Optional, List
 from typing import Union
 
 from beanie import PydanticObjectId
 from beanie.odm.operators.update.general import Inc
+from beanie.operators import In
 from bson import ObjectId
 from elasticsearch import Elasticsearch, NotFoundError
 from fastapi import (
@@ -15,15 +16,14 @@ from fastapi import (
     Security,
     File,
     UploadFile,
+    Response,
 )
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from minio import Minio
-from pika.adapters.blocking_connection import BlockingChannel
 
 from app import dependencies
 from app.config import settings
-from app.deps.authorization_deps import FileAuthorization
+from app.deps.authorization_deps import FileAuthorization, load_file
 from app.keycloak_auth import get_current_user, get_token
 from app.models.files import (
     FileOut,
@@ -34,15 +34,19 @@ from app.models.files import (
 from app.models.metadata import MetadataDB
 from app.models.users import UserOut
 from app.models.thumbnails import ThumbnailDB
+from app.post_ingest import post_ingest
 from app.rabbitmq.listeners import submit_file_job, EventListenerJobDB
-from app.routers.feeds import check_feed_listeners
-from app.routers.utils import get_content_type
+from app.rabbitmq.publisher import JobPublisher
+from app.routers.utils import NEWEST_FIRST, get_content_type, paginate
 from app.search.connect import (
     delete_document_by_id,
+    delete_documents_by_ids,
     insert_record,
     update_record,
 )
 from app.search.index import index_file, index_thumbnail
+from app.storage.client import AsyncStorage
+from app.storage.streams import HashingReader
 
 router = APIRouter()
 security = HTTPBearer()
@@ -50,7 +54,7 @@ security = HTTPBearer()
 
 async def _resubmit_file_extractors(
     file: FileOut,
-    rabbitmq_client: BlockingChannel,
+    rabbitmq_client: JobPublisher,
     user: UserOut,
     credentials: HTTPAuthorizationCredentials = Security(security),
 ):
@@ -72,14 +76,12 @@ async def _resubmit_file_extractors(
         resubmitted_job = {"listener_id": job.listener_id, "parameters": job.parameters}
         try:
             routing_key = job.listener_id
-            access_token = credentials.credentials
             await submit_file_job(
                 file,
                 routing_key,
                 job.parameters,
                 user,
                 rabbitmq_client,
-                access_token,
             )
             resubmitted_job["status"] = "success"
             resubmitted_jobs.append(resubmitted_job)
@@ -93,14 +95,12 @@ async def _resubmit_file_extractors(
 async def add_file_entry(
     new_file: FileDB,
     user: UserOut,
-    fs: Minio,
-    es: Elasticsearch,
-    rabbitmq_client: BlockingChannel,
+    fs: AsyncStorage,
     file: Optional[io.BytesIO] = None,
     content_type: Optional[str] = None,
 ):
     """Insert FileDB object into MongoDB (makes Clowder ID), then Minio (makes version ID), then update MongoDB with
-    the version ID from Minio.
+    the version ID from Minio. Indexing and feed listeners run afterwards in the background (see post_ingest.py).
 
     Arguments:
         file_db: FileDB object controlling dataset and folder destination
@@ -111,23 +111,24 @@ async def add_file_entry(
     new_file_id = new_file.id
     content_type_obj = get_content_type(new_file.name, content_type)
 
-    # Use unique ID as key for Minio and get initial version ID
-    response = fs.put_object(
+    # Use unique ID as key for Minio and get initial version ID. Size and checksum are computed while streaming.
+    reader = HashingReader(file)
+    response = await fs.put_object(
         settings.MINIO_BUCKET_NAME,
         str(new_file_id),
-        file,
+        reader,
         length=-1,
         part_size=settings.MINIO_UPLOAD_CHUNK_SIZE,
         content_type=new_file.content_type.content_type,
-    )  # async write chunk to minio
+    )
     version_id = response.version_id
-    bytes = len(fs.get_object(settings.MINIO_BUCKET_NAME, str(new_file_id)).data)
     if version_id is None:
         # TODO: This occurs in testing when minio is not running
         version_id = 999999999
     new_file.version_id = version_id
     new_file.version_num = 1
-    new_file.bytes = bytes
+    new_file.bytes = reader.bytes
+    new_file.md5 = reader.hexdigest
     new_file.content_type = content_type_obj
     await new_file.replace()
 
@@ -136,28 +137,18 @@ async def add_file_entry(
         file_id=new_file_id,
         creator=user,
         version_id=version_id,
-        bytes=bytes,
+        bytes=new_file.bytes,
+        md5=new_file.md5,
     )
     await new_version.insert()
 
-    # Add entry to the file index
-    await index_file(es, FileOut(**new_file.dict()))
-
-    # TODO - timing issue here, check_feed_listeners needs to happen asynchronously.
-    time.sleep(1)
-
-    # Submit file job to any qualifying feeds
-    await check_feed_listeners(
-        es,
-        FileOut(**new_file.dict()),
-        user,
-        rabbitmq_client,
-    )
+    # Index the file and submit it to any qualifying feeds
+    await post_ingest.submit(FileOut(**new_file.dict()), user)
 
 
 # TODO: Move this to MongoDB middle layer
 async def remove_file_entry(
-    file_id: Union[str, ObjectId], fs: Minio, es: Elasticsearch
+    file_id: Union[str, ObjectId], fs: AsyncStorage, es: Elasticsearch
 ):
     """Remove FileDB object into MongoDB, Minio, and associated metadata and version information."""
     # TODO: Deleting individual versions will require updating version_id in mongo, or deleting entire document
@@ -166,7 +157,7 @@ async def remove_file_entry(
     if fs is None or es is None:
         raise HTTPException(status_code=503, detail="Service not available")
         return
-    fs.remove_object(settings.MINIO_BUCKET_NAME, str(file_id))
+    await fs.remove_object(settings.MINIO_BUCKET_NAME, str(file_id))
     # delete from elasticsearch
     delete_document_by_id(es, settings.elasticsearch_index, str(file_id))
     if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
@@ -175,16 +166,39 @@ async def remove_file_entry(
     await FileVersionDB.find(FileVersionDB.file_id == ObjectId(file_id)).delete()
 
 
+async def remove_file_entries(
+    file_ids: List[ObjectId], fs: AsyncStorage, es: Elasticsearch
+):
+    """`remove_file_entry()` for many files at once: one multi-object delete in Minio, one delete by query in
+    Elasticsearch and one `$in` delete per collection. The files are removed from MongoDB last, so if a step fails
+    the same ids can be passed again."""
+    if not file_ids:
+        return
+    errors = await fs.remove_objects(
+        settings.MINIO_BUCKET_NAME, [str(file_id) for file_id in file_ids]
+    )
+    if errors:
+        raise RuntimeError(
+            f"Could not remove {len(errors)} objects from Minio, e.g. {errors[0].name}: {errors[0].message}"
+        )
+    await asyncio.to_thread(
+        delete_documents_by_ids, es, settings.elasticsearch_index, file_ids
+    )
+    await MetadataDB.find(In(MetadataDB.resource.resource_id, file_ids)).delete()
+    await FileVersionDB.find(In(FileVersionDB.file_id, file_ids)).delete()
+    await FileDB.find(In(FileDB.id, file_ids)).delete()
+
+
 @router.put("/{file_id}", response_model=FileOut)
 async def update_file(
     file_id: str,
     token=Depends(get_token),
     user=Depends(get_current_user),
-    fs: Minio = Depends(dependencies.get_fs),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     file: UploadFile = File(...),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     credentials: HTTPAuthorizationCredentials = Security(security),
-    rabbitmq_client: BlockingChannel = Depends(dependencies.get_rabbitmq),
+    rabbitmq_client: JobPublisher = Depends(dependencies.get_rabbitmq),
     allow: bool = Depends(FileAuthorization("uploader")),
 ):
     # Check all connection and abort if any one of them is not available
@@ -203,14 +217,15 @@ async def update_file(
             )
 
         # Update file in Minio and get the new version IDs
-        response = fs.put_object(
+        reader = HashingReader(file.file)
+        response = await fs.put_object(
             settings.MINIO_BUCKET_NAME,
             str(updated_file.id),
-            file.file,
+            reader,
             length=-1,
             part_size=settings.MINIO_UPLOAD_CHUNK_SIZE,
             content_type=updated_file.content_type.content_type,
-        )  # async write chunk to minio
+        )
         version_id = response.version_id
 
         # Update version/creator/created flags
@@ -220,10 +235,9 @@ async def update_file(
         updated_file.version_id = version_id
         updated_file.version_num = updated_file.version_num + 1
 
-        # Update byte size
-        updated_file.bytes = len(
-            fs.get_object(settings.MINIO_BUCKET_NAME, str(updated_file.id)).data
-        )
+        # Update byte size and checksum
+        updated_file.bytes = reader.bytes
+        updated_file.md5 = reader.hexdigest
         await updated_file.replace()
 
         # Put entry in FileVersion collection
@@ -233,6 +247,7 @@ async def update_file(
             version_id=updated_file.version_id,
             version_num=updated_file.version_num,
             bytes=updated_file.bytes,
+            md5=updated_file.md5,
         )
 
         await new_version.insert()
@@ -270,11 +285,12 @@ async def download_file(
     file_id: str,
     version: Optional[int] = None,
     increment: Optional[bool] = True,
-    fs: Minio = Depends(dependencies.get_fs),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     allow: bool = Depends(FileAuthorization("viewer")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
     # If file exists in MongoDB, download from Minio
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         if version is not None:
             # Version is specified, so get the minio ID from versions table if possible
             file_vers = await FileVersionDB.find_one(
@@ -283,7 +299,7 @@ async def download_file(
             )
             if file_vers is not None:
                 vers = FileVersion(**file_vers.dict())
-                content = fs.get_object(
+                content = await fs.stream_object(
                     settings.MINIO_BUCKET_NAME, file_id, version_id=vers.version_id
                 )
             else:
@@ -293,10 +309,10 @@ async def download_file(
                 )
         else:
             # If no version specified, get latest version directly
-            content = fs.get_object(settings.MINIO_BUCKET_NAME, file_id)
+            content = await fs.stream_object(settings.MINIO_BUCKET_NAME, file_id)
 
         # Get content type & open file stream
-        response = StreamingResponse(content.stream(settings.MINIO_UPLOAD_CHUNK_SIZE))
+        response = StreamingResponse(content)
         response.headers["Content-Disposition"] = "attachment; filename=%s" % file.name
         if increment:
             # Increment download count
@@ -311,11 +327,12 @@ async def download_file_url(
     file_id: str,
     version: Optional[int] = None,
     expires_in_seconds: Optional[int] = 3600,
-    external_fs: Minio = Depends(dependencies.get_external_fs),
+    external_fs: AsyncStorage = Depends(dependencies.get_external_fs),
     allow: bool = Depends(FileAuthorization("viewer")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
     # If file exists in MongoDB, download from Minio
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         if expires_in_seconds is None:
             expires = timedelta(seconds=settings.MINIO_EXPIRES)
         else:
@@ -330,7 +347,7 @@ async def download_file_url(
             if file_vers is not None:
                 vers = FileVersion(**file_vers.dict())
                 # If no version specified, get latest version directly
-                presigned_url = external_fs.presigned_get_object(
+                presigned_url = await external_fs.presigned_get_object(
                     bucket_name=settings.MINIO_BUCKET_NAME,
                     object_name=file_id,
                     version_id=vers.version_id,
@@ -343,7 +360,7 @@ async def download_file_url(
                 )
         else:
             # If no version specified, get latest version directly
-            presigned_url = external_fs.presigned_get_object(
+            presigned_url = await external_fs.presigned_get_object(
                 bucket_name=settings.MINIO_BUCKET_NAME,
                 object_name=file_id,
                 expires=expires,
@@ -361,11 +378,12 @@ async def download_file_url(
 @router.delete("/{file_id}")
 async def delete_file(
     file_id: str,
-    fs: Minio = Depends(dependencies.get_fs),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(FileAuthorization("editor")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
-    if (await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         await remove_file_entry(file_id, fs, es)
         return {"deleted": file_id}
     else:
@@ -376,8 +394,9 @@ async def delete_file(
 async def get_file_summary(
     file_id: str,
     allow: bool = Depends(FileAuthorization("viewer")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         # TODO: Incrementing too often (3x per page view)
         # file.views += 1
         # await file.replace()
@@ -391,8 +410,9 @@ async def get_file_version_details(
     file_id: str,
     version_num: Optional[int] = 0,
     allow: bool = Depends(FileAuthorization("viewer")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         # TODO: Incrementing too often (3x per page view)
         file_vers = await FileVersionDB.find_one(
             FileVersionDB.file_id == ObjectId(file_id),
@@ -411,18 +431,23 @@ async def get_file_version_details(
 @router.get("/{file_id}/versions", response_model=List[FileVersion])
 async def get_file_versions(
     file_id: str,
+    response: Response,
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     allow: bool = Depends(FileAuthorization("viewer")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
-    file = await FileDB.get(PydanticObjectId(file_id))
     if file is not None:
-        mongo_versions = []
-        async for ver in FileVersionDB.find(
-            FileVersionDB.file_id == ObjectId(file_id)
-        ).sort(-FileVersionDB.created).skip(skip).limit(limit):
-            mongo_versions.append(FileVersion(**ver.dict()))
-        return mongo_versions
+        versions = await paginate(
+            FileVersionDB.find(FileVersionDB.file_id == ObjectId(file_id)),
+            NEWEST_FIRST,
+            response,
+            cursor,
+            skip,
+            limit,
+        )
+        return [FileVersion(**ver.dict()) for ver in versions]
 
     raise HTTPException(status_code=404, detail=f"File {file_id} not found")
 
@@ -436,12 +461,13 @@ async def post_file_extract(
     parameters: dict = None,
     user=Depends(get_current_user),
     credentials: HTTPAuthorizationCredentials = Security(security),
-    rabbitmq_client: BlockingChannel = Depends(dependencies.get_rabbitmq),
+    rabbitmq_client: JobPublisher = Depends(dependencies.get_rabbitmq),
     allow: bool = Depends(FileAuthorization("uploader")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
     if extractorName is None:
         raise HTTPException(status_code=400, detail=f"No extractorName specified")
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         access_token = credentials.credentials
 
         # backward compatibility? Get extractor info from request (Clowder v1)
@@ -465,7 +491,7 @@ async def resubmit_file_extractions(
     file_id: str,
     user=Depends(get_current_user),
     credentials: HTTPAuthorizationCredentials = Security(security),
-    rabbitmq_client: BlockingChannel = Depends(dependencies.get_rabbitmq),
+    rabbitmq_client: JobPublisher = Depends(dependencies.get_rabbitmq),
     allow: bool = Depends(FileAuthorization("editor")),
 ):
     """This route will check metadata. We get the extractors run from metadata from extractors.
@@ -489,20 +515,23 @@ async def resubmit_file_extractions(
 @router.get("/{file_id}/thumbnail")
 async def download_file_thumbnail(
     file_id: str,
-    fs: Minio = Depends(dependencies.get_fs),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     allow: bool = Depends(FileAuthorization("viewer")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
     # If file exists in MongoDB, download from Minio
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         if file.thumbnail_id is not None:
-            content = fs.get_object(settings.MINIO_BUCKET_NAME, str(file.thumbnail_id))
+            content = await fs.stream_object(
+                settings.MINIO_BUCKET_NAME, str(file.thumbnail_id)
+            )
         else:
             raise HTTPException(
                 status_code=404, detail=f"File {file_id} has no associated thumbnail"
             )
 
         # Get content type & open file stream
-        response = StreamingResponse(content.stream(settings.MINIO_UPLOAD_CHUNK_SIZE))
+        response = StreamingResponse(content)
         # TODO: How should filenames be handled for thumbnails?
         response.headers["Content-Disposition"] = "attachment; filename=%s" % "thumb"
         return response
@@ -515,9 +544,10 @@ async def add_file_thumbnail(
     file_id: str,
     thumbnail_id: str,
     allow: bool = Depends(FileAuthorization("editor")),
+    file: Optional[FileDB] = Depends(load_file),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
 ):
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         if (
             thumbnail := await ThumbnailDB.get(PydanticObjectId(thumbnail_id))
         ) is not None:
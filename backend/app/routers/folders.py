@@ -1,3 +1,5 @@
+from typing import Dict, Iterable, List, Optional
+
 from beanie import PydanticObjectId
 from bson import ObjectId
 from fastapi import (
@@ -10,26 +12,82 @@ from app.models.folders import FolderDB
 router = APIRouter()
 
 
+class FolderPathResolver:
+    """Resolve the chain of parent folders of any folder from folders loaded in a single query.
+
+    Build one per request with `for_dataset()` (whole folder tree of a dataset, e.g. for an export) or
+    `for_folder()` (only the ancestors of one folder, via $graphLookup). Paths are cached, so resolving the folder
+    of every file in a dataset costs one query in total instead of one per ancestor per file.
+    """
+
+    def __init__(self, folders: Iterable[FolderDB]):
+        self._folders: Dict[str, FolderDB] = {str(f.id): f for f in folders}
+        self._paths: Dict[str, str] = {}
+
+    @classmethod
+    async def for_dataset(cls, dataset_id: str) -> "FolderPathResolver":
+        return cls(
+            await FolderDB.find(FolderDB.dataset_id == ObjectId(dataset_id)).to_list()
+        )
+
+    @classmethod
+    async def for_folder(cls, folder: FolderDB) -> "FolderPathResolver":
+        results = (
+            await FolderDB.find(FolderDB.id == folder.id)
+            .aggregate(
+                [
+                    {
+                        "$graphLookup": {
+                            "from": FolderDB.Settings.name,
+                            "startWith": "$parent_folder",
+                            "connectFromField": "parent_folder",
+                            "connectToField": "_id",
+                            "as": "ancestors",
+                        }
+                    }
+                ]
+            )
+            .to_list()
+        )
+        ancestors = results[0]["ancestors"] if results else []
+        return cls([folder] + [FolderDB.parse_obj(a) for a in ancestors])
+
+    def chain(self, folder_id: Optional[str]) -> List[FolderDB]:
+        """Folders from the dataset root down to and including `folder_id`."""
+        chain = []
+        seen = set()
+        folder_id = str(folder_id) if folder_id is not None else None
+        while folder_id is not None and folder_id not in seen:
+            if (folder := self._folders.get(folder_id)) is None:
+                break
+            seen.add(folder_id)
+            chain.insert(0, folder)
+            folder_id = (
+                str(folder.parent_folder) if folder.parent_folder is not None else None
+            )
+        return chain
+
+    def path(self, folder_id: Optional[str]) -> str:
+        """Nested path to a folder for use in zip file creation, e.g. `parent/child/`. Empty for the dataset root."""
+        if folder_id is None:
+            return ""
+        folder_id = str(folder_id)
+        if (path := self._paths.get(folder_id)) is None:
+            path = "".join(f.name + "/" for f in self.chain(folder_id))
+            self._paths[folder_id] = path
+        return path
+
+
 @router.get("/{folder_id}/path")
 async def download_folder(
     folder_id: str,
 ):
     folder = await FolderDB.get(PydanticObjectId(folder_id))
     if folder is not None:
-        path = []
-        current_folder_id = folder_id
-        # TODO switch to $graphLookup
-        while (
-            current_folder := await FolderDB.find_one(
-                FolderDB.id == ObjectId(current_folder_id)
-            )
-        ) is not None:
-            folder_info = {
-                "folder_name": current_folder.name,
-                "folder_id": str(current_folder.id),
-            }
-            path.insert(0, folder_info)
-            current_folder_id = current_folder.parent_folder
-        return path
+        resolver = await FolderPathResolver.for_folder(folder)
+        return [
+            {"folder_name": f.name, "folder_id": str(f.id)}
+            for f in resolver.chain(folder.id)
+        ]
     else:
         raise HTTPException(status_code=404, detail=f"File {folder_id} not found")
@@ -6,7 +6,11 @@ from beanie.operators import Or, Push, RegEx
 from bson.objectid import ObjectId
 from fastapi import HTTPException, Depends, APIRouter
 
-from app.deps.authorization_deps import AuthorizationDB, GroupAuthorization
+from app.deps.authorization_deps import (
+    AuthorizationDB,
+    GroupAuthorization,
+    refresh_group_readers,
+)
 from app.keycloak_auth import get_current_user, get_user
 from app.models.authorization import RoleType
 from app.models.groups import GroupOut, GroupIn, GroupDB, GroupBase, Member
@@ -125,7 +129,7 @@ async def edit_group(
                 ):
                     auth.user_ids.remove(original_user.user.email)
                     await auth.replace()
-                    # Update group itself
+                # Update group itself
                 group.users.remove(original_user)
                 await group.replace()
         # add new users to the group
@@ -151,6 +155,7 @@ async def edit_group(
                 ).update(
                     Push({AuthorizationDB.user_ids: user.email}),
                 )
+        await refresh_group_readers(group_id)
         try:
             group.name = group_dict["name"]
             await group.replace()
@@ -207,6 +212,7 @@ async def add_member(
                 ).update(
                     Push({AuthorizationDB.user_ids: username}),
                 )
+                await refresh_group_readers(group_id)
             return group.dict()
         raise HTTPException(status_code=404, detail=f"Group {group_id} not found")
     raise HTTPException(status_code=404, detail=f"User {username} not found")
@@ -235,6 +241,7 @@ async def remove_member(
         async for auth in AuthorizationDB.find({"group_ids": ObjectId(group_id)}):
             auth.user_ids.remove(username)
             await auth.replace()
+        await refresh_group_readers(group_id)
 
         # Update group itself
         group.users.remove(found_user)
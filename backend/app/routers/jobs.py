@@ -4,22 +4,34 @@ from typing import List, Optional
 from beanie import PydanticObjectId
 from beanie.operators import Or, RegEx, GTE, LT
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 
-from app.keycloak_auth import get_user, get_current_username
+from app.deps.authorization_deps import access, get_user_role
+from app.keycloak_auth import get_user, get_current_user, get_current_username
+from app.models.authorization import RoleType
+from app.models.datasets import DatasetDB
+from app.models.files import FileDB
+from app.models.folders import FolderDB
 from app.models.listeners import (
+    EventListenerBatchDB,
+    EventListenerBatchIn,
+    EventListenerBatchOut,
     EventListenerJobDB,
     EventListenerJobUpdateDB,
     EventListenerJobViewList,
     EventListenerJobOut,
     EventListenerJobUpdateOut,
 )
+from app.rabbitmq.batches import batches, job_counts
+from app.routers.authentication import get_admin
+from app.routers.utils import NEWEST_FIRST, paginate
 
 router = APIRouter()
 
 
 @router.get("", response_model=List[EventListenerJobOut])
 async def get_all_job_summary(
+    response: Response,
     current_user_id=Depends(get_user),
     listener_id: Optional[str] = None,
     status: Optional[str] = None,
@@ -29,6 +41,7 @@ async def get_all_job_summary(
     created: Optional[str] = None,
     skip: int = 0,
     limit: int = 2,
+    cursor: Optional[str] = None,
 ):
     """
     Get a list of all jobs from the db.
@@ -41,6 +54,7 @@ async def get_all_job_summary(
         created: Optional[datetime] = None,
         skip -- number of initial records to skip (i.e. for pagination)
         limit -- restrict number of records to be returned (i.e. for pagination)
+        cursor -- continue after the previous page instead of skipping (see `paginate()`)
     """
     filters = [
         Or(
@@ -73,12 +87,81 @@ async def get_all_job_summary(
         filters.append(
             EventListenerJobViewList.resource_ref.resource_id == ObjectId(dataset_id)
         )
-    jobs = (
-        await EventListenerJobViewList.find(*filters).skip(skip).limit(limit).to_list()
+    jobs = await paginate(
+        EventListenerJobViewList.find(*filters),
+        NEWEST_FIRST,
+        response,
+        cursor,
+        skip,
+        limit,
     )
     return [job.dict() for job in jobs]
 
 
+@router.post("/batches", response_model=EventListenerBatchOut)
+async def submit_batch(
+    batch_in: EventListenerBatchIn,
+    user=Depends(get_current_user),
+    admin=Depends(get_admin),
+):
+    """Submit a listener on every file of a dataset, of a folder and its subfolders, or of a list of files. Jobs are
+    created in the background; follow the progress with `GET /jobs/batches/{batch_id}`. Requires the `uploader` role
+    on every dataset involved, as for a single file.
+
+    Arguments:
+        batch_in -- listener, files to run it on and parameters
+    """
+    targets = [batch_in.dataset_id, batch_in.folder_id, batch_in.file_ids or None]
+    if sum(target is not None for target in targets) != 1:
+        raise HTTPException(
+            status_code=400,
+            detail="Specify exactly one of dataset_id, folder_id and file_ids",
+        )
+    if batch_in.dataset_id is not None:
+        if await DatasetDB.get(batch_in.dataset_id) is None:
+            raise HTTPException(
+                status_code=404, detail=f"Dataset {batch_in.dataset_id} not found"
+            )
+        dataset_ids = [batch_in.dataset_id]
+    elif batch_in.folder_id is not None:
+        if (folder := await FolderDB.get(batch_in.folder_id)) is None:
+            raise HTTPException(
+                status_code=404, detail=f"Folder {batch_in.folder_id} not found"
+            )
+        dataset_ids = [folder.dataset_id]
+    else:
+        dataset_ids = await FileDB.get_motor_collection().distinct(
+            "dataset_id", {"_id": {"$in": batch_in.file_ids}}
+        )
+    if not admin:
+        for dataset_id in dataset_ids:
+            role = await get_user_role(dataset_id, user.email)
+            if role is None or not access(role, RoleType.UPLOADER):
+                raise HTTPException(
+                    status_code=403,
+                    detail=f"User `{user.email} does not have `uploader` permission on dataset {dataset_id}",
+                )
+    batch = await batches.create(batch_in, user)
+    return batch.dict()
+
+
+@router.get("/batches/{batch_id}", response_model=EventListenerBatchOut)
+async def get_batch(
+    batch_id: str,
+    user=Depends(get_current_user),
+    admin=Depends(get_admin),
+):
+    """Progress of a batch: how many jobs were submitted and how many are in each status."""
+    if (
+        batch := await EventListenerBatchDB.get(PydanticObjectId(batch_id))
+    ) is not None:
+        if batch.creator.email == user.email or admin:
+            return EventListenerBatchOut(
+                **batch.dict(), jobs=await job_counts(batch.id)
+            ).dict()
+    raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found")
+
+
 @router.get("/{job_id}/summary", response_model=EventListenerJobOut)
 async def get_job_summary(
     job_id: str,
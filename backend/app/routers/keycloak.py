@@ -11,7 +11,7 @@ from starlette.responses import RedirectResponse
 from app.config import settings
 from app.keycloak_auth import (
     keycloak_openid,
-    get_idp_public_key,
+    token_verifier,
     retreive_refresh_token,
     oauth2_scheme,
 )
@@ -172,11 +172,7 @@ async def refresh_token(
 
     try:
         # token still valid
-        token_json = keycloak_openid.decode_token(
-            access_token,
-            key=await get_idp_public_key(),
-            options={"verify_aud": False},
-        )
+        token_json = await token_verifier.verify(access_token)
         email = token_json["email"]
         return await retreive_refresh_token(email)
     except (ExpiredSignatureError, JWTError):
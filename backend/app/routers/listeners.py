@@ -4,10 +4,11 @@ import random
 import string
 from typing import List, Optional
 
+import pymongo
 from beanie import PydanticObjectId
-from beanie.operators import Or, RegEx
+from beanie.operators import GTE, Or, RegEx
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from packaging import version
 
 from app.config import settings
@@ -20,10 +21,13 @@ from app.models.listeners import (
     LegacyEventListenerIn,
     EventListenerDB,
     EventListenerOut,
+    EventListenerCategoryStatus,
 )
 from app.models.search import SearchCriteria
 from app.models.users import UserOut
 from app.routers.feeds import disassociate_listener_db
+from app.routers.utils import paginate
+from app.search.matcher import feed_matcher
 
 router = APIRouter()
 legacy_router = APIRouter()  # for back-compatibilty with v1 extractors
@@ -71,24 +75,28 @@ async def _process_incoming_v1_extractor_info(
         if creator is not None:
             new_feed.creator = creator.email
         await new_feed.insert()
+        feed_matcher.invalidate()
         return new_feed
 
 
-async def _check_livelihood(
-    listener: EventListenerDB, heartbeat_interval=settings.listener_heartbeat_interval
-):
+def _alive_since(heartbeat_interval=settings.listener_heartbeat_interval):
+    """Listeners whose last heartbeat is at or after this time are alive."""
     if heartbeat_interval == 0:
         heartbeat_interval = settings.listener_heartbeat_interval
+    return datetime.datetime.utcnow() - datetime.timedelta(seconds=heartbeat_interval)
+
+
+def _alive_filter(heartbeat_interval=settings.listener_heartbeat_interval):
+    """Query on `lastAlive` matching the listeners that are alive, so it can be combined with other filters."""
+    return GTE(EventListenerDB.lastAlive, _alive_since(heartbeat_interval))
 
-    if listener.lastAlive is None:
-        return False
 
-    now = datetime.datetime.utcnow()
-    elapsed = now - listener.lastAlive
-    if elapsed.total_seconds() > heartbeat_interval:
+async def _check_livelihood(
+    listener: EventListenerDB, heartbeat_interval=settings.listener_heartbeat_interval
+):
+    if listener.lastAlive is None:
         return False
-    else:
-        return True
+    return listener.lastAlive >= _alive_since(heartbeat_interval)
 
 
 @router.get("/instance")
@@ -171,6 +179,7 @@ async def search_listeners(
     skip: int = 0,
     limit: int = 2,
     heartbeat_interval: Optional[int] = settings.listener_heartbeat_interval,
+    alive_only: bool = False,
     user=Depends(get_current_username),
 ):
     """Search all Event Listeners in the db based on text.
@@ -179,19 +188,18 @@ async def search_listeners(
         text -- any text matching name or description
         skip -- number of initial records to skip (i.e. for pagination)
         limit -- restrict number of records to be returned (i.e. for pagination)
+        alive_only -- only listeners with a heartbeat within the last `heartbeat_interval` seconds
     """
-    # TODO either use regex or index search
-    listeners = (
-        await EventListenerDB.find(
-            Or(
-                RegEx(field=EventListenerDB.name, pattern=text),
-                RegEx(field=EventListenerDB.description, pattern=text),
-            ),
+    query = [
+        Or(
+            RegEx(field=EventListenerDB.name, pattern=text),
+            RegEx(field=EventListenerDB.description, pattern=text),
         )
-        .skip(skip)
-        .limit(limit)
-        .to_list()
-    )
+    ]
+    if alive_only:
+        query.append(_alive_filter(heartbeat_interval))
+    # TODO either use regex or index search
+    listeners = await EventListenerDB.find(*query).skip(skip).limit(limit).to_list()
 
     # batch return listener statuses for easy consumption
     listenerResponse = []
@@ -208,6 +216,44 @@ async def list_categories(user=Depends(get_current_username)):
     return await EventListenerDB.distinct(EventListenerDB.properties.categories)
 
 
+@router.get("/categories/status", response_model=List[EventListenerCategoryStatus])
+async def list_categories_status(
+    heartbeat_interval: Optional[int] = settings.listener_heartbeat_interval,
+    user=Depends(get_current_username),
+):
+    """Number of listeners that are alive and not alive in each category. Listeners without a category are counted
+    under `null`."""
+    since = _alive_since(heartbeat_interval)
+    results = await EventListenerDB.aggregate(
+        [
+            {
+                "$unwind": {
+                    "path": "$properties.categories",
+                    "preserveNullAndEmptyArrays": True,
+                }
+            },
+            {
+                "$group": {
+                    "_id": "$properties.categories",
+                    "alive": {
+                        "$sum": {"$cond": [{"$gte": ["$lastAlive", since]}, 1, 0]}
+                    },
+                    "total": {"$sum": 1},
+                }
+            },
+            {"$sort": {"_id": 1}},
+        ]
+    ).to_list()
+    return [
+        EventListenerCategoryStatus(
+            category=result["_id"],
+            alive=result["alive"],
+            dead=result["total"] - result["alive"],
+        )
+        for result in results
+    ]
+
+
 @router.get("/defaultLabels", response_model=List[str])
 async def list_default_labels(user=Depends(get_current_username)):
     """Get all the distinct default labels of registered listeners in the db"""
@@ -240,31 +286,43 @@ async def check_listener_livelihood(
 
 @router.get("", response_model=List[EventListenerOut])
 async def get_listeners(
+    response: Response,
     user_id=Depends(get_current_username),
     skip: int = 0,
     limit: int = 2,
+    cursor: Optional[str] = None,
     heartbeat_interval: Optional[int] = settings.listener_heartbeat_interval,
     category: Optional[str] = None,
     label: Optional[str] = None,
+    alive_only: bool = False,
 ):
     """Get a list of all Event Listeners in the db.
 
     Arguments:
         skip -- number of initial records to skip (i.e. for pagination)
         limit -- restrict number of records to be returned (i.e. for pagination)
+        cursor -- continue after the previous page instead of skipping (see `paginate()`)
         category -- filter by category has to be exact match
         label -- filter by label has to be exact match
+        alive_only -- only listeners with a heartbeat within the last `heartbeat_interval` seconds
     """
     query = []
     if category:
         query.append(EventListenerDB.properties.categories == category)
     if label:
         query.append(EventListenerDB.properties.default_labels == label)
+    if alive_only:
+        query.append(_alive_filter(heartbeat_interval))
 
     # sort by name alphabetically
-    listeners = await EventListenerDB.find(
-        *query, skip=skip, limit=limit, sort=EventListenerDB.name
-    ).to_list()
+    listeners = await paginate(
+        EventListenerDB.find(*query),
+        [("name", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)],
+        response,
+        cursor,
+        skip,
+        limit,
+    )
 
     # batch return listener statuses for easy consumption
     listener_response = []
@@ -9,7 +9,7 @@ from fastapi import Form
 
 from app import dependencies
 from app.config import settings
-from app.deps.authorization_deps import Authorization
+from app.deps.authorization_deps import Authorization, load_dataset
 from app.keycloak_auth import get_current_user, UserOut
 from app.models.datasets import DatasetOut, DatasetDB
 from app.models.listeners import LegacyEventListenerIn, EventListenerDB
@@ -74,6 +74,7 @@ async def add_dataset_metadata(
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(Authorization("uploader")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
     """Attach new metadata to a dataset. The body must include a contents field with the JSON metadata, and either a
     context JSON-LD object, context_url, or definition (name of a metadata definition) to be valid.
@@ -82,7 +83,7 @@ async def add_dataset_metadata(
         Metadata document that was added to database
     """
 
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         # If dataset already has metadata using this definition, don't allow duplication
         query = []
         if metadata_in.definition is not None:
@@ -123,6 +124,7 @@ async def replace_dataset_metadata(
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(Authorization("editor")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
     """Update metadata. Any fields provided in the contents JSON will be added or updated in the metadata. If context or
     agent should be changed, use PUT.
@@ -130,7 +132,7 @@ async def replace_dataset_metadata(
     Returns:
         Metadata document that was updated
     """
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         query = [MetadataDB.resource.resource_id == ObjectId(dataset_id)]
 
         # Filter by MetadataAgent
@@ -177,6 +179,7 @@ async def update_dataset_metadata(
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(Authorization("editor")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
     """Update metadata. Any fields provided in the contents JSON will be added or updated in the metadata. If context or
     agent should be changed, use PUT.
@@ -184,7 +187,7 @@ async def update_dataset_metadata(
     Returns:
         Metadata document that was updated
     """
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         query = [MetadataDB.resource.resource_id == ObjectId(dataset_id)]
         content = metadata_in.content
 
@@ -246,8 +249,9 @@ async def get_dataset_metadata(
     listener_version: Optional[float] = Form(None),
     user=Depends(get_current_user),
     allow: bool = Depends(Authorization("viewer")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         query = [MetadataDB.resource.resource_id == ObjectId(dataset_id)]
 
         if listener_name is not None:
@@ -277,8 +281,9 @@ async def delete_dataset_metadata(
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(Authorization("editor")),
+    dataset: Optional[DatasetDB] = Depends(load_dataset),
 ):
-    if (dataset := await DatasetDB.get(PydanticObjectId(dataset_id))) is not None:
+    if dataset is not None:
         # filter by metadata_id or definition
         query = [MetadataDB.resource.resource_id == ObjectId(dataset_id)]
         if metadata_in.metadata_id is not None:
@@ -1,6 +1,5 @@
 from typing import Optional, List
 
-from beanie import PydanticObjectId
 from bson import ObjectId
 from elasticsearch import Elasticsearch
 from fastapi import (
@@ -12,7 +11,7 @@ from fastapi import (
 
 from app import dependencies
 from app.config import settings
-from app.deps.authorization_deps import FileAuthorization
+from app.deps.authorization_deps import FileAuthorization, load_file
 from app.keycloak_auth import get_current_user, UserOut
 from app.models.files import FileOut, FileDB, FileVersionDB
 from app.models.listeners import EventListenerDB
@@ -108,6 +107,7 @@ async def add_file_metadata(
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(FileAuthorization("uploader")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
     """Attach new metadata to a file. The body must include a contents field with the JSON metadata, and either a
     context JSON-LD object, context_url, or definition (name of a metadata definition) to be valid.
@@ -115,7 +115,7 @@ async def add_file_metadata(
     Returns:
         Metadata document that was added to database
     """
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         current_file_version = file.version_num
         # if metadata does not already specify a file version
         # change metadata_in file version to match the current file version
@@ -160,13 +160,14 @@ async def replace_file_metadata(
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(FileAuthorization("editor")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
     """Replace metadata, including agent and context. If only metadata contents should be updated, use PATCH instead.
 
     Returns:
         Metadata document that was updated
     """
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         # First, make sure the metadata we are replacing actually exists.
         query = [MetadataDB.resource.resource_id == ObjectId(file_id)]
 
@@ -233,6 +234,7 @@ async def update_file_metadata(
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(FileAuthorization("editor")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
     """Update metadata. Any fields provided in the contents JSON will be added or updated in the metadata. If context or
     agent should be changed, use PUT.
@@ -248,10 +250,12 @@ async def update_file_metadata(
             MetadataDB.resource.version == metadata_in.file_version,
         )
     ) is None:
-        result = await replace_file_metadata(metadata_in, file_id, user, es)
+        result = await replace_file_metadata(
+            metadata_in, file_id, user, es, allow=allow, file=file
+        )
         return result
 
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         query = [MetadataDB.resource.resource_id == ObjectId(file_id)]
         content = metadata_in.content
 
@@ -333,9 +337,10 @@ async def get_file_metadata(
     listener_version: Optional[float] = Form(None),
     user=Depends(get_current_user),
     allow: bool = Depends(FileAuthorization("viewer")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
     """Get file metadata."""
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         query = [MetadataDB.resource.resource_id == ObjectId(file_id)]
 
         # Validate specified version, or use latest by default
@@ -389,8 +394,9 @@ async def delete_file_metadata(
     user=Depends(get_current_user),
     es: Elasticsearch = Depends(dependencies.get_elasticsearchclient),
     allow: bool = Depends(FileAuthorization("editor")),
+    file: Optional[FileDB] = Depends(load_file),
 ):
-    if (file := await FileDB.get(PydanticObjectId(file_id))) is not None:
+    if file is not None:
         query = [MetadataDB.resource.resource_id == ObjectId(file_id)]
 
         # # Validate specified version, or use latest by default
@@ -8,7 +8,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from itsdangerous.url_safe import URLSafeSerializer
 
 from app.config import settings
-from app.keycloak_auth import get_current_username
+from app.keycloak_auth import get_current_username, invalidate_api_keys
 from app.models.users import (
     UserDB,
     UserOut,
@@ -78,6 +78,7 @@ async def delete_user_api_key(
         # Only allow user to delete their own key
         if apikey.user == current_user:
             await apikey.delete()
+            invalidate_api_keys(key=apikey.key)
             return apikey.dict()
         else:
             raise HTTPException(
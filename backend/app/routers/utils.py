@@ -1,6 +1,15 @@
+import base64
 import mimetypes
-from typing import Optional
+from typing import List, Optional, Tuple
 
+import pymongo
+from beanie import View
+from beanie.odm.queries.find import FindMany
+from bson import json_util
+from bson.errors import InvalidBSON
+from fastapi import HTTPException, Response
+
+from app.config import settings
 from app.models.files import ContentType
 
 
@@ -23,3 +32,76 @@ def get_content_type(
             content_type = "application/octet-stream"
     type_main = content_type.split("/")[0] if type(content_type) is str else "N/A"
     return ContentType(content_type=content_type, main_type=type_main)
+
+
+# Orders for `paginate()`, ending with _id so documents created at the same time keep their order between pages
+NEWEST_FIRST = [("created", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+OLDEST_FIRST = [("created", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
+
+
+def encode_cursor(sort: List[Tuple[str, int]], document) -> str:
+    """Opaque cursor pointing after `document`: the values of its sort fields."""
+    values = [getattr(document, "id" if field == "_id" else field) for field, _ in sort]
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def after_cursor(sort: List[Tuple[str, int]], cursor: str) -> dict:
+    """Filter for the documents that come after `cursor` in `sort` order.
+
+    For (created, -1), (_id, -1) this is `created < c or (created == c and _id < i)`, which MongoDB answers by
+    seeking in an index on the sort fields instead of skipping over the previous pages.
+    """
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, InvalidBSON):
+        raise HTTPException(status_code=400, detail=f"Invalid cursor {cursor}")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail=f"Invalid cursor {cursor}")
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {f: v for (f, _), v in zip(sort[:i], values)}
+        branch[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+async def paginate(
+    query: FindMany,
+    sort: List[Tuple[str, int]],
+    response: Response,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 10,
+) -> list:
+    """Run a listing query one page at a time.
+
+    Pages are requested with `skip` or, to go deep into large collections at the cost of the first page, with the
+    `cursor` returned in the `X-Next-Cursor` header of the previous page (`skip` is then ignored). `sort` must end with
+    a unique field such as _id so every document has a single position.
+
+    Without a cursor the number of matching documents is returned in `X-Total-Count`. Past
+    `PAGINATION_COUNT_LIMIT` documents, or when the collection size from its metadata is used for an unfiltered
+    query, it is an estimate and `X-Total-Count-Estimated` is set.
+    """
+    if cursor is None:
+        collection = query.document_model.get_motor_collection()
+        filters = query.get_filter_query()
+        if not filters and not issubclass(query.document_model, View):
+            total = await collection.estimated_document_count()
+            estimated = True
+        else:
+            total = await collection.count_documents(
+                filters, limit=settings.PAGINATION_COUNT_LIMIT
+            )
+            estimated = total >= settings.PAGINATION_COUNT_LIMIT
+        response.headers["X-Total-Count"] = str(total)
+        if estimated:
+            response.headers["X-Total-Count-Estimated"] = "true"
+        query = query.skip(skip)
+    else:
+        query = query.find(after_cursor(sort, cursor))
+
+    documents = await query.sort(sort).limit(limit).to_list()
+    if documents and len(documents) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(sort, documents[-1])
+    return documents
@@ -6,7 +6,6 @@ from bson import ObjectId
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi import File, UploadFile
 from fastapi.security import HTTPBearer
-from minio import Minio
 from starlette.responses import StreamingResponse
 
 from app import dependencies
@@ -26,6 +25,8 @@ from app.models.visualization_data import (
     VisualizationDataDB,
 )
 from app.routers.utils import get_content_type
+from app.storage.client import AsyncStorage
+from app.storage.streams import HashingReader
 
 router = APIRouter()
 security = HTTPBearer()
@@ -37,7 +38,7 @@ async def add_Visualization(
     description: str,
     config: str,
     user=Depends(get_current_user),
-    fs: Minio = Depends(dependencies.get_fs),
+    fs: AsyncStorage = Depends(dependencies.get_fs),
     file: UploadFile = File(...),
 ):
     """Insert VisualizationsDataDB object into MongoDB (makes Clowder ID), then Minio.
@@ -64,18 +65,17 @@ async def add_Visualization(
     visualization_db.content_type = get_content_type(file.filename, file.content_type)
     visualization_id = visualization_db.id
 
-    # Use unique ID as key for Minio
-    response = fs.put_object(
+    # Use unique ID as key for Minio, counting bytes while streaming
+    reader = HashingReader(file.file)
+    response = await fs.put_object(
         settings.MINIO_BUCKET_NAME,
         str(visualization_id),
-        file.file,
+        reader,
         length=-1,
         part_size=settings.MINIO_UPLOAD_CHUNK_SIZE,
         content_type=visualization_db.content_type.content_type,
-    )  # async write chunk to minio
-    visualization_db.bytes = len(
-        fs.get_object(settings.MINIO_BUCKET_NAME, str(visualization_id)).data
     )
+    visualization_db.bytes = reader.bytes
     await visualization_db.replace()
 
     return visualization_db.dict()
@@ -96,7 +96,7 @@ async def get_visualization(visualization_id: str):
 
 @router.delete("/{visualization_id}")
 async def remove_visualization(
-    visualization_id: str, fs: Minio = Depends(dependencies.get_fs)
+    visualization_id: str, fs: AsyncStorage = Depends(dependencies.get_fs)
 ):
     if (
         visualization := await VisualizationDataDB.get(
@@ -108,7 +108,7 @@ async def remove_visualization(
             vis_config := await VisualizationConfigDB.get(visualization_config_id)
         ) is not None:
             await vis_config.delete()
-        fs.remove_object(settings.MINIO_BUCKET_NAME, visualization_id)
+        await fs.remove_object(settings.MINIO_BUCKET_NAME, visualization_id)
         await visualization.delete()
         return
     raise HTTPException(
@@ -118,7 +118,7 @@ async def remove_visualization(
 
 @router.get("/{visualization_id}/bytes")
 async def download_visualization(
-    visualization_id: str, fs: Minio = Depends(dependencies.get_fs)
+    visualization_id: str, fs: AsyncStorage = Depends(dependencies.get_fs)
 ):
     # If visualization exists in MongoDB, download from Minio
     if (
@@ -126,10 +126,10 @@ async def download_visualization(
             PydanticObjectId(visualization_id)
         )
     ) is not None:
-        content = fs.get_object(settings.MINIO_BUCKET_NAME, visualization_id)
+        content = await fs.stream_object(settings.MINIO_BUCKET_NAME, visualization_id)
 
         # Get content type & open file stream
-        response = StreamingResponse(content.stream(settings.MINIO_UPLOAD_CHUNK_SIZE))
+        response = StreamingResponse(content)
         response.headers["Content-Disposition"] = (
             "attachment; filename=%s" % visualization.name
         )
@@ -144,7 +144,7 @@ async def download_visualization(
 async def download_visualization_url(
     visualization_id: str,
     expires_in_seconds: Optional[int] = 3600,
-    external_fs: Minio = Depends(dependencies.get_external_fs),
+    external_fs: AsyncStorage = Depends(dependencies.get_external_fs),
 ):
     # If visualization exists in MongoDB, download from Minio
     if (
@@ -158,7 +158,7 @@ async def download_visualization_url(
             expires = timedelta(seconds=expires_in_seconds)
 
         # Generate a signed URL with expiration time
-        presigned_url = external_fs.presigned_get_object(
+        presigned_url = await external_fs.presigned_get_object(
             bucket_name=settings.MINIO_BUCKET_NAME,
             object_name=visualization_id,
             expires=expires,
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import weakref
+from typing import List, Optional, Union
+
+from elasticsearch import ApiError, Elasticsearch, TransportError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Item statuses worth sending again: rejected because the cluster is busy or a shard was unavailable
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class BulkAction:
+    def __init__(
+        self, operation: dict, source: Optional[dict], refresh: Union[bool, str]
+    ):
+        self.operation = operation
+        self.source = source
+        self.refresh = refresh
+        self.size = len(json.dumps(operation)) + (
+            len(json.dumps(source, default=str)) if source is not None else 0
+        )
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def ignore_missing(self) -> bool:
+        return "delete" in self.operation or (
+            "update" in self.operation and not self.source["doc_as_upsert"]
+        )
+
+    def lines(self) -> list:
+        return (
+            [self.operation] if self.source is None else [self.operation, self.source]
+        )
+
+    def resolve(self, ok: bool):
+        if not self.done.done():
+            self.done.set_result(ok)
+
+
+class BulkIndexer:
+    """Send index/update/delete operations to Elasticsearch in batches using the _bulk API.
+
+    Operations are queued and a background task sends them once `ES_BULK_MAX_ACTIONS` or `ES_BULK_MAX_BYTES` are
+    reached or `ES_BULK_FLUSH_INTERVAL` seconds after the first one was queued. Items rejected because the cluster is
+    overloaded are retried with backoff; other failures are logged. At most `ES_BULK_QUEUE_SIZE` operations wait to be
+    sent, after which callers are slowed down until the cluster catches up. With `concurrency` > 1 several bulk
+    requests are in flight at once.
+
+    Every method returns a future resolving to whether the operation succeeded, for callers that need to wait for it.
+    Use `for_client()` to share one indexer per Elasticsearch client.
+    """
+
+    _indexers = weakref.WeakKeyDictionary()
+
+    def __init__(
+        self,
+        es: Elasticsearch,
+        max_actions: int = settings.ES_BULK_MAX_ACTIONS,
+        max_bytes: int = settings.ES_BULK_MAX_BYTES,
+        flush_interval: float = settings.ES_BULK_FLUSH_INTERVAL,
+        queue_size: int = settings.ES_BULK_QUEUE_SIZE,
+        max_retries: int = settings.ES_BULK_MAX_RETRIES,
+        concurrency: int = 1,
+    ):
+        self.es = es
+        self.max_actions = max_actions
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @classmethod
+    def for_client(cls, es: Elasticsearch) -> "BulkIndexer":
+        if (indexer := cls._indexers.get(es)) is None:
+            indexer = cls._indexers[es] = cls(es)
+        return indexer
+
+    def _running(self) -> bool:
+        return bool(self._tasks) and not any(t.done() for t in self._tasks)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if not self._running() or self._tasks[0].get_loop() is not loop:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks = [
+                loop.create_task(self._run(), name=f"elasticsearch-bulk-{i}")
+                for i in range(self.concurrency)
+            ]
+
+    async def _add(
+        self, operation: dict, source: Optional[dict], refresh: Union[bool, str]
+    ) -> asyncio.Future:
+        self._ensure_started()
+        action = BulkAction(operation, source, refresh)
+        await self._queue.put(action)
+        return action.done
+
+    async def index(
+        self, index: str, id, doc: dict, refresh: Union[bool, str] = False
+    ) -> asyncio.Future:
+        """Create or replace a document."""
+        return await self._add(
+            {"index": {"_index": index, "_id": str(id)}}, doc, refresh
+        )
+
+    async def update(
+        self,
+        index: str,
+        id,
+        doc: dict,
+        upsert: bool = True,
+        refresh: Union[bool, str] = False,
+    ) -> asyncio.Future:
+        """Merge fields into a document, creating it if it does not exist unless `upsert` is False."""
+        return await self._add(
+            {"update": {"_index": index, "_id": str(id)}},
+            {"doc": doc, "doc_as_upsert": upsert},
+            refresh,
+        )
+
+    async def delete(
+        self, index: str, id, refresh: Union[bool, str] = False
+    ) -> asyncio.Future:
+        return await self._add(
+            {"delete": {"_index": index, "_id": str(id)}}, None, refresh
+        )
+
+    async def flush(self):
+        """Wait until everything queued so far has been sent."""
+        if self._running():
+            await self._queue.join()
+
+    async def stop(self):
+        if not self._tasks:
+            return
+        await self.flush()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = batch[0].size
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_actions and size < self.max_bytes:
+                try:
+                    action = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        action = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(action)
+                size += action.size
+            try:
+                await self._send(batch)
+            except Exception:
+                logger.exception("Elasticsearch bulk request failed")
+                for action in batch:
+                    action.resolve(False)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send(self, batch: List[BulkAction]):
+        pending = batch
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(min(2**attempt * 0.1, 10))
+            refresh = "wait_for" if any(a.refresh for a in pending) else False
+            operations = [line for action in pending for line in action.lines()]
+            try:
+                response = await asyncio.to_thread(
+                    self.es.bulk, operations=operations, refresh=refresh
+                )
+            except (ApiError, TransportError) as e:
+                status = getattr(e, "status_code", None)
+                if status is not None and status not in RETRY_STATUSES:
+                    raise
+                logger.warning(f"Elasticsearch bulk request failed, retrying: {e}")
+                continue
+
+            retry = []
+            for action, item in zip(pending, response["items"]):
+                result = next(iter(item.values()))
+                status = result.get("status", 500)
+                if status < 300:
+                    action.resolve(True)
+                elif status in RETRY_STATUSES:
+                    retry.append(action)
+                elif status == 404 and action.ignore_missing:
+                    # Deleting or partially updating a document that is not (yet) in the index; nothing to do
+                    action.resolve(True)
+                else:
+                    logger.error(
+                        f"Elasticsearch rejected {action.operation}: {result.get('error')}"
+                    )
+                    action.resolve(False)
+            if not retry:
+                return
+            pending = retry
+        logger.error(
+            f"Giving up on {len(pending)} Elasticsearch operations after {self.max_retries} retries"
+        )
+        for action in pending:
+            action.resolve(False)
@@ -53,30 +53,32 @@ def create_index(es_client, index_name, settings, mappings):
         return created
 
 
-def insert_record(es_client, index_name, doc, id):
+def insert_record(es_client, index_name, doc, id, refresh=False):
     """Add a document to the index
     Arguments:
         es_client -- elasticsearch client which you get as return object from connect_elasticsearch()
         index_name -- name of index
         doc -- document you want to put in the index (It's similar to a record in SQL)
         id -- unique key by which you can identify the document when needed
+        refresh -- "wait_for" to return only once the document is visible to searches
     """
     try:
-        es_client.index(index=index_name, document=doc, id=id)
+        es_client.index(index=index_name, document=doc, id=id, refresh=refresh)
     except BadRequestError as ex:
         logger.error(str(ex))
 
 
-def update_record(es_client, index_name, body, id):
+def update_record(es_client, index_name, body, id, refresh=False):
     """Update a document in the index
     Arguments:
         es_client -- elasticsearch client which you get as return object from connect_elasticsearch()
         index_name -- name of index
         body -- document you want to update in the index
         id -- unique key by which you can identify the document when needed
+        refresh -- "wait_for" to return only once the change is visible to searches
     """
     try:
-        es_client.update(index=index_name, id=id, body=body)
+        es_client.update(index=index_name, id=id, body=body, refresh=refresh)
     except BadRequestError as ex:
         logger.error(str(ex))
 
@@ -122,6 +124,20 @@ def delete_document_by_id(es_client, index_name, id):
         logger.error(str(ex))
 
 
+def delete_documents_by_ids(es_client, index_name, ids):
+    """Deleting many documents from an index with a single request
+    Arguments:
+        es_client -- elasticsearch client which you get as return object from connect_elasticsearch()
+        index_name -- name of index you want to delete from
+        ids -- unique identifiers of the documents
+    """
+    try:
+        query = {"terms": {"_id": [str(id) for id in ids]}}
+        es_client.delete_by_query(index=index_name, query=query)
+    except BadRequestError as ex:
+        logger.error(str(ex))
+
+
 def delete_document_by_query(es_client, index_name, query):
     """Deleting a document from an index
     Arguments:
@@ -154,7 +170,7 @@ def execute_search_obj(es_client, search_obj: SearchObject):
 
 def check_search_result(es_client, file_out: FileOut, search_obj: SearchObject):
     """Check whether the contents of new_index match the search criteria in search_obj."""
-    # TODO: There is an opportunity to do some basic checks here first, without talking to elasticsearch
+    # Criteria on plain file fields are evaluated without talking to elasticsearch, see search/matcher.py
     match_list = []
     for criteria in search_obj.criteria:
         crit = {criteria.field: criteria.value}
@@ -169,7 +185,7 @@ def check_search_result(es_client, file_out: FileOut, search_obj: SearchObject):
     # Wrap the normal criteria with restriction of file ID also
     query_string = '{"preference":"results"}\n'
     query = {
-        "query": {"bool": {"must": [{"match": {"name": str(file_out.name)}}, subquery]}}
+        "query": {"bool": {"must": [{"ids": {"values": [str(file_out.id)]}}, subquery]}}
     }
     query_string += json.dumps(query) + "\n"
 
@@ -1,8 +1,11 @@
-from typing import Optional, List
+import asyncio
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Union
 
 from bson import ObjectId
-from elasticsearch import Elasticsearch, NotFoundError
+from elasticsearch import Elasticsearch
 from beanie import PydanticObjectId
+from beanie.operators import In
 from app.config import settings
 from app.models.authorization import AuthorizationDB
 from app.models.datasets import DatasetOut, DatasetDB
@@ -12,35 +15,14 @@ from app.models.metadata import MetadataDB
 from app.models.search import (
     ElasticsearchEntry,
 )
-from app.search.connect import insert_record, update_record
+from app.search.bulk import BulkIndexer
 
 
-async def index_dataset(
-    es: Elasticsearch,
-    dataset: DatasetOut,
-    user_ids: Optional[List[str]] = None,
-    update: bool = False,
-):
-    """Create or update an Elasticsearch entry for the dataset. user_ids is the list of users
-    with permission to at least view the dataset, it will be queried if not provided."""
-    if user_ids is None:
-        # Get authorized users from db
-        authorized_user_ids = []
-        async for auth in AuthorizationDB.find(
-            AuthorizationDB.dataset_id == ObjectId(dataset.id)
-        ):
-            authorized_user_ids += auth.user_ids
-    else:
-        authorized_user_ids = user_ids
-
-    # Get full metadata from db (granular updates possible but complicated)
-    metadata = []
-    async for md in MetadataDB.find(
-        MetadataDB.resource.resource_id == ObjectId(dataset.id)
-    ):
-        metadata.append(md.content)
-    # Add en entry to the dataset index
-    doc = ElasticsearchEntry(
+def dataset_entry(
+    dataset: DatasetDB, user_ids: List[str], metadata: List[dict]
+) -> dict:
+    """Elasticsearch document for a dataset, given the users allowed to view it and the content of its metadata."""
+    return ElasticsearchEntry(
         resource_type="dataset",
         name=dataset.name,
         description=dataset.description,
@@ -48,52 +30,21 @@ async def index_dataset(
         created=dataset.created,
         modified=dataset.modified,
         downloads=dataset.downloads,
-        user_ids=authorized_user_ids,
+        user_ids=user_ids,
         metadata=metadata,
     ).dict()
 
-    if update:
-        try:
-            update_record(es, settings.elasticsearch_index, {"doc": doc}, dataset.id)
-        except NotFoundError:
-            insert_record(es, settings.elasticsearch_index, doc, dataset.id)
-    else:
-        insert_record(es, settings.elasticsearch_index, doc, dataset.id)
-
 
-async def index_file(
-    es: Elasticsearch,
-    file: FileOut,
-    user_ids: Optional[List[str]] = None,
-    update: bool = False,
-):
-    """Create or update an Elasticsearch entry for the file. user_ids is the list of users
-    with permission to at least view the file's dataset, it will be queried if not provided.
-    """
-    if user_ids is None:
-        # Get authorized users from db
-        authorized_user_ids = []
-        async for auth in AuthorizationDB.find(
-            AuthorizationDB.dataset_id == ObjectId(file.dataset_id)
-        ):
-            authorized_user_ids += auth.user_ids
-    else:
-        authorized_user_ids = user_ids
-
-    # Get full metadata from db (granular updates possible but complicated)
-    metadata = []
-    async for md in MetadataDB.find(
-        MetadataDB.resource.resource_id == ObjectId(file.id)
-    ):
-        metadata.append(md.content)
-    # Add en entry to the file index
-    doc = ElasticsearchEntry(
+def file_entry(file: FileDB, user_ids: List[str], metadata: List[dict]) -> dict:
+    """Elasticsearch document for a file, given the users allowed to view its dataset and the content of its
+    metadata."""
+    return ElasticsearchEntry(
         resource_type="file",
         name=file.name,
         creator=file.creator.email,
         created=file.created,
         downloads=file.downloads,
-        user_ids=authorized_user_ids,
+        user_ids=user_ids,
         content_type=file.content_type.content_type,
         content_type_main=file.content_type.main_type,
         dataset_id=str(file.dataset_id),
@@ -101,13 +52,120 @@ async def index_file(
         bytes=file.bytes,
         metadata=metadata,
     ).dict()
+
+
+class DocumentBuilder:
+    """Build search documents for many resources at once. The users allowed to view each dataset are queried once
+    and remembered, and the metadata of a whole batch of resources is loaded with one $in query. Keep one builder for
+    the duration of a bulk operation, e.g. indexing all files uploaded in a request.
+    """
+
+    def __init__(self):
+        self._user_ids: Dict[str, List[str]] = {}
+
+    def set_user_ids(self, dataset_id, user_ids: List[str]):
+        self._user_ids[str(dataset_id)] = user_ids
+
+    async def user_ids(self, dataset_ids: Iterable) -> Dict[str, List[str]]:
+        missing = {str(d) for d in dataset_ids} - self._user_ids.keys()
+        if missing:
+            for dataset_id in missing:
+                self._user_ids[dataset_id] = []
+            async for auth in AuthorizationDB.find(
+                In(AuthorizationDB.dataset_id, [ObjectId(d) for d in missing])
+            ):
+                self._user_ids[str(auth.dataset_id)] += auth.user_ids
+        return self._user_ids
+
+    @staticmethod
+    async def metadata(resource_ids: Iterable) -> Dict[str, List[dict]]:
+        metadata = defaultdict(list)
+        async for md in MetadataDB.find(
+            In(MetadataDB.resource.resource_id, [ObjectId(r) for r in resource_ids])
+        ):
+            metadata[str(md.resource.resource_id)].append(md.content)
+        return metadata
+
+    async def datasets(self, datasets: List[DatasetDB]) -> List[dict]:
+        user_ids = await self.user_ids(d.id for d in datasets)
+        metadata = await self.metadata(d.id for d in datasets)
+        return [
+            dataset_entry(d, user_ids[str(d.id)], metadata[str(d.id)]) for d in datasets
+        ]
+
+    async def files(self, files: List[FileDB]) -> List[dict]:
+        user_ids = await self.user_ids(f.dataset_id for f in files)
+        metadata = await self.metadata(f.id for f in files)
+        return [
+            file_entry(f, user_ids[str(f.dataset_id)], metadata[str(f.id)])
+            for f in files
+        ]
+
+
+async def _write(
+    es: Elasticsearch,
+    doc: dict,
+    id,
+    update: bool,
+    refresh: Union[bool, str] = False,
+) -> asyncio.Future:
+    """Queue a document for the next bulk request. Returns a future that resolves to True once it is written."""
+    indexer = BulkIndexer.for_client(es)
     if update:
-        try:
-            update_record(es, settings.elasticsearch_index, {"doc": doc}, file.id)
-        except NotFoundError:
-            insert_record(es, settings.elasticsearch_index, doc, file.id)
-    else:
-        insert_record(es, settings.elasticsearch_index, doc, file.id)
+        return await indexer.update(
+            settings.elasticsearch_index, id, doc, refresh=refresh
+        )
+    return await indexer.index(settings.elasticsearch_index, id, doc, refresh=refresh)
+
+
+async def index_dataset(
+    es: Elasticsearch,
+    dataset: DatasetOut,
+    user_ids: Optional[List[str]] = None,
+    update: bool = False,
+):
+    """Create or update an Elasticsearch entry for the dataset. user_ids is the list of users
+    with permission to at least view the dataset, it will be queried if not provided."""
+    builder = DocumentBuilder()
+    if user_ids is not None:
+        builder.set_user_ids(dataset.id, user_ids)
+    [doc] = await builder.datasets([dataset])
+    return await _write(es, doc, dataset.id, update)
+
+
+async def index_file(
+    es: Elasticsearch,
+    file: FileOut,
+    user_ids: Optional[List[str]] = None,
+    update: bool = False,
+    refresh: Union[bool, str] = False,
+):
+    """Create or update an Elasticsearch entry for the file. user_ids is the list of users
+    with permission to at least view the file's dataset, it will be queried if not provided.
+    With refresh="wait_for" the returned future resolves once the file is searchable.
+    """
+    builder = DocumentBuilder()
+    if user_ids is not None:
+        builder.set_user_ids(file.dataset_id, user_ids)
+    [future] = await index_files(es, [file], builder, update, refresh)
+    return future
+
+
+async def index_files(
+    es: Elasticsearch,
+    files: List[FileOut],
+    builder: Optional[DocumentBuilder] = None,
+    update: bool = False,
+    refresh: Union[bool, str] = False,
+) -> List[asyncio.Future]:
+    """Create or update the Elasticsearch entries of many files with one authorization query per dataset and one
+    metadata query in total. Returns a future per file (see `index_file()`)."""
+    builder = builder or DocumentBuilder()
+    docs = await builder.files(files)
+    return [
+        await _write(es, doc, file.id, update, refresh)
+        for file, doc in zip(files, docs)
+    ]
 
 
 async def index_thumbnail(
@@ -124,40 +182,34 @@ async def index_thumbnail(
         if (
             thumbnail := await ThumbnailDB.get(PydanticObjectId(thumbnail_id))
         ) is not None:
-            # Get authorized users from db
-            authorized_user_ids = []
-            async for auth in AuthorizationDB.find(
-                AuthorizationDB.dataset_id == ObjectId(dataset_id)
-            ):
-                authorized_user_ids += auth.user_ids
-            # Get full metadata from db (granular updates possible but complicated)
-            metadata = []
-            async for md in MetadataDB.find(
-                MetadataDB.resource.resource_id == ObjectId(file.id)
-            ):
-                metadata.append(md.content)
+            builder = DocumentBuilder()
+            user_ids = await builder.user_ids([dataset_id])
+            metadata = await builder.metadata([file.id])
             # Add en entry to the file index
             doc = ElasticsearchEntry(
                 resource_type="thumbnail",
                 name=file.name,
                 creator=thumbnail.creator.email,
                 created=thumbnail.created,
-                user_ids=authorized_user_ids,
+                user_ids=user_ids[str(dataset_id)],
                 content_type=thumbnail.content_type.content_type,
                 content_type_main=thumbnail.content_type.main_type,
                 file_id=str(file.id),
                 dataset_id=str(file.dataset_id),
                 folder_id=str(file.folder_id),
                 bytes=thumbnail.bytes,
-                metadata=metadata,
+                metadata=metadata[str(file.id)],
                 downloads=thumbnail.downloads,
             ).dict()
-            if update:
-                try:
-                    update_record(
-                        es, settings.elasticsearch_index, {"doc": doc}, file.id
-                    )
-                except NotFoundError:
-                    insert_record(es, settings.elasticsearch_index, doc, file.id)
-            else:
-                insert_record(es, settings.elasticsearch_index, doc, file.id)
+            return await _write(es, doc, file.id, update)
+
+
+async def index_dataset_permissions(es: Elasticsearch, dataset: DatasetOut):
+    """Update the users allowed to see a dataset and each of its files after the dataset was (un)shared. This only
+    changes user_ids, with one bulk operation per document."""
+    user_ids = await DocumentBuilder().user_ids([dataset.id])
+    indexer = BulkIndexer.for_client(es)
+    doc = {"user_ids": user_ids[str(dataset.id)]}
+    await indexer.update(settings.elasticsearch_index, dataset.id, doc, upsert=False)
+    async for file in FileDB.find(FileDB.dataset_id == ObjectId(dataset.id)):
+        await indexer.update(settings.elasticsearch_index, file.id, doc, upsert=False)
@@ -0,0 +1,145 @@
+import asyncio
+import re
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+from elasticsearch import Elasticsearch
+
+from app.config import settings
+from app.models.feeds import FeedDB
+from app.models.files import FileOut
+from app.models.search import SearchCriteria, SearchObject
+from app.search.connect import check_search_result
+
+# How each file field is indexed (see search/config.py), which decides how a `match` query compares it
+KEYWORD_FIELDS = {"creator", "content_type", "content_type_main"}
+TEXT_FIELDS = {"resource_type", "name", "description"}
+NUMERIC_FIELDS = {"bytes", "downloads"}
+
+# Approximation of the Elasticsearch standard tokenizer: words are split on anything but letters, digits and
+# underscores, except that ".", ":" or an apostrophe between two letters (or "." "," ";" between two digits) does not
+# break a word, e.g. "report.pdf" or "3.14" are single tokens.
+_TOKEN = re.compile(
+    r"\w+(?:(?:(?<=[^\W\d_])[.:'’](?=[^\W\d_])|(?<=\d)[.,;'’](?=\d))\w+)*"
+)
+
+Predicate = Callable[[dict], bool]
+
+
+def _tokens(value) -> set:
+    return set(_TOKEN.findall(str(value).lower()))
+
+
+def file_document(file: FileOut) -> dict:
+    """The fields of a file's Elasticsearch entry that feeds can be evaluated against without a query."""
+    return {
+        "resource_type": "file",
+        "name": file.name,
+        "creator": file.creator.email,
+        "content_type": file.content_type.content_type,
+        "content_type_main": file.content_type.main_type,
+        "bytes": file.bytes,
+        "downloads": file.downloads,
+    }
+
+
+def _compile_criteria(criteria: SearchCriteria) -> Optional[Predicate]:
+    field = criteria.field
+    if criteria.operator != "==":
+        return None
+    if field in KEYWORD_FIELDS:
+        value = criteria.value
+        return lambda doc: doc.get(field) == value
+    if field in TEXT_FIELDS:
+        # match query: any of the analyzed terms
+        terms = _tokens(criteria.value)
+        return lambda doc: doc.get(field) is not None and not terms.isdisjoint(
+            _tokens(doc[field])
+        )
+    if field in NUMERIC_FIELDS:
+        try:
+            number = float(criteria.value)
+        except ValueError:
+            # Elasticsearch rejects the query, so nothing matches
+            return lambda doc: False
+        return lambda doc: doc.get(field) == number
+    return None
+
+
+def compile_search(search: SearchObject) -> Optional[Predicate]:
+    """Turn the criteria of a saved search into a function of a file document (see `file_document()`), equivalent to
+    the `match` queries `check_search_result` sends. Returns None if any criteria needs Elasticsearch, e.g. metadata.
+    """
+    predicates = [_compile_criteria(c) for c in search.criteria]
+    if None in predicates:
+        return None
+    if not predicates:
+        return lambda doc: True
+    if search.mode == "or":
+        return lambda doc: any(p(doc) for p in predicates)
+    return lambda doc: all(p(doc) for p in predicates)
+
+
+class CompiledFeed(NamedTuple):
+    feed_id: str
+    search: SearchObject
+    predicate: Optional[Predicate]
+    listener_ids: List[str]
+
+
+class FeedMatcher:
+    """Match new files against all automatic feeds in-process instead of sending one Elasticsearch query per feed.
+
+    Compiled feeds are cached until `invalidate()` is called by the routes that change feeds, and for at most
+    `FEED_CACHE_TTL` seconds so feeds created by other processes (e.g. the heartbeat listener) are picked up too.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._feeds: Optional[List[CompiledFeed]] = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._feeds = None
+
+    async def feeds(self) -> List[CompiledFeed]:
+        if self._feeds is None or time.monotonic() - self._loaded_at > self.ttl:
+            feeds = []
+            async for feed in FeedDB.find(FeedDB.listeners.automatic == True):
+                feeds.append(
+                    CompiledFeed(
+                        feed_id=str(feed.id),
+                        search=feed.search,
+                        predicate=compile_search(feed.search),
+                        listener_ids=[
+                            l.listener_id for l in feed.listeners if l.automatic
+                        ],
+                    )
+                )
+            self._feeds = feeds
+            self._loaded_at = time.monotonic()
+        return self._feeds
+
+    async def uses_elasticsearch(self) -> bool:
+        """Whether some feed can only be evaluated by querying Elasticsearch, i.e. new files must be searchable first."""
+        return any(feed.predicate is None for feed in await self.feeds())
+
+    async def matching_listeners(
+        self, es_client: Elasticsearch, file_out: FileOut
+    ) -> List[str]:
+        """IDs of the listeners of every automatic feed the file matches, in feed order."""
+        doc = file_document(file_out)
+        listener_ids = []
+        for feed in await self.feeds():
+            if feed.predicate is not None:
+                matched = feed.predicate(doc)
+            else:
+                matched = await asyncio.to_thread(
+                    check_search_result, es_client, file_out, feed.search
+                )
+            if matched:
+                listener_ids += feed.listener_ids
+        return listener_ids
+
+
+feed_matcher = FeedMatcher(settings.FEED_CACHE_TTL)
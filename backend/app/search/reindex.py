@@ -0,0 +1,224 @@
+"""Rebuild the Clowder search index from MongoDB.
+
+Datasets and files are read with cursors in _id order, joined in batches with their authorizations and metadata
+(see DocumentBuilder) and written with parallel bulk requests into a new index (e.g. clowder-20230601120000). Once
+everything is written the `elasticsearch_index` alias is moved to the new index, so searches keep working on the old
+one in the meantime.
+Progress is saved in the config collection after each batch; if a run is interrupted, continue it with --resume.
+Changes made through the API while the command runs only reach the old index, so run it when the instance is quiet.
+
+    cd backend
+    python -m app.search.reindex [--resume] [--batch-size 500] [--workers 4] [--delete-old]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from elasticsearch import Elasticsearch
+
+from app.config import settings
+from app.main import startup_beanie
+from app.models.config import ConfigEntryDB
+from app.models.datasets import DatasetDB
+from app.models.files import FileDB
+from app.search.bulk import BulkIndexer
+from app.search.config import indexSettings
+from app.search.connect import connect_elasticsearch
+from app.search.index import DocumentBuilder
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = "search_reindex"
+
+
+class Progress:
+    """Count indexed documents and log throughput every `interval` seconds."""
+
+    def __init__(self, interval: float = 10):
+        self.interval = interval
+        self.counts = defaultdict(int)
+        self.started = time.monotonic()
+        self.reported = self.started
+
+    def add(self, kind: str, count: int):
+        self.counts[kind] += count
+        if time.monotonic() - self.reported >= self.interval:
+            self.report()
+
+    def report(self):
+        self.reported = time.monotonic()
+        elapsed = max(self.reported - self.started, 1e-6)
+        total = sum(self.counts.values())
+        logger.info(
+            ", ".join(f"{kind} {count}" for kind, count in self.counts.items())
+            + f" - {total / elapsed:.0f} documents/s over {elapsed:.0f} s"
+        )
+
+
+async def load_checkpoint() -> Optional[dict]:
+    if (entry := await ConfigEntryDB.find_one({"key": CHECKPOINT_KEY})) is not None:
+        return json.loads(entry.value)
+    return None
+
+
+async def save_checkpoint(checkpoint: Optional[dict]):
+    entry = await ConfigEntryDB.find_one({"key": CHECKPOINT_KEY})
+    if checkpoint is None:
+        if entry is not None:
+            await entry.delete()
+    elif entry is None:
+        await ConfigEntryDB(key=CHECKPOINT_KEY, value=json.dumps(checkpoint)).insert()
+    else:
+        entry.value = json.dumps(checkpoint)
+        await entry.save()
+
+
+async def batches(model, after: Optional[str], size: int):
+    """Documents of a collection in _id order, starting after `after`, in lists of `size`."""
+    query = model.find(model.id > ObjectId(after)) if after else model.find()
+    batch = []
+    async for doc in query.sort("_id"):
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def create_versioned_index(es: Elasticsearch) -> str:
+    name = f"{settings.elasticsearch_index}-{datetime.utcnow():%Y%m%d%H%M%S}"
+    # No refreshes or replicas while loading; restored once everything is written
+    es.indices.create(
+        index=name,
+        settings={
+            **settings.elasticsearch_setting,
+            "number_of_replicas": 0,
+            "refresh_interval": "-1",
+        },
+        mappings=indexSettings.es_mappings,
+    )
+    return name
+
+
+def swap_alias(es: Elasticsearch, target: str, delete_old: bool):
+    """Point the alias searches use at `target` in one atomic operation."""
+    alias = settings.elasticsearch_index
+    actions = [{"add": {"index": target, "alias": alias}}]
+    old_indices = []
+    if es.indices.exists_alias(name=alias):
+        old_indices = [i for i in es.indices.get_alias(name=alias) if i != target]
+        actions = [
+            {"remove": {"index": i, "alias": alias}} for i in old_indices
+        ] + actions
+    elif es.indices.exists(index=alias):
+        # First reindex: the index was created under the alias name and has to go for the alias to take its place
+        actions.insert(0, {"remove_index": {"index": alias}})
+    es.indices.update_aliases(actions=actions)
+    logger.info(f"{alias} now points to {target}")
+    for old in old_indices:
+        if delete_old:
+            es.indices.delete(index=old)
+            logger.info(f"Deleted {old}")
+        else:
+            logger.info(f"Previous index {old} was kept")
+
+
+async def reindex(
+    es: Elasticsearch, batch_size: int, workers: int, resume: bool, delete_old: bool
+):
+    checkpoint = await load_checkpoint() if resume else None
+    if checkpoint is None:
+        checkpoint = {
+            "index": create_versioned_index(es),
+            "datasets": None,
+            "files": None,
+        }
+        await save_checkpoint(checkpoint)
+        logger.info(f"Indexing into {checkpoint['index']}")
+    else:
+        logger.info(f"Resuming {checkpoint}")
+    target = checkpoint["index"]
+
+    indexer = BulkIndexer(es, max_actions=batch_size, concurrency=workers)
+    builder = DocumentBuilder()
+    progress = Progress()
+    failed = False
+
+    sources = [
+        ("datasets", DatasetDB, builder.datasets),
+        ("files", FileDB, builder.files),
+    ]
+    for kind, model, build in sources:
+        # Batches are written concurrently, so the checkpoint only moves past a batch once all earlier ones are done
+        pending = deque()
+
+        async def advance(wait: bool):
+            nonlocal failed
+            while pending and (wait or pending[0][1].done()):
+                last_id, written = pending.popleft()
+                if not all(await written):
+                    failed = True
+                if not failed:
+                    checkpoint[kind] = last_id
+                    await save_checkpoint(checkpoint)
+
+        async for batch in batches(model, checkpoint[kind], batch_size):
+            docs = await build(batch)
+            written = [
+                await indexer.index(target, resource.id, doc)
+                for resource, doc in zip(batch, docs)
+            ]
+            pending.append((str(batch[-1].id), asyncio.gather(*written)))
+            progress.add(kind, len(batch))
+            await advance(wait=False)
+        await advance(wait=True)
+    await indexer.stop()
+    progress.report()
+
+    if failed:
+        logger.error(
+            f"Some documents could not be indexed, {settings.elasticsearch_index} was not switched to {target}. "
+            "Fix the errors above and run again with --resume."
+        )
+        return
+    es.indices.put_settings(
+        index=target,
+        settings={
+            "number_of_replicas": settings.elasticsearch_no_of_replicas,
+            "refresh_interval": None,
+        },
+    )
+    es.indices.refresh(index=target)
+    swap_alias(es, target, delete_old)
+    await save_checkpoint(None)
+
+
+async def main(args):
+    await startup_beanie()
+    es = await connect_elasticsearch()
+    await reindex(es, args.batch_size, args.workers, args.resume, args.delete_old)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--workers", type=int, default=4, help="concurrent bulk requests"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="continue an interrupted reindex"
+    )
+    parser.add_argument(
+        "--delete-old",
+        action="store_true",
+        help="delete the index the alias pointed to before",
+    )
+    asyncio.run(main(parser.parse_args()))
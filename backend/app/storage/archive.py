@@ -0,0 +1,56 @@
+import io
+import time
+import zipfile
+from typing import Union
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable buffer that zipfile writes into. Whatever has been written is handed out by `drain()`."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._buffer += b
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class StreamingZip:
+    """Build a zip archive incrementally, e.g. to send it to a client while it is being created.
+
+    Because the underlying stream is not seekable, zipfile writes a data descriptor after each entry instead of
+    going back to patch the header, so nothing but the current chunk needs to be kept in memory. Call `drain()`
+    after each write to collect the archive bytes produced so far and `close()` to get the central directory.
+    """
+
+    def __init__(self):
+        self._sink = _ZipSink()
+        self._zip = zipfile.ZipFile(
+            self._sink, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True
+        )
+
+    def writestr(self, arcname: str, data: Union[str, bytes]):
+        """Add a small, fully in-memory entry (compressed)."""
+        self._zip.writestr(arcname, data)
+
+    def open(self, arcname: str):
+        """Open a new entry for writing chunk by chunk. Entries are stored rather than deflated so writing large
+        payloads costs a copy and a CRC, not compression time on the event loop."""
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        return self._zip.open(info, mode="w", force_zip64=True)
+
+    def drain(self) -> bytes:
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._zip.close()
+        return self.drain()
@@ -0,0 +1,108 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, List, Optional
+
+from minio import Minio
+from minio.deleteobjects import DeleteError, DeleteObject
+
+from app.config import settings
+
+# Shared by every AsyncStorage so the number of blocking Minio calls in flight is bounded per process, not per request
+_executor = ThreadPoolExecutor(
+    max_workers=settings.MINIO_MAX_WORKERS, thread_name_prefix="minio"
+)
+
+
+class AsyncStorage:
+    """Async facade over the synchronous Minio client.
+
+    Every call runs on a shared thread pool (`MINIO_MAX_WORKERS` threads) so a large upload or download never blocks
+    the event loop. Requests beyond that limit queue for a free worker instead of serializing the whole server.
+    """
+
+    def __init__(self, client: Minio):
+        self.client = client
+
+    async def run(self, fn, *args, **kwargs):
+        """Run any blocking callable on the storage thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    async def put_object(self, bucket_name: str, object_name: str, data, **kwargs):
+        return await self.run(
+            self.client.put_object, bucket_name, object_name, data, **kwargs
+        )
+
+    async def remove_object(self, bucket_name: str, object_name: str, **kwargs):
+        return await self.run(
+            self.client.remove_object, bucket_name, object_name, **kwargs
+        )
+
+    async def remove_objects(
+        self, bucket_name: str, object_names: Iterable[str]
+    ) -> List[DeleteError]:
+        """Remove many objects with multi-object delete requests (1000 objects each) and return the failures."""
+        return await self.run(
+            lambda: list(
+                self.client.remove_objects(
+                    bucket_name, [DeleteObject(name) for name in object_names]
+                )
+            )
+        )
+
+    async def stat_object(self, bucket_name: str, object_name: str, **kwargs):
+        return await self.run(
+            self.client.stat_object, bucket_name, object_name, **kwargs
+        )
+
+    async def presigned_get_object(self, bucket_name: str, object_name: str, **kwargs):
+        return await self.run(
+            self.client.presigned_get_object,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            **kwargs,
+        )
+
+    async def read_object(
+        self, bucket_name: str, object_name: str, version_id: Optional[str] = None
+    ) -> bytes:
+        """Return the full contents of a (small) object."""
+
+        def _read():
+            response = self.client.get_object(
+                bucket_name, object_name, version_id=version_id
+            )
+            try:
+                return response.data
+            finally:
+                response.close()
+                response.release_conn()
+
+        return await self.run(_read)
+
+    async def stream_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        version_id: Optional[str] = None,
+        chunk_size: int = settings.MINIO_UPLOAD_CHUNK_SIZE,
+    ) -> AsyncIterator[bytes]:
+        """Open an object and return an async iterator over its chunks, e.g. for a StreamingResponse.
+
+        The object is opened before returning so a missing object raises here rather than mid-response.
+        """
+        response = await self.run(
+            self.client.get_object, bucket_name, object_name, version_id=version_id
+        )
+        return self._iter_chunks(response, chunk_size)
+
+    async def _iter_chunks(self, response, chunk_size: int) -> AsyncIterator[bytes]:
+        try:
+            while chunk := await self.run(response.read, chunk_size):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
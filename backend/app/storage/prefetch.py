@@ -0,0 +1,57 @@
+import asyncio
+from collections import deque
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def _aiter(items: Iterable[T]) -> AsyncIterator[T]:
+    for item in items:
+        yield item
+
+
+async def prefetch(
+    items: Union[Iterable[T], AsyncIterable[T]],
+    fetch: Callable[[T], Awaitable[R]],
+    window: int,
+) -> AsyncIterator[Tuple[T, R]]:
+    """Yield `(item, await fetch(item))` in the original order while keeping up to `window` fetches running ahead
+    of the consumer, so round-trips for the next items overlap with processing of the current one.
+
+    `items` can be an async iterable such as a database cursor, which is only read `window` items ahead.
+    """
+    window = max(window, 1)
+    if not isinstance(items, AsyncIterable):
+        items = _aiter(items)
+    items = items.__aiter__()
+    pending = deque()
+
+    async def schedule():
+        try:
+            item = await items.__anext__()
+        except StopAsyncIteration:
+            return
+        pending.append((item, asyncio.ensure_future(fetch(item))))
+
+    try:
+        for _ in range(window):
+            await schedule()
+        while pending:
+            item, task = pending.popleft()
+            result = await task
+            # Refill before handing the result over so the window stays full while the consumer works
+            await schedule()
+            yield item, result
+    finally:
+        for _, task in pending:
+            task.cancel()
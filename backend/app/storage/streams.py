@@ -0,0 +1,26 @@
+import hashlib
+from typing import BinaryIO
+
+
+class HashingReader:
+    """File-like wrapper that counts and hashes bytes as they are read.
+
+    Hand this to `Minio.put_object` instead of the raw upload so the size and checksum of the object are known as
+    soon as the upload finishes, without downloading the object again.
+    """
+
+    def __init__(self, stream: BinaryIO, algorithm: str = "md5"):
+        self.stream = stream
+        self.bytes = 0
+        self._hash = hashlib.new(algorithm)
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        if chunk:
+            self.bytes += len(chunk)
+            self._hash.update(chunk)
+        return chunk
+
+    @property
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
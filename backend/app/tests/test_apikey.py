@@ -23,3 +23,17 @@ def test_delete(client: TestClient, headers: dict):
     )
     # TODO: Verify it was actually deleted
     assert delete_response.status_code == 200
+
+
+def test_deleted_key_rejected(client: TestClient, headers: dict):
+    hashed_key = create_apikey(client, headers)
+    key_headers = {"X-API-KEY": hashed_key}
+    # The first call caches the validated key
+    response = client.get(f"{settings.API_V2_STR}/users/profile", headers=key_headers)
+    assert response.status_code == 200
+
+    get_response = client.get(f"{settings.API_V2_STR}/users/keys", headers=headers)
+    key_id = get_response.json()[0].get("id")
+    client.delete(f"{settings.API_V2_STR}/users/keys/{key_id}", headers=headers)
+    response = client.get(f"{settings.API_V2_STR}/users/profile", headers=key_headers)
+    assert response.status_code == 401
@@ -1,6 +1,12 @@
 from fastapi.testclient import TestClient
 from app.config import settings
-from app.tests.utils import create_dataset, create_group
+from app.tests.utils import (
+    create_dataset,
+    create_group,
+    create_user,
+    get_user_token,
+    user_alt,
+)
 
 
 def test_create(client: TestClient, headers: dict):
@@ -12,3 +18,45 @@ def test_create(client: TestClient, headers: dict):
         headers=headers,
     )
     assert response.status_code == 200
+
+
+def test_role_change_applies(client: TestClient, headers: dict):
+    dataset_id = create_dataset(client, headers).get("id")
+    create_user(client, headers)
+    alt_headers = get_user_token(client, headers)
+    owner_url = f"{settings.API_V2_STR}/authorizations/datasets/{dataset_id}/role/owner"
+    viewer_url = (
+        f"{settings.API_V2_STR}/authorizations/datasets/{dataset_id}/role/viewer"
+    )
+    user_role_url = f"{settings.API_V2_STR}/authorizations/datasets/{dataset_id}/user_role/{user_alt['email']}"
+
+    # No role yet, which is remembered for the following requests
+    assert client.get(viewer_url, headers=alt_headers).status_code == 403
+
+    assert client.post(f"{user_role_url}/viewer", headers=headers).status_code == 200
+    assert client.get(viewer_url, headers=alt_headers).status_code == 200
+    assert client.get(owner_url, headers=alt_headers).status_code == 403
+
+    assert client.post(f"{user_role_url}/owner", headers=headers).status_code == 200
+    assert client.get(owner_url, headers=alt_headers).status_code == 200
+
+    assert client.delete(user_role_url, headers=headers).status_code == 200
+    assert client.get(viewer_url, headers=alt_headers).status_code == 403
+
+
+def test_shared_dataset_listed(client: TestClient, headers: dict):
+    dataset_id = create_dataset(client, headers).get("id")
+    create_user(client, headers)
+    alt_headers = get_user_token(client, headers)
+    user_role_url = f"{settings.API_V2_STR}/authorizations/datasets/{dataset_id}/user_role/{user_alt['email']}"
+
+    def listed():
+        response = client.get(f"{settings.API_V2_STR}/datasets", headers=alt_headers)
+        assert response.status_code == 200
+        return dataset_id in [dataset["id"] for dataset in response.json()]
+
+    assert not listed()
+    assert client.post(f"{user_role_url}/viewer", headers=headers).status_code == 200
+    assert listed()
+    assert client.delete(user_role_url, headers=headers).status_code == 200
+    assert not listed()
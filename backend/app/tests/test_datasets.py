@@ -1,14 +1,23 @@
+import hashlib
+import io
 import os
+import zipfile
 
+import pytest
 from fastapi.testclient import TestClient
 
 from app.config import settings
 from app.tests.utils import (
     create_dataset,
+    create_folder,
     create_user,
     generate_png,
+    upload_file,
+    wait_for_status,
     user_example,
     user_alt,
+    file_content_example_1,
+    filename_example_1,
 )
 
 
@@ -33,6 +42,46 @@ def test_delete(client: TestClient, headers: dict):
     assert response.status_code == 200
 
 
+def test_delete_in_background(client: TestClient, headers: dict):
+    dataset_id = create_dataset(client, headers).get("id")
+    file_id = upload_file(client, headers, dataset_id).get("id")
+    response = client.delete(
+        f"{settings.API_V2_STR}/datasets/{dataset_id}", headers=headers
+    )
+    assert response.status_code == 200
+    job_id = response.json().get("job_id")
+
+    job = wait_for_status(client, headers, f"{settings.API_V2_STR}/deletions/{job_id}")
+    assert job["status"] == "SUCCEEDED"
+    assert job["files"] == job["files_deleted"] == 1
+    response = client.get(
+        f"{settings.API_V2_STR}/files/{file_id}/summary", headers=headers
+    )
+    assert response.status_code == 404
+
+
+def test_delete_search_failure(client: TestClient, headers: dict, monkeypatch):
+    dataset_id = create_dataset(client, headers).get("id")
+    file_id = upload_file(client, headers, dataset_id).get("id")
+
+    def fail(*args):
+        raise ConnectionError("Elasticsearch is down")
+
+    monkeypatch.setattr("app.deletion.delete_document_by_id", fail)
+    with pytest.raises(ConnectionError):
+        client.delete(f"{settings.API_V2_STR}/datasets/{dataset_id}", headers=headers)
+    monkeypatch.undo()
+
+    response = client.get(
+        f"{settings.API_V2_STR}/datasets/{dataset_id}", headers=headers
+    )
+    assert response.status_code == 200
+    response = client.get(
+        f"{settings.API_V2_STR}/files/{file_id}/summary", headers=headers
+    )
+    assert response.status_code == 200
+
+
 def test_delete_with_metadata(client: TestClient, headers: dict):
     dataset_id = create_dataset(client, headers).get("id")
     response = client.post(
@@ -79,6 +128,52 @@ def test_list(client: TestClient, headers: dict):
     assert len(response.json()) > 0
 
 
+def test_list_with_cursor(client: TestClient, headers: dict):
+    for _ in range(3):
+        create_dataset(client, headers)
+    url = f"{settings.API_V2_STR}/datasets?mine=true&limit=2"
+    first = client.get(url, headers=headers)
+    assert first.status_code == 200
+    assert int(first.headers["X-Total-Count"]) >= 3
+    cursor = first.headers["X-Next-Cursor"]
+
+    # The cursor continues where skip would
+    second = client.get(f"{url}&cursor={cursor}", headers=headers)
+    skipped = client.get(f"{url}&skip=2", headers=headers)
+    assert second.status_code == 200
+    assert [d["id"] for d in second.json()] == [d["id"] for d in skipped.json()]
+
+    response = client.get(f"{url}&cursor=invalid", headers=headers)
+    assert response.status_code == 400
+
+
+def test_download(client: TestClient, headers: dict):
+    dataset_id = create_dataset(client, headers).get("id")
+    upload_file(client, headers, dataset_id)
+    folder_id = create_folder(client, headers, dataset_id, "folder").get("id")
+    response = client.post(
+        f"{settings.API_V2_STR}/datasets/{dataset_id}/files?folder_id={folder_id}",
+        headers=headers,
+        files={"file": ("nested.txt", b"nested content")},
+    )
+    assert response.status_code == 200
+
+    response = client.get(
+        f"{settings.API_V2_STR}/datasets/{dataset_id}/download", headers=headers
+    )
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    names = archive.namelist()
+    assert f"data/{filename_example_1}" in names
+    assert "data/folder/nested.txt" in names
+    assert "ro-crate-metadata.json" in names
+    assert archive.read(f"data/{filename_example_1}").decode() == file_content_example_1
+    manifest = archive.read("manifest-md5.txt").decode()
+    expected_md5 = hashlib.md5(file_content_example_1.encode()).hexdigest()
+    assert f"{expected_md5} {filename_example_1}" in manifest
+
+
 def test_add_thumbnail(client: TestClient, headers: dict):
     resp = create_dataset(client, headers)
     dataset_id = resp["id"]
@@ -1,7 +1,13 @@
 from fastapi.testclient import TestClient
 
 from app.config import settings
-from app.tests.utils import create_dataset, upload_file, register_v1_extractor
+from app.tests.utils import (
+    create_dataset,
+    upload_file,
+    upload_files,
+    register_v1_extractor,
+    wait_for_status,
+)
 
 
 def test_register(client: TestClient, headers: dict):
@@ -61,3 +67,52 @@ def test_v1_mime_trigger(client: TestClient, headers: dict):
     )
     assert response.status_code == 200
     assert len(response.json()) > 0
+
+
+def test_submit_batch(client: TestClient, headers: dict):
+    ext_name = "test.test_submit_batch"
+    register_v1_extractor(client, headers, ext_name)
+    dataset_id = create_dataset(client, headers).get("id")
+    upload_files(client, headers, dataset_id)
+    response = client.post(
+        f"{settings.API_V2_STR}/jobs/batches",
+        json={"listener_id": ext_name, "dataset_id": dataset_id},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    batch_id = response.json().get("id")
+    files = response.json().get("files")
+    assert files > 0
+
+    batch = wait_for_status(
+        client, headers, f"{settings.API_V2_STR}/jobs/batches/{batch_id}"
+    )
+    assert batch["status"] == "SUCCEEDED"
+    assert batch["submitted"] == files
+    assert sum(batch["jobs"].values()) == files
+
+    # Only one target at a time
+    response = client.post(
+        f"{settings.API_V2_STR}/jobs/batches",
+        json={"listener_id": ext_name},
+        headers=headers,
+    )
+    assert response.status_code == 400
+
+
+def test_alive_only(client: TestClient, headers: dict):
+    # Listeners registered through the API have not sent a heartbeat yet
+    ext_name = "test.test_alive_only"
+    register_v1_extractor(client, headers, ext_name)
+    response = client.get(
+        f"{settings.API_V2_STR}/listeners/search?text={ext_name}&alive_only=true",
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 0
+
+    response = client.get(
+        f"{settings.API_V2_STR}/listeners/categories/status", headers=headers
+    )
+    assert response.status_code == 200
+    assert sum(category["dead"] for category in response.json()) > 0
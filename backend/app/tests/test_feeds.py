@@ -3,6 +3,8 @@ import time
 from fastapi.testclient import TestClient
 
 from app.config import settings
+from app.models.search import SearchObject
+from app.search.matcher import compile_search
 from app.tests.utils import (
     create_dataset,
     upload_file,
@@ -37,12 +39,53 @@ def test_feeds(client: TestClient, headers: dict):
         client, headers, dataset_id, "xyz.txt", "This should trigger."
     ).get("id")
 
-    time.sleep(1)
-
-    # Check if job was automatically created
-    response = client.get(
-        f"{settings.API_V2_STR}/jobs?listener_id={listener_name}&file_id={file_id}",
-        headers=headers,
-    )
-    assert response.status_code == 200
+    # Check if job was automatically created. Feeds are evaluated in the background after the upload returns.
+    for _ in range(10):
+        time.sleep(1)
+        response = client.get(
+            f"{settings.API_V2_STR}/jobs?listener_id={listener_name}&file_id={file_id}",
+            headers=headers,
+        )
+        assert response.status_code == 200
+        if len(response.json()) > 0:
+            break
     assert len(response.json()) > 0
+
+
+def test_compile_search():
+    doc = {
+        "resource_type": "file",
+        "name": "My report.pdf",
+        "creator": "test@test.org",
+        "content_type": "application/pdf",
+        "content_type_main": "application",
+        "bytes": 1024,
+        "downloads": 0,
+    }
+
+    def search(mode, *criteria):
+        return compile_search(
+            SearchObject(
+                index_name=settings.elasticsearch_index,
+                mode=mode,
+                criteria=[{"field": f, "value": v} for f, v in criteria],
+            )
+        )
+
+    # keyword fields must match exactly, text fields on any analyzed term
+    assert search("and", ("content_type", "application/pdf"))(doc)
+    assert not search("and", ("content_type", "application"))(doc)
+    assert search("and", ("name", "REPORT.pdf"))(doc)
+    assert not search("and", ("name", "report"))(doc)
+    assert search("and", ("bytes", "1024"))(doc)
+
+    assert search(
+        "or", ("content_type", "image/png"), ("content_type_main", "application")
+    )(doc)
+    assert not search(
+        "and", ("content_type", "image/png"), ("content_type_main", "application")
+    )(doc)
+    assert search("and")(doc)
+
+    # metadata is only in Elasticsearch
+    assert search("and", ("metadata.latitude", "24.4")) is None
@@ -1,9 +1,16 @@
+import hashlib
 import os
 
 from fastapi.testclient import TestClient
 
 from app.config import settings
-from app.tests.utils import create_dataset, upload_file, upload_files, generate_png
+from app.tests.utils import (
+    create_dataset,
+    upload_file,
+    upload_files,
+    generate_png,
+    file_content_example_1,
+)
 
 
 def test_create_and_delete(client: TestClient, headers: dict):
@@ -49,6 +56,8 @@ def test_get_one(client: TestClient, headers: dict):
     assert result["name"] == temp_name
     assert result["version_num"] == 1
     assert result["dataset_id"] == dataset_id
+    assert result["bytes"] == len(file_content_example_1)
+    assert result["md5"] == hashlib.md5(file_content_example_1.encode()).hexdigest()
 
 
 def test_add_thumbnail(client: TestClient, headers: dict):
@@ -1,6 +1,8 @@
+import io
+
 from fastapi.testclient import TestClient
 from app.config import settings
-from app.tests.utils import create_dataset, create_folder
+from app.tests.utils import create_dataset, create_folder, wait_for_status
 
 
 def test_create_nested(client: TestClient, headers: dict):
@@ -29,3 +31,57 @@ def test_create_nested(client: TestClient, headers: dict):
     )
     assert response.status_code == 200
     assert len(response.json()) == 1
+
+
+def test_path(client: TestClient, headers: dict):
+    dataset_id = create_dataset(client, headers).get("id")
+    folder1_id = create_folder(client, headers, dataset_id, "top folder").get("id")
+    folder2_id = create_folder(
+        client, headers, dataset_id, "nested folder", folder1_id
+    ).get("id")
+    folder3_id = create_folder(
+        client, headers, dataset_id, "deep folder", folder2_id
+    ).get("id")
+
+    response = client.get(
+        f"{settings.API_V2_STR}/folders/{folder3_id}/path",
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"folder_name": "top folder", "folder_id": folder1_id},
+        {"folder_name": "nested folder", "folder_id": folder2_id},
+        {"folder_name": "deep folder", "folder_id": folder3_id},
+    ]
+
+
+def test_delete_nested(client: TestClient, headers: dict):
+    dataset_id = create_dataset(client, headers).get("id")
+    folder1_id = create_folder(client, headers, dataset_id, "top folder").get("id")
+    folder2_id = create_folder(
+        client, headers, dataset_id, "nested folder", folder1_id
+    ).get("id")
+    response = client.post(
+        f"{settings.API_V2_STR}/datasets/{dataset_id}/files?folder_id={folder2_id}",
+        headers=headers,
+        files={"file": ("nested.txt", io.BytesIO(b"nested"))},
+    )
+    assert response.status_code == 200
+    file_id = response.json().get("id")
+
+    response = client.delete(
+        f"{settings.API_V2_STR}/datasets/{dataset_id}/folders/{folder1_id}",
+        headers=headers,
+    )
+    assert response.status_code == 200
+    job_id = response.json().get("job_id")
+
+    # The contents are deleted in the background
+    job = wait_for_status(client, headers, f"{settings.API_V2_STR}/deletions/{job_id}")
+    assert job["status"] == "SUCCEEDED"
+    assert job["folders"] == 2
+    assert job["files_deleted"] == 1
+    response = client.get(
+        f"{settings.API_V2_STR}/files/{file_id}/summary", headers=headers
+    )
+    assert response.status_code == 404
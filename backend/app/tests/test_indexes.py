@@ -0,0 +1,23 @@
+from app.models.indexes import declared_indexes, existing_indexes
+from app.models.listeners import EventListenerJobDB
+
+
+def test_declared_indexes_match_existing():
+    declared = declared_indexes(EventListenerJobDB)
+    # As returned by index_information() for the indexes init_beanie creates
+    existing = existing_indexes(
+        {
+            "_id_": {"key": [("_id", 1)]},
+            "text": {
+                "key": [("_fts", "text"), ("_ftsx", 1)],
+                "weights": {
+                    "resource_ref.resource_id": 1,
+                    "listener_id": 1,
+                    "status": 1,
+                },
+            },
+            "resource": {"key": [("resource_ref.resource_id", 1.0), ("created", -1.0)]},
+            "batch": {"key": [("batch_id", 1), ("status", 1)]},
+        }
+    )
+    assert declared == existing.keys() - {(("_id", 1),)}
@@ -0,0 +1,74 @@
+import asyncio
+import base64
+import time
+
+import pytest
+import rsa
+from jose import JWTError, jwt
+
+from app.keycloak_auth import TokenVerifier
+
+
+def _b64(number: int) -> str:
+    data = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+class FakeRealm:
+    """Stands in for KeycloakOpenID: signs tokens and serves the public keys."""
+
+    def __init__(self):
+        self.keys = {}
+        self.certs_calls = 0
+
+    def rotate(self, kid: str):
+        public, private = rsa.newkeys(1024)
+        self.keys[kid] = (public, private.save_pkcs1().decode())
+
+    def sign(self, kid: str, **claims) -> str:
+        claims = {"exp": int(time.time()) + 300, **claims}
+        return jwt.encode(
+            claims, self.keys[kid][1], algorithm="RS256", headers={"kid": kid}
+        )
+
+    def certs(self):
+        self.certs_calls += 1
+        return {
+            "keys": [
+                {
+                    "kid": kid,
+                    "kty": "RSA",
+                    "alg": "RS256",
+                    "use": "sig",
+                    "n": _b64(public.n),
+                    "e": _b64(public.e),
+                }
+                for kid, (public, _) in self.keys.items()
+            ]
+        }
+
+
+def test_token_verifier():
+    realm = FakeRealm()
+    realm.rotate("first")
+    verifier = TokenVerifier(realm, jwks_min_refresh=0)
+    token = realm.sign("first", preferred_username="alice")
+
+    async def verify_all():
+        # Keys are fetched once, the second check of the same token is a cache hit
+        assert (await verifier.verify(token))["preferred_username"] == "alice"
+        assert (await verifier.verify(token))["preferred_username"] == "alice"
+        assert realm.certs_calls == 1
+
+        # A token signed with a new key makes the verifier fetch the keys again
+        realm.rotate("second")
+        rotated = realm.sign("second", preferred_username="bob")
+        assert (await verifier.verify(rotated))["preferred_username"] == "bob"
+        assert realm.certs_calls == 2
+
+        with pytest.raises(JWTError):
+            await verifier.verify(token[:-4] + "AAAA")
+        with pytest.raises(JWTError):
+            await verifier.verify(realm.sign("second", exp=int(time.time()) - 10))
+
+    asyncio.run(verify_all())
@@ -1,5 +1,6 @@
 import os
 import struct
+import time
 
 from elasticsearch import Elasticsearch
 from fastapi.testclient import TestClient
@@ -241,6 +242,18 @@ def register_v2_listener(client: TestClient, headers: dict, name: str = None):
     return response.json()
 
 
+def wait_for_status(client: TestClient, headers: dict, url: str, timeout: float = 5):
+    """Poll the background job at `url` until it succeeds or fails, or `timeout` seconds pass, and return its JSON."""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        finished = response.json()["status"] in ("SUCCEEDED", "FAILED")
+        if finished or time.monotonic() > deadline:
+            return response.json()
+        time.sleep(0.1)
+
+
 def generate_png(file_path):
     """Generate a small 16x16 black PNG file for tests that need images. Written like this to avoid dependency on something like Pillow."""
     # PNG signature
@@ -0,0 +1,165 @@
+"""Time the authentication dependencies a typical route resolves (router-level `get_current_username`, then
+`get_current_user`, `get_admin` and `get_token` in the handler) and count how often each request checks the token and
+loads the user.
+
+Requires the MongoDB server configured in app.config. Tokens are signed with a throwaway key instead of Keycloak, and
+a throwaway user is created and removed afterwards.
+
+    cd backend
+    python -m benchmarks.auth_dependencies --requests 2000
+"""
+import argparse
+import asyncio
+import base64
+import time
+
+import httpx
+import rsa
+from beanie import init_beanie
+from fastapi import APIRouter, Depends, FastAPI
+from jose import jwt
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app import keycloak_auth
+from app.config import settings
+from app.keycloak_auth import (
+    TokenVerifier,
+    get_current_user,
+    get_current_username,
+    get_token,
+)
+from app.models.users import UserDB
+from app.routers.authentication import get_admin
+
+EMAIL = "benchmark-auth@example.com"
+
+
+def _b64(number: int) -> str:
+    data = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+class LocalRealm:
+    """Serves the public half of a key generated here, in place of the Keycloak realm."""
+
+    def __init__(self):
+        self.public, private = rsa.newkeys(2048)
+        self.private = private.save_pkcs1().decode()
+
+    def certs(self):
+        return {
+            "keys": [
+                {
+                    "kid": "benchmark",
+                    "kty": "RSA",
+                    "alg": "RS256",
+                    "use": "sig",
+                    "n": _b64(self.public.n),
+                    "e": _b64(self.public.e),
+                }
+            ]
+        }
+
+    def token(self) -> str:
+        claims = {
+            "exp": int(time.time()) + 3600,
+            "preferred_username": EMAIL,
+            "email": EMAIL,
+        }
+        return jwt.encode(
+            claims, self.private, algorithm="RS256", headers={"kid": "benchmark"}
+        )
+
+
+class Counter:
+    """Wrap an async callable and count the calls."""
+
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return await self.func(*args, **kwargs)
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    router = APIRouter()
+
+    @app.get("/plain")
+    async def plain():
+        return {}
+
+    @router.get("/authenticated")
+    async def authenticated(
+        user=Depends(get_current_user),
+        admin=Depends(get_admin),
+        identity=Depends(get_token),
+    ):
+        return {"email": user.email, "admin": bool(admin)}
+
+    app.include_router(router, dependencies=[Depends(get_current_username)])
+    return app
+
+
+async def timed(client: httpx.AsyncClient, path: str, headers: dict, count: int):
+    start = time.perf_counter()
+    for _ in range(count):
+        response = await client.get(path, headers=headers)
+        assert response.status_code == 200, response.text
+    return (time.perf_counter() - start) / count
+
+
+async def main(count: int):
+    mongo = AsyncIOMotorClient(str(settings.MONGODB_URL))
+    await init_beanie(
+        database=getattr(mongo, settings.MONGO_DATABASE), document_models=[UserDB]
+    )
+    realm = LocalRealm()
+    verifier = keycloak_auth.token_verifier = TokenVerifier(realm)
+    verify = verifier.verify = Counter(verifier.verify)
+    find_user = Counter(UserDB.find_one)
+    UserDB.find_one = find_user
+
+    user = UserDB(
+        email=EMAIL,
+        first_name="Bench",
+        last_name="Mark",
+        hashed_password="",
+        admin=False,
+    )
+    await user.insert()
+    try:
+        headers = {"Authorization": "Bearer " + realm.token()}
+        transport = httpx.ASGITransport(app=make_app())
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            # Warm up: fetches the keys and caches the token
+            await timed(client, "/authenticated", headers, 10)
+
+            plain = await timed(client, "/plain", headers, count)
+            verify.calls = find_user.calls = 0
+            authenticated = await timed(client, "/authenticated", headers, count)
+        print(
+            "no authentication    %8.3f ms/request\n"
+            "auth dependencies    %8.3f ms/request  (+%.3f ms)\n"
+            "per request: %.2f token checks, %.2f user lookups"
+            % (
+                plain * 1000,
+                authenticated * 1000,
+                (authenticated - plain) * 1000,
+                verify.calls / count,
+                find_user.calls / count,
+            )
+        )
+    finally:
+        await user.delete()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,94 @@
+"""Time the streamed BagIt export of a dataset made of many small files for several prefetch window sizes.
+
+Requires the MongoDB and Minio servers configured in app.config (e.g. `docker-compose -f docker-compose.dev.yml up -d`).
+A throwaway dataset is created and removed afterwards.
+
+    cd backend
+    python -m benchmarks.dataset_download --files 10000 --size-kb 4 --windows 1 8 32
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app import dependencies
+from app.config import settings
+from app.models.datasets import DatasetDB
+from app.models.files import FileDB
+from app.models.folders import FolderDB
+from app.models.metadata import MetadataDB
+from app.models.users import UserOut
+from app.routers.datasets import _stream_dataset_archive
+
+
+async def seed(fs, user: UserOut, count: int, size: int) -> DatasetDB:
+    dataset = DatasetDB(name="benchmark-dataset-download", creator=user)
+    await dataset.insert()
+    files = [
+        FileDB(name="file-%d.bin" % i, creator=user, dataset_id=dataset.id, bytes=size)
+        for i in range(count)
+    ]
+    await FileDB.insert_many(files)
+    files = await FileDB.find(FileDB.dataset_id == dataset.id).to_list()
+    payload = os.urandom(size)
+
+    async def put(file: FileDB):
+        await fs.put_object(
+            settings.MINIO_BUCKET_NAME, str(file.id), io.BytesIO(payload), length=size
+        )
+
+    for i in range(0, len(files), settings.MINIO_MAX_WORKERS):
+        await asyncio.gather(
+            *[put(f) for f in files[i : i + settings.MINIO_MAX_WORKERS]]
+        )
+    return dataset
+
+
+async def cleanup(fs, dataset: DatasetDB):
+    async for file in FileDB.find(FileDB.dataset_id == dataset.id):
+        await fs.remove_object(settings.MINIO_BUCKET_NAME, str(file.id))
+    await FileDB.find(FileDB.dataset_id == dataset.id).delete()
+    await dataset.delete()
+
+
+async def main(count: int, size: int, windows):
+    client = AsyncIOMotorClient(str(settings.MONGODB_URL))
+    await init_beanie(
+        database=getattr(client, settings.MONGO_DATABASE),
+        document_models=[DatasetDB, FileDB, FolderDB, MetadataDB],
+    )
+    fs = await dependencies.get_fs()
+    user = UserOut.construct(
+        email="benchmark@example.com", first_name="Bench", last_name="Mark"
+    )
+
+    print("seeding %d files of %d bytes" % (count, size))
+    dataset = await seed(fs, user, count, size)
+    try:
+        for window in windows:
+            start = time.perf_counter()
+            archive_size = 0
+            async for chunk in _stream_dataset_archive(
+                dataset, user, fs, prefetch_window=window
+            ):
+                archive_size += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(
+                "window %3d  %8.2f s  %8.1f files/s  archive %8.1f MB"
+                % (window, elapsed, count / elapsed, archive_size / 1024 / 1024)
+            )
+    finally:
+        await cleanup(fs, dataset)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--size-kb", type=int, default=4)
+    parser.add_argument("--windows", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+    asyncio.run(main(args.files, args.size_kb * 1024, args.windows))
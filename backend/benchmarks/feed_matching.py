@@ -0,0 +1,141 @@
+"""Time matching new files against 1,000 MIME-type feeds (like those registered for v1 extractors) in-process, and
+optionally with the previous approach of one Elasticsearch query per feed.
+
+The in-process part needs no services. `--elasticsearch` uses the server configured in app.config and a temporary
+index that is deleted afterwards.
+
+    cd backend
+    python -m benchmarks.feed_matching --feeds 1000 --files 1000 --elasticsearch
+"""
+import argparse
+import random
+import time
+
+from elasticsearch import Elasticsearch
+
+from app.config import settings
+from app.models.files import ContentType, FileOut
+from app.models.search import SearchCriteria, SearchObject
+from app.models.users import UserOut
+from app.search.config import indexSettings
+from app.search.connect import check_search_result, create_index, delete_index
+from app.search.matcher import compile_search, file_document
+
+MAIN_TYPES = ["application", "audio", "image", "text", "video", "model"]
+
+
+def make_feeds(count: int):
+    """Feeds like the ones created for v1 extractors: a few MIME types each, matched with "or"."""
+    rng = random.Random(0)
+    feeds = []
+    for i in range(count):
+        criteria = []
+        for _ in range(rng.randint(1, 4)):
+            main_type = rng.choice(MAIN_TYPES)
+            if rng.random() < 0.2:
+                criteria.append(
+                    SearchCriteria(field="content_type_main", value=main_type)
+                )
+            else:
+                criteria.append(
+                    SearchCriteria(
+                        field="content_type",
+                        value="%s/x-%d" % (main_type, rng.randint(0, 50)),
+                    )
+                )
+        feeds.append(
+            SearchObject(
+                index_name=settings.elasticsearch_index, criteria=criteria, mode="or"
+            )
+        )
+    return feeds
+
+
+def make_files(count: int):
+    rng = random.Random(1)
+    creator = UserOut.construct(
+        email="benchmark@example.com", first_name="Bench", last_name="Mark"
+    )
+    files = []
+    for i in range(count):
+        main_type = rng.choice(MAIN_TYPES)
+        content_type = "%s/x-%d" % (main_type, rng.randint(0, 50))
+        files.append(
+            FileOut.construct(
+                id="%024x" % i,
+                name="file-%d" % i,
+                creator=creator,
+                bytes=rng.randint(0, 10**6),
+                downloads=0,
+                content_type=ContentType(
+                    content_type=content_type, main_type=main_type
+                ),
+            )
+        )
+    return files
+
+
+def bench_in_process(feeds, files):
+    start = time.perf_counter()
+    predicates = [compile_search(feed) for feed in feeds]
+    compiled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matches = 0
+    for file in files:
+        doc = file_document(file)
+        matches += sum(1 for p in predicates if p(doc))
+    elapsed = time.perf_counter() - start
+    print(
+        "in-process     compile %6.1f ms  match %8.3f ms/file  (%d matches)"
+        % (compiled * 1000, elapsed * 1000 / len(files), matches)
+    )
+
+
+def bench_elasticsearch(feeds, files, sample: int):
+    es = Elasticsearch(settings.elasticsearch_url)
+    settings.elasticsearch_index = "benchmark-feed-matching"
+    create_index(
+        es,
+        settings.elasticsearch_index,
+        settings.elasticsearch_setting,
+        indexSettings.es_mappings,
+    )
+    try:
+        files = files[:sample]
+        for file in files:
+            es.index(
+                index=settings.elasticsearch_index,
+                id=str(file.id),
+                document=file_document(file),
+            )
+        es.indices.refresh(index=settings.elasticsearch_index)
+
+        start = time.perf_counter()
+        matches = 0
+        for file in files:
+            matches += sum(1 for feed in feeds if check_search_result(es, file, feed))
+        elapsed = time.perf_counter() - start
+        print(
+            "elasticsearch                     match %8.3f ms/file  (%d matches, %d files)"
+            % (elapsed * 1000 / len(files), matches, len(files))
+        )
+    finally:
+        delete_index(es, settings.elasticsearch_index)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--feeds", type=int, default=1000)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--elasticsearch", action="store_true")
+    parser.add_argument(
+        "--es-files", type=int, default=10, help="files to match with Elasticsearch"
+    )
+    args = parser.parse_args()
+
+    feeds = make_feeds(args.feeds)
+    files = make_files(args.files)
+    bench_in_process(feeds, files)
+    if args.elasticsearch:
+        bench_elasticsearch(feeds, files, args.es_files)
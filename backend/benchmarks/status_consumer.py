@@ -0,0 +1,208 @@
+"""Time applying listener status messages to their jobs one message at a time (as the previous callback did) and in
+batches with `StatusConsumer`, optionally with several consumers sharing the queue.
+
+Requires the MongoDB server configured in app.config. RabbitMQ is replaced by an in-process queue that delivers
+messages to the consumers with the same prefetch limit. Throwaway jobs are created and removed afterwards.
+
+    cd backend
+    python -m benchmarks.status_consumer --jobs 2000 --batch-sizes 1 50 200 --consumers 1 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from itertools import cycle
+from typing import List
+
+from beanie import PydanticObjectId, init_beanie
+from beanie.operators import In
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.config import settings
+from app.models.listeners import (
+    EventListenerJobDB,
+    EventListenerJobStatus,
+    EventListenerJobUpdateDB,
+)
+from app.models.mongomodel import MongoDBRef
+from app.models.users import UserOut
+from message_listener import StatusConsumer
+
+
+class LocalMessage:
+    """The parts of an aio-pika incoming message StatusConsumer uses."""
+
+    def __init__(self, body: bytes, broker: "LocalBroker"):
+        self.body = body
+        self.processed = False
+        self.broker = broker
+
+    async def _settle(self):
+        self.processed = True
+        self.broker.settled(self)
+
+    async def ack(self):
+        await self._settle()
+
+    async def reject(self, requeue: bool = False):
+        await self._settle()
+
+    async def nack(self, requeue: bool = True):
+        await self._settle()
+        if requeue:
+            await self.broker.publish(self.body)
+
+
+class LocalBroker:
+    """Deliver messages round-robin to consumers, with at most `prefetch` unacknowledged messages per consumer."""
+
+    def __init__(self, consumers: List[StatusConsumer], prefetch: int):
+        self.consumers = consumers
+        self.prefetch = prefetch
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._slots = {id(c): asyncio.Semaphore(prefetch) for c in consumers}
+        self._owner = {}
+        self._done = asyncio.Event()
+        self.pending = 0
+
+    async def publish(self, body: bytes):
+        self.pending += 1
+        await self._queue.put(body)
+
+    def settled(self, message: LocalMessage):
+        self._slots[self._owner.pop(id(message))].release()
+        self.pending -= 1
+        if self.pending == 0:
+            self._done.set()
+
+    async def deliver(self):
+        for consumer in cycle(self.consumers):
+            body = await self._queue.get()
+            await self._slots[id(consumer)].acquire()
+            message = LocalMessage(body, self)
+            self._owner[id(message)] = id(consumer)
+            await consumer.on_message(message)
+
+    async def drain(self):
+        await self._done.wait()
+
+
+def status_messages(jobs: List[EventListenerJobDB], updates: int) -> List[bytes]:
+    """Start, `updates` progress messages and done for every job, interleaved between jobs."""
+    start = datetime(2023, 1, 20, 8, 30, 27)
+    texts = (
+        ["StatusMessage.start: Started processing."]
+        + ["StatusMessage.processing: step %d" % i for i in range(updates)]
+        + ["StatusMessage.done: Done processing."]
+    )
+    messages = []
+    for step, text in enumerate(texts):
+        timestamp = (start + timedelta(seconds=step)).strftime("%Y-%m-%dT%H:%M:%S")
+        for job in jobs:
+            body = {
+                "job_id": str(job.id),
+                "status": text,
+                "start": timestamp + "-05:00",
+            }
+            messages.append(json.dumps(body).encode())
+    return messages
+
+
+async def seed(count: int) -> List[EventListenerJobDB]:
+    user = UserOut.construct(
+        email="benchmark@example.com", first_name="Bench", last_name="Mark"
+    )
+    jobs = [
+        EventListenerJobDB(
+            id=PydanticObjectId(),
+            listener_id="benchmark.status_consumer",
+            creator=user,
+            resource_ref=MongoDBRef(collection="files", resource_id=PydanticObjectId()),
+        )
+        for _ in range(count)
+    ]
+    await EventListenerJobDB.insert_many(jobs)
+    return jobs
+
+
+async def cleanup(jobs: List[EventListenerJobDB]):
+    job_ids = [job.id for job in jobs]
+    await EventListenerJobDB.find(In(EventListenerJobDB.id, job_ids)).delete()
+    await EventListenerJobUpdateDB.find(
+        In(EventListenerJobUpdateDB.job_id, [str(job_id) for job_id in job_ids])
+    ).delete()
+
+
+async def run(messages: List[bytes], batch_size: int, consumers: int, prefetch: int):
+    group = [
+        StatusConsumer(batch_size, settings.RABBITMQ_STATUS_BATCH_WAIT)
+        for _ in range(consumers)
+    ]
+    broker = LocalBroker(group, prefetch)
+    for body in messages:
+        await broker.publish(body)
+    start = time.perf_counter()
+    for consumer in group:
+        consumer.start()
+    delivery = asyncio.create_task(broker.deliver())
+    await broker.drain()
+    elapsed = time.perf_counter() - start
+    delivery.cancel()
+    for consumer in group:
+        await consumer.stop()
+    return elapsed
+
+
+async def main(count: int, updates: int, batch_sizes, consumer_counts, prefetch: int):
+    client = AsyncIOMotorClient(str(settings.MONGODB_URL))
+    await init_beanie(
+        database=getattr(client, settings.MONGO_DATABASE),
+        document_models=[EventListenerJobDB, EventListenerJobUpdateDB],
+    )
+    logging.getLogger("message_listener").setLevel(logging.WARNING)
+
+    for consumers in consumer_counts:
+        for batch_size in batch_sizes:
+            jobs = await seed(count)
+            try:
+                messages = status_messages(jobs, updates)
+                # A batch of one with a prefetch of one is the previous one-message-at-a-time behaviour
+                elapsed = await run(
+                    messages, batch_size, consumers, prefetch if batch_size > 1 else 1
+                )
+                finished = await EventListenerJobDB.find(
+                    In(EventListenerJobDB.id, [job.id for job in jobs]),
+                    EventListenerJobDB.status == EventListenerJobStatus.SUCCEEDED,
+                ).count()
+                print(
+                    "consumers %2d  batch %4d  %8.2f s  %8.1f messages/s  %d/%d jobs finished"
+                    % (
+                        consumers,
+                        batch_size,
+                        elapsed,
+                        len(messages) / elapsed,
+                        finished,
+                        count,
+                    )
+                )
+            finally:
+                await cleanup(jobs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument(
+        "--updates", type=int, default=3, help="progress messages per job"
+    )
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 50, 200])
+    parser.add_argument("--consumers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument(
+        "--prefetch", type=int, default=settings.RABBITMQ_STATUS_PREFETCH
+    )
+    args = parser.parse_args()
+    asyncio.run(
+        main(args.jobs, args.updates, args.batch_sizes, args.consumers, args.prefetch)
+    )
@@ -0,0 +1,91 @@
+"""Compare the old upload path (put_object then get_object to measure size) with the single pass HashingReader.
+
+Requires the Minio server configured in app.config (e.g. `docker-compose -f docker-compose.dev.yml up -d`).
+
+    cd backend
+    python -m benchmarks.upload_pipeline --size-mb 1024
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+from minio import Minio
+
+from app.config import settings
+from app.storage.streams import HashingReader
+
+
+class SyntheticStream:
+    """Readable stream of `size` bytes that never holds more than one read in memory."""
+
+    def __init__(self, size: int):
+        self.remaining = size
+        self.block = os.urandom(1024 * 1024)
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        self.remaining -= size
+        return (self.block * (size // len(self.block) + 1))[:size]
+
+
+def upload_and_read_back(fs: Minio, object_name: str, size: int) -> int:
+    fs.put_object(
+        settings.MINIO_BUCKET_NAME,
+        object_name,
+        SyntheticStream(size),
+        length=-1,
+        part_size=settings.MINIO_UPLOAD_CHUNK_SIZE,
+    )
+    return len(fs.get_object(settings.MINIO_BUCKET_NAME, object_name).data)
+
+
+def upload_single_pass(fs: Minio, object_name: str, size: int) -> int:
+    reader = HashingReader(SyntheticStream(size))
+    fs.put_object(
+        settings.MINIO_BUCKET_NAME,
+        object_name,
+        reader,
+        length=-1,
+        part_size=settings.MINIO_UPLOAD_CHUNK_SIZE,
+    )
+    return reader.bytes
+
+
+def measure(fn, fs: Minio, size: int):
+    object_name = "benchmark-%s" % fn.__name__
+    tracemalloc.start()
+    start = time.perf_counter()
+    uploaded = fn(fs, object_name, size)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    fs.remove_object(settings.MINIO_BUCKET_NAME, object_name)
+    assert uploaded == size
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    fs = Minio(
+        settings.MINIO_SERVER_URL,
+        access_key=settings.MINIO_ACCESS_KEY,
+        secret_key=settings.MINIO_SECRET_KEY,
+        secure=False,
+    )
+    if not fs.bucket_exists(settings.MINIO_BUCKET_NAME):
+        fs.make_bucket(settings.MINIO_BUCKET_NAME)
+
+    for fn in (upload_and_read_back, upload_single_pass):
+        elapsed, peak = measure(fn, fs, size)
+        print(
+            "%-22s %8.2f s  %8.1f MB/s  peak memory %8.1f MB"
+            % (fn.__name__, elapsed, args.size_mb / elapsed, peak / 1024 / 1024)
+        )
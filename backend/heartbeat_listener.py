@@ -3,10 +3,13 @@ import json
 import logging
 import os
 from datetime import datetime
+from typing import Dict, Optional, Tuple
 
 from aio_pika import connect_robust
 from aio_pika.abc import AbstractIncomingMessage
+from beanie import PydanticObjectId
 from packaging import version
+from pymongo import UpdateOne
 
 from app.config import settings
 from app.main import startup_beanie
@@ -18,60 +21,131 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-async def callback(message: AbstractIncomingMessage):
-    """This method receives messages from RabbitMQ and processes them.
-    the extractor info is parsed from the message and if the extractor is new
-    or is a later version, the db is updated.
-    """
-    async with message.process():
-        msg = json.loads(message.body.decode("utf-8"))
+async def save_listener(queue: str, extractor_info: dict) -> EventListenerOut:
+    """Register the listener behind `queue`, or replace it with the info from its latest heartbeat."""
+    extractor_name = extractor_info["name"]
+    extractor_db = EventListenerDB(
+        **extractor_info, properties=ExtractorInfo(**extractor_info)
+    )
 
-        extractor_info = msg["extractor_info"]
-        extractor_name = extractor_info["name"]
-        extractor_db = EventListenerDB(
-            **extractor_info, properties=ExtractorInfo(**extractor_info)
-        )
+    # check to see if extractor already exists and update if so
+    existing_extractor = await EventListenerDB.find_one(EventListenerDB.name == queue)
+    if existing_extractor is not None:
+        extractor_db.id = existing_extractor.id
+        extractor_db.created = existing_extractor.created
+
+        # Update existing listener version
+        existing_version = existing_extractor.version
+        new_version = extractor_db.version
+        if version.parse(new_version) > version.parse(existing_version):
+            logger.info(
+                "%s updated from %s to %s"
+                % (extractor_name, existing_version, new_version)
+            )
+
+        extractor_db.lastAlive = datetime.utcnow()
+        logger.info("%s is alive at %s" % (extractor_name, str(datetime.utcnow())))
+        # Update existing listeners alive status
+        new_extractor = await extractor_db.replace()
+        extractor_out = EventListenerOut(**new_extractor.dict())
+
+        return extractor_out
+
+    else:
+        # Register new listener
+        extractor_db.lastAlive = datetime.utcnow()
+        logger.info("%s is alive at %s" % (extractor_name, str(datetime.utcnow())))
+        new_extractor = await extractor_db.insert()
+        extractor_out = EventListenerOut(**new_extractor.dict())
+        logger.info("New extractor registered: " + extractor_name)
+
+        # Assign MIME-based listener if needed
+        if extractor_out.properties and extractor_out.properties.process:
+            await _process_incoming_v1_extractor_info(
+                extractor_name, extractor_out.id, extractor_out.properties.process
+            )
+
+        return extractor_out
+
+
+class HeartbeatAggregator:
+    """Coalesce the heartbeats of all the instances of each listener.
+
+    The info last saved for each queue is kept in memory. A heartbeat carrying the same info only records the time in
+    memory; the listener is written with `save_listener()` the first time this process sees it and whenever its info
+    (e.g. its version) changes. Every `flush_interval` seconds, `lastAlive` of the listeners heard from since the last
+    flush is saved with one bulk write, so hundreds of replicas cost one small update per listener per interval.
+    """
 
-        # check to see if extractor already exists and update if so
-        existing_extractor = await EventListenerDB.find_one(
-            EventListenerDB.name == msg["queue"]
-        )
-        if existing_extractor is not None:
-            extractor_db.id = existing_extractor.id
-            extractor_db.created = existing_extractor.created
-
-            # Update existing listener version
-            existing_version = existing_extractor.version
-            new_version = extractor_db.version
-            if version.parse(new_version) > version.parse(existing_version):
-                logger.info(
-                    "%s updated from %s to %s"
-                    % (extractor_name, existing_version, new_version)
-                )
-
-            extractor_db.lastAlive = datetime.utcnow()
-            logger.info("%s is alive at %s" % (extractor_name, str(datetime.utcnow())))
-            # Update existing listeners alive status
-            new_extractor = await extractor_db.replace()
-            extractor_out = EventListenerOut(**new_extractor.dict())
-
-            return extractor_out
-
-        else:
-            # Register new listener
-            extractor_db.lastAlive = datetime.utcnow()
-            logger.info("%s is alive at %s" % (extractor_name, str(datetime.utcnow())))
-            new_extractor = await extractor_db.insert()
-            extractor_out = EventListenerOut(**new_extractor.dict())
-            logger.info("New extractor registered: " + extractor_name)
-
-            # Assign MIME-based listener if needed
-            if extractor_out.properties and extractor_out.properties.process:
-                await _process_incoming_v1_extractor_info(
-                    extractor_name, extractor_out.id, extractor_out.properties.process
-                )
-
-            return extractor_out
+    def __init__(self, flush_interval: int = settings.HEARTBEAT_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        # queue name -> (listener id, extractor info last saved)
+        self._known: Dict[str, Tuple[PydanticObjectId, dict]] = {}
+        # listener id -> time of the latest heartbeat not saved yet
+        self._alive: Dict[PydanticObjectId, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="heartbeat-flush")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Saving listener heartbeats failed")
+
+    async def on_message(self, message: AbstractIncomingMessage):
+        """This method receives messages from RabbitMQ and processes them.
+        the extractor info is parsed from the message and if the extractor is new
+        or its info changed, the db is updated.
+        """
+        async with message.process():
+            msg = json.loads(message.body.decode("utf-8"))
+            await self.heartbeat(msg["queue"], msg["extractor_info"])
+
+    async def heartbeat(self, queue: str, extractor_info: dict):
+        known = self._known.get(queue)
+        if known is not None and known[1] == extractor_info:
+            self._alive[known[0]] = datetime.utcnow()
+            return
+        listener = await save_listener(queue, extractor_info)
+        self._known[queue] = (listener.id, extractor_info)
+        self._alive.pop(listener.id, None)
+
+    async def flush(self):
+        """Save the pending `lastAlive` times."""
+        if not self._alive:
+            return
+        pending, self._alive = self._alive, {}
+        try:
+            result = await EventListenerDB.get_motor_collection().bulk_write(
+                [
+                    UpdateOne({"_id": listener_id}, {"$set": {"lastAlive": last_alive}})
+                    for listener_id, last_alive in pending.items()
+                ],
+                ordered=False,
+            )
+        except Exception:
+            # Keep them for the next flush unless a newer heartbeat arrived meanwhile
+            for listener_id, last_alive in pending.items():
+                self._alive.setdefault(listener_id, last_alive)
+            raise
+        if result.matched_count < len(pending):
+            # Some listeners were deleted: register them again on their next heartbeat
+            self._known.clear()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Saving listener heartbeats failed")
 
 
 async def listen_for_heartbeats():
@@ -103,9 +177,11 @@ async def listen_for_heartbeats():
         queue = await channel.declare_queue(exclusive=True)
         await queue.bind(exchange)
 
+        aggregator = HeartbeatAggregator()
+        aggregator.start()
         logger.info(f" [*] Listening to {exchange}")
         await queue.consume(
-            callback=callback,
+            callback=aggregator.on_message,
             no_ack=False,
         )
 
@@ -114,6 +190,7 @@ async def listen_for_heartbeats():
             # Wait until terminate
             await asyncio.Future()
         finally:
+            await aggregator.stop()
             await connection.close()
 
 
@@ -1,27 +1,38 @@
+import argparse
 import asyncio
 import json
 import logging
+import multiprocessing
 import os
-import random
-import string
 from datetime import datetime
+from typing import List, Optional
 
 from aio_pika import connect_robust
 from aio_pika.abc import AbstractIncomingMessage
+from beanie.operators import In
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
 
+from app.config import settings
 from app.main import startup_beanie
-from app.models.config import ConfigEntryDB
 from app.models.listeners import (
     EventListenerJobUpdateDB,
     EventListenerJobStatus,
     EventListenerJobDB,
 )
+from app.rabbitmq.publisher import get_instance_id
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+FINISHED = [
+    EventListenerJobStatus.SUCCEEDED,
+    EventListenerJobStatus.ERROR,
+    EventListenerJobStatus.SKIPPED,
+]
+
 
 def parse_message_status(msg):
     """Determine if the message corresponds to start/middle/end of job if possible. See pyclowder.utils.StatusMessage."""
@@ -78,90 +89,183 @@ def parse_message_status(msg):
         }
     else:
         # TODO: Should we default to something else here?
-        return EventListenerJobStatus.PROCESSING
         return {"status": EventListenerJobStatus.PROCESSING, "cleaned_msg": msg}
 
 
-async def callback(message: AbstractIncomingMessage):
-    """This method receives messages from RabbitMQ and processes them.
-    the extractor info is parsed from the message and if the extractor is new
-    or is a later version, the db is updated.
+def parse_status_message(message: AbstractIncomingMessage):
+    """Job id, timestamp and parsed status of a message from a listener."""
+    msg = json.loads(message.body.decode("utf-8"))
+    job_id = str(ObjectId(msg["job_id"]))
+    timestamp = datetime.strptime(
+        msg["start"], "%Y-%m-%dT%H:%M:%S%z"
+    )  # incoming format: '2023-01-20T08:30:27-05:00'
+    timestamp = timestamp.replace(tzinfo=datetime.utcnow().tzinfo)
+    return job_id, timestamp, parse_message_status(msg["status"])
+
+
+def update_job(job: EventListenerJobDB, timestamp: datetime, parsed: dict) -> dict:
+    """Apply one status message to `job` and return the fields it changed."""
+    incoming_status = parsed["status"]
+
+    # Don't override a finished status if a message comes in late
+    if job.status in FINISHED:
+        cleaned_status = job.status
+    else:
+        cleaned_status = incoming_status
+
+    # Prepare fields to update based on status (don't overwrite whole object to avoid async issues)
+    field_updates = {
+        "status": EventListenerJobStatus(cleaned_status).value,
+        "latest_message": parsed["cleaned_msg"],
+        "updated": timestamp,
+    }
+
+    if job.started is not None:
+        field_updates["duration"] = (timestamp - job.started).total_seconds()
+    elif incoming_status == EventListenerJobStatus.STARTED:
+        field_updates["duration"] = 0
+
+    # Update the job timestamps/duration depending on what status we received
+    if incoming_status == EventListenerJobStatus.STARTED:
+        field_updates["started"] = timestamp
+    elif incoming_status in FINISHED:
+        field_updates["finished"] = timestamp
+
+    for field, value in field_updates.items():
+        setattr(job, field, value)
+    return field_updates
+
+
+class StatusConsumer:
+    """Apply status messages from the listeners to their jobs in batches.
+
+    Messages are collected until `batch_size` have arrived or `batch_wait` seconds have passed since the first one.
+    Each batch then costs three round-trips whatever its size: the jobs are loaded with one query, the messages of each
+    job are applied in the order they were received, and the results are saved with one `bulk_write` of `$set`s and
+    one `insert_many` of job updates. Messages are acknowledged once saved, and requeued if saving fails.
+
+    Batches are applied one after the other, so messages of a job stay in order within a process. Several processes
+    can consume the same queue; a job is then only updated if the stored update is not more recent than the batch.
     """
-    async with message.process():
-        msg = json.loads(message.body.decode("utf-8"))
 
-        job_id = msg["job_id"]
-        message_str = msg["status"]
-        timestamp = datetime.strptime(
-            msg["start"], "%Y-%m-%dT%H:%M:%S%z"
-        )  # incoming format: '2023-01-20T08:30:27-05:00'
-        timestamp = timestamp.replace(tzinfo=datetime.utcnow().tzinfo)
+    def __init__(
+        self,
+        batch_size: int = settings.RABBITMQ_STATUS_BATCH_SIZE,
+        batch_wait: float = settings.RABBITMQ_STATUS_BATCH_WAIT,
+    ):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
 
-        # TODO: Updating an event message could go in rabbitmq/listeners
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="status-consumer")
 
-        # Check if the job exists, and update if so
-        job = await EventListenerJobDB.find_one(
-            EventListenerJobDB.id == ObjectId(job_id)
-        )
-        if job:
-            # Update existing job with new info
-            job.updated = timestamp
-            parsed = parse_message_status(message_str)
-            cleaned_msg = parsed["cleaned_msg"]
-            incoming_status = parsed["status"]
-
-            # Don't override a finished status if a message comes in late
-            if job.status in [
-                EventListenerJobStatus.SUCCEEDED,
-                EventListenerJobStatus.ERROR,
-                EventListenerJobStatus.SKIPPED,
-            ]:
-                cleaned_status = job.status
-            else:
-                cleaned_status = incoming_status
-
-            # Prepare fields to update based on status (don't overwrite whole object to avoid async issues)
-            field_updates = {
-                EventListenerJobDB.status: cleaned_status,
-                EventListenerJobDB.latest_message: cleaned_msg,
-                EventListenerJobDB.updated: timestamp,
-            }
-
-            if job.started is not None:
-                field_updates[EventListenerJobDB.duration] = (
-                    timestamp - job.started
-                ).total_seconds()
-            elif incoming_status == EventListenerJobStatus.STARTED:
-                field_updates[EventListenerJobDB.duration] = 0
-
-            logger.info(f"[{job_id}] {timestamp} {incoming_status.value} {cleaned_msg}")
-
-            # Update the job timestamps/duration depending on what status we received
-            if incoming_status == EventListenerJobStatus.STARTED:
-                field_updates[EventListenerJobDB.started] = timestamp
-            elif incoming_status in [
-                EventListenerJobStatus.SUCCEEDED,
-                EventListenerJobStatus.ERROR,
-                EventListenerJobStatus.SKIPPED,
-            ]:
-                # job.finished = timestamp
-                field_updates[EventListenerJobDB.finished] = timestamp
-
-            await job.set(field_updates)
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def on_message(self, message: AbstractIncomingMessage):
+        # The channel prefetch limits how many messages wait here
+        await self._queue.put(message)
+
+    async def _next_batch(self) -> List[AbstractIncomingMessage]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.process(batch)
+            except Exception:
+                logger.exception(f"Saving {len(batch)} status messages failed")
+                for message in batch:
+                    if not message.processed:
+                        await message.nack(requeue=True)
+                await asyncio.sleep(1)
 
+    async def process(self, batch: List[AbstractIncomingMessage]):
+        received = []
+        for message in batch:
+            try:
+                received.append((message, *parse_status_message(message)))
+            except (ValueError, KeyError, InvalidId) as e:
+                logger.error(f"Invalid status message, skipping: {e}")
+                await message.reject()
+
+        job_ids = list({ObjectId(job_id) for _, job_id, _, _ in received})
+        jobs = {
+            str(job.id): job
+            for job in await EventListenerJobDB.find(
+                In(EventListenerJobDB.id, job_ids)
+            ).to_list()
+        }
+
+        changes = {}
+        job_updates = []
+        for _, job_id, timestamp, parsed in received:
+            if (job := jobs.get(job_id)) is None:
+                # We don't know what this job is. Drop the message.
+                logger.error(
+                    "Job ID %s not found in database, skipping message." % job_id
+                )
+                continue
+            changes.setdefault(job_id, {}).update(update_job(job, timestamp, parsed))
+            logger.info(
+                f"[{job_id}] {timestamp} {parsed['status'].value} {parsed['cleaned_msg']}"
+            )
             # Add latest message to the job updates
-            event_msg = EventListenerJobUpdateDB(
-                job_id=job_id, status=cleaned_msg, timestamp=timestamp
+            job_updates.append(
+                EventListenerJobUpdateDB(
+                    job_id=job_id, status=parsed["cleaned_msg"], timestamp=timestamp
+                )
+            )
+
+        if changes:
+            await EventListenerJobDB.get_motor_collection().bulk_write(
+                [
+                    UpdateOne(
+                        {
+                            "_id": ObjectId(job_id),
+                            "$or": [
+                                {"updated": None},
+                                {"updated": {"$lte": fields["updated"]}},
+                            ],
+                        },
+                        {"$set": fields},
+                    )
+                    for job_id, fields in changes.items()
+                ],
+                ordered=False,
             )
-            await event_msg.insert()
-            return True
-        else:
-            # We don't know what this job is. Reject the message.
-            logger.error("Job ID %s not found in database, skipping message." % job_id)
-            return False
+        if job_updates:
+            await EventListenerJobUpdateDB.insert_many(job_updates)
+        for message, *_ in received:
+            await message.ack()
 
 
-async def listen_for_messages():
+async def listen_for_messages(
+    prefetch: int = settings.RABBITMQ_STATUS_PREFETCH,
+    batch_size: int = settings.RABBITMQ_STATUS_BATCH_SIZE,
+    batch_wait: float = settings.RABBITMQ_STATUS_BATCH_WAIT,
+):
     await startup_beanie()
 
     # For some reason, Pydantic Settings environment variable overrides aren't being applied, so get them here.
@@ -179,24 +283,11 @@ async def listen_for_messages():
     )
 
     async with connection:
-        # Get or generate instance ID
-        if (
-            config_entry := await ConfigEntryDB.find_one({"key": "instance_id"})
-        ) is not None:
-            instance_id = config_entry.value
-        else:
-            # If no ID has been generated for this instance, generate a 10-digit alphanumeric identifier
-            instance_id = "".join(
-                random.choice(
-                    string.ascii_uppercase + string.ascii_lowercase + string.digits
-                )
-                for _ in range(10)
-            )
-            config_entry = ConfigEntryDB(key="instance_id", value=instance_id)
-            await config_entry.insert()
+        instance_id = await get_instance_id()
 
         # Prepare channel and queue if necessary
         channel = await connection.channel()
+        await channel.set_qos(prefetch_count=prefetch)
         exchange = await channel.declare_exchange(name="clowder", durable=True)
         queue = await channel.declare_queue(
             name="clowder.%s" % instance_id,
@@ -204,9 +295,11 @@ async def listen_for_messages():
         )
         await queue.bind(exchange)
 
+        consumer = StatusConsumer(batch_size, batch_wait)
+        consumer.start()
         logger.info(f" [*] Listening to {exchange}")
         await queue.consume(
-            callback=callback,
+            callback=consumer.on_message,
             no_ack=False,
         )
 
@@ -215,8 +308,38 @@ async def listen_for_messages():
             # Wait until terminate
             await asyncio.Future()
         finally:
+            await consumer.stop()
             await connection.close()
 
 
+def run(prefetch: int, batch_size: int, batch_wait: float):
+    asyncio.run(listen_for_messages(prefetch, batch_size, batch_wait))
+
+
 if __name__ == "__main__":
-    asyncio.run(listen_for_messages())
+    parser = argparse.ArgumentParser()
+    # Each process is a separate consumer of the queue; RabbitMQ spreads messages between them
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument(
+        "--prefetch", type=int, default=settings.RABBITMQ_STATUS_PREFETCH
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.RABBITMQ_STATUS_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--batch-wait", type=float, default=settings.RABBITMQ_STATUS_BATCH_WAIT
+    )
+    args = parser.parse_args()
+    if args.processes == 1:
+        run(args.prefetch, args.batch_size, args.batch_wait)
+    else:
+        processes = [
+            multiprocessing.Process(
+                target=run, args=(args.prefetch, args.batch_size, args.batch_wait)
+            )
+            for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()